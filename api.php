@@ -33,7 +33,10 @@ if ($_SERVER['REQUEST_METHOD'] === 'GET') {
                 'context' => 'Contexto opcional',
                 'model' => 'phi3:mini',
                 'temperature' => 0.7,
-                'max_tokens' => 250
+                'max_tokens' => 250,
+                'num_ctx' => 2048,
+                'keep_alive' => '30m',
+                'ollama_url' => 'Opcional: uno de OLLAMA_URL / OLLAMA_BACKENDS'
             ]
         ]
     ]);
@@ -75,15 +78,23 @@ class OllamaAPI {
             $model = $input['model'] ?? 'phi3:mini';  // Acepta el modelo del request
             $temperature = $input['temperature'] ?? 0.7;
             $maxTokens = $input['max_tokens'] ?? 250;
+            $numCtx = isset($input['num_ctx']) ? (int) $input['num_ctx'] : null;
+            $keepAlive = isset($input['keep_alive']) ? (string) $input['keep_alive'] : null;
+            $ollamaUrl = isset($input['ollama_url']) ? rtrim((string) $input['ollama_url'], '/') : null;
+
+            // Backend elegido por Flask (llm_router.py); solo se aceptan los configurados
+            if ($ollamaUrl !== null) {
+                if (!in_array($ollamaUrl, $this->allowedBackends(), true)) {
+                    $this->sendError('Backend de Ollama no permitido', 400);
+                }
+                $this->iaService = new OllamaIAService($ollamaUrl);
+            }
             
             error_log("Modelo solicitado: " . $model);
             error_log("Contexto recibido: " . strlen($context) . " caracteres");
             
-            // Si el modelo no existe, usar fallback
-            if (!$this->modelExists($model)) {
-                error_log("Modelo $model no encontrado, usando phi3:mini");
-                $model = 'phi3:mini';  // Fallback a phi3:mini
-            }
+            // Sin sustituir el modelo: cada backend sirve el suyo (llm_router.py comprueba
+            // en /api/tags que este instalado); si Ollama no lo tiene, el error llega a Flask
             
             $simplePrompt = !empty($context) ? 
                 $context . "\n\nPregunta: " . $prompt . "\nRespuesta:" : 
@@ -93,13 +104,16 @@ class OllamaAPI {
                 $simplePrompt,
                 $model,
                 $temperature,
-                $maxTokens
+                $maxTokens,
+                $numCtx,
+                $keepAlive
             );
             
             $this->sendSuccess([
                 'response' => $response,
                 'model' => $model,
-                'context_used' => !empty($context)
+                'context_used' => !empty($context),
+                'metrics' => $this->iaService->getLastMetrics()
             ]);
             
         } catch (Exception $e) {
@@ -108,10 +122,18 @@ class OllamaAPI {
         }
     }
     
-    private function modelExists($model) {
-        // Verificar si el modelo existe
-        $models = ['phi3:mini', 'llama3.2:1b', 'llama3:latest', 'qwen2.5:0.5b'];
-        return in_array($model, $models);
+    private function allowedBackends() {
+        // Mismo formato que en Flask: "url|modelo,url|modelo"
+        $backends = $_ENV['OLLAMA_BACKENDS'] ?? (getenv('OLLAMA_BACKENDS') ?: '');
+        $default = $_ENV['OLLAMA_URL'] ?? (getenv('OLLAMA_URL') ?: 'http://localhost:11434');
+        $urls = [rtrim($default, '/')];
+        foreach (explode(',', $backends) as $entry) {
+            $url = trim(explode('|', $entry)[0]);
+            if ($url !== '') {
+                $urls[] = rtrim($url, '/');
+            }
+        }
+        return $urls;
     }
     
     private function sendSuccess($data) {
@@ -1,4 +1,4 @@
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 import requests
 import edge_tts
@@ -6,6 +6,7 @@ import asyncio
 import base64
 import tempfile
 import os
+import signal
 import threading
 from bs4 import BeautifulSoup
 import urllib3
@@ -14,15 +15,35 @@ import time
 import json
 import logging
 import glob
+import hmac
+from functools import wraps
 from pathlib import Path
 import re
 import unicodedata
 from collections import OrderedDict
 from typing import Optional
-from rag_system import RAGSystem
+from context_assembler import ContextAssembler
+from prompt_templates import PROMPT_TEMPLATES, PromptEvalStats, get_prompt_template
+from model_warmup import WARMUP_ENABLED, ModelWarmupManager
+from generation_policy import GEN_MAX_TOKENS, GEN_PARALLEL_SLOTS, GenerationPolicy
+from llm_router import OLLAMA_BACKENDS, BackendError, BackendPool, NoBackendAvailable
+import metrics
+from metrics import CHAT_REQUEST_SECONDS, CHAT_REQUESTS, CHAT_STAGE_SECONDS, record_cache_lookup
+from ingestion import document_name, list_documents
+from avas2_crawler import CRAWL_DOCS_SUBDIR, AVAS2Crawler
+from docs_watcher import DOCS_WATCH, DocsWatcher
+from conversation_memory import CONVERSATION_DISABLED_REASON, CONVERSATION_MEMORY, ConversationStore
+from prefetch import PREFETCH_DISABLED_REASON, PREFETCH_ENABLED, PREFETCH_MIN_CHARS, PrefetchStore
+from memory_accounting import BufferGauge, MemoryMonitor, deep_sizeof, read_rss
+from static_assets import StaticAssets
+from deadline import CHAT_DEADLINE_SECONDS, DEADLINE_LLM_MIN_SECONDS, Deadline, DeadlineExceeded
+from structured_logging import RequestLog, dropped_records, setup_logging
+import structured_logging
+from index_bundle import INDEX_BUNDLE_PATH
+from prefork import SERVER_WORKERS, SIGNAL_CRAWL, SIGNAL_REINDEX, PreforkServer, signal_writer
 
-# Configurar logging
-logging.basicConfig(level=logging.INFO)
+# Configurar logging (LOG_FORMAT=json para una linea JSON por registro, escritura en cola)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 # Desactivar warnings de SSL
@@ -30,6 +51,8 @@ urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 app = Flask(__name__)
 CORS(app)
+# /static con variantes precomprimidas y cache immutable (archivos de build_assets.py)
+static_assets = StaticAssets(app)
 
 # Cache simple en memoria para respuestas recientes
 MAX_CACHE_ITEMS = 25
@@ -43,6 +66,16 @@ QUICK_REPLIES = {
 }
 
 
+# Memoria de conversacion por sesion (acotada en bytes, LRU, con resumen de turnos viejos)
+conversation_store = ConversationStore()
+if CONVERSATION_DISABLED_REASON:
+    logger.warning(f"Memoria de conversacion desactivada ({CONVERSATION_DISABLED_REASON})")
+# Busquedas anticipadas mientras el estudiante escribe (/rag/prefetch), una por sesion
+prefetch_store = PrefetchStore()
+if PREFETCH_DISABLED_REASON:
+    logger.warning(f"Busqueda anticipada desactivada ({PREFETCH_DISABLED_REASON})")
+
+
 def cache_chat_response(cache_key: str, payload: dict) -> None:
     if not cache_key:
         return
@@ -81,6 +114,88 @@ else:
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "phi3:mini")  # Usar modelo rápido
 OLLAMA_TIMEOUT = int(os.getenv("OLLAMA_TIMEOUT", "30"))  # Reducido a 30s
 OLLAMA_MAX_TOKENS = int(os.getenv("OLLAMA_MAX_TOKENS", "350"))  # Respuestas más cortas
+# Si el modelo aun no esta cargado en Ollama, o hay cola, el timeout crece hasta este valor
+OLLAMA_COLD_TIMEOUT = int(os.getenv("OLLAMA_COLD_TIMEOUT", "120"))
+
+# Tiempo que Ollama mantiene el modelo (y su cache KV del prefijo) cargado tras cada peticion
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+# Plantillas con prefijo constante: ver prompt_templates.py
+prompt_eval_stats = PromptEvalStats()
+context_assembler = ContextAssembler()
+# Backends de Ollama (OLLAMA_BACKENDS), cada uno con warm-up y keep-alive propios
+# (ver llm_router.py y model_warmup.py)
+llm_pool = BackendPool.from_env(
+    OLLAMA_URL,
+    OLLAMA_MODEL,
+    warmup_factory=lambda url, model: ModelWarmupManager(
+        url,
+        model,
+        OLLAMA_KEEP_ALIVE,
+        num_ctx=context_assembler.num_ctx,
+        warm_prompts=[template.prefix for template in PROMPT_TEMPLATES.values()],
+    ) if WARMUP_ENABLED else None,
+)
+
+# num_predict / temperatura / timeout por estrategia y carga (ver generation_policy.py)
+generation_policy = GenerationPolicy(
+    max_tokens=min(OLLAMA_MAX_TOKENS, GEN_MAX_TOKENS),
+    slots=GEN_PARALLEL_SLOTS * len(llm_pool.backends),
+    base_timeout=OLLAMA_TIMEOUT,
+    max_timeout=OLLAMA_COLD_TIMEOUT,
+)
+
+# Valores que se leen en cada scrape de /metrics
+metrics.LLM_IN_FLIGHT.set_function(lambda: generation_policy.snapshot()["in_flight"])
+metrics.LLM_BACKEND_OUTSTANDING.set_function(
+    lambda: {(backend["name"],): backend["outstanding"] for backend in llm_pool.snapshot()}
+)
+metrics.LLM_BACKEND_UP.set_function(lambda: {
+    (backend["name"],): int(backend["healthy"] and backend["circuit"] == "closed")
+    for backend in llm_pool.snapshot()
+})
+metrics.LOG_RECORDS_DROPPED.set_function(dropped_records)
+metrics.CONVERSATION_SESSIONS.set_function(lambda: len(conversation_store.sessions))
+metrics.CONVERSATION_BYTES.set_function(lambda: conversation_store.nbytes)
+
+# /admin/*: con ADMIN_TOKEN se exige "Authorization: Bearer <token>"; sin el, solo desde localhost
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+
+
+def require_admin(view):
+    """Los endpoints de administracion exponen rutas de codigo y tamaños internos, y
+    tracemalloc cuesta CPU y memoria: no pueden quedar abiertos a cualquier cliente"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if ADMIN_TOKEN:
+            header = request.headers.get("Authorization", "")
+            token = header[7:] if header.startswith("Bearer ") else ""
+            if not hmac.compare_digest(token.encode("utf-8"), ADMIN_TOKEN.encode("utf-8")):
+                return jsonify({"error": "Token de administracion invalido"}), 401
+        elif request.remote_addr not in ("127.0.0.1", "::1"):
+            return jsonify({"error": "Sin ADMIN_TOKEN solo se permite desde localhost"}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+
+# Contabilidad de memoria por componente (/admin/memory); el audio de /tts solo vive
+# durante la peticion, asi que se mide lo que esta en vuelo y su maximo
+tts_buffers = BufferGauge()
+memory_monitor = MemoryMonitor()
+memory_monitor.register("response_cache", lambda: {
+    "bytes": deep_sizeof(dict(response_cache)), "items": len(response_cache), "max_items": MAX_CACHE_ITEMS,
+})
+memory_monitor.register("conversations", lambda: {
+    "bytes": conversation_store.nbytes, "items": len(conversation_store.sessions),
+    "max_bytes": conversation_store.max_bytes,
+})
+memory_monitor.register("prefetch", lambda: {
+    "bytes": deep_sizeof(dict(prefetch_store.slots)), "items": len(prefetch_store.slots),
+})
+memory_monitor.register("static_pages", lambda: {"bytes": deep_sizeof(dict(static_assets._pages))})
+memory_monitor.register("tts_buffers", tts_buffers.snapshot)
+memory_monitor.register_group("rag", lambda: rag.memory_usage() if rag else {})
+metrics.PROCESS_RSS_BYTES.set_function(lambda: read_rss()[0] or 0)
 
 # URL de AVAS-2
 AVAS2_URL = "https://investic.narino.gov.co/avas-2/"
@@ -90,95 +205,188 @@ logger.info("=" * 50)
 logger.info("CONFIGURACIÓN DEL SISTEMA:")
 logger.info(f"   - Entorno: {'SERVIDOR' if IS_SERVER else 'LOCAL'}")
 logger.info(f"   - PHP API: {PHP_API_URL}")
-logger.info(f"   - Ollama: {OLLAMA_URL}")
-logger.info(f"   - Modelo: {OLLAMA_MODEL}")
+logger.info(f"   - Ollama: {', '.join(backend.name for backend in llm_pool.backends)}")
+logger.info(f"   - Ventana de contexto: {context_assembler.num_ctx} tokens")
+logger.info(f"   - Keep-alive: {OLLAMA_KEEP_ALIVE}")
+logger.info(f"   - Plazo por peticion: {CHAT_DEADLINE_SECONDS:.0f}s")
+logger.info(f"   - Warm-up del modelo: {'SI' if WARMUP_ENABLED else 'NO'}")
+logger.info(f"   - Vigilancia de docs/: {'SI' if DOCS_WATCH and not INDEX_BUNDLE_PATH else 'NO'}")
 logger.info(f"   - URL Publica: {PUBLIC_URL}")
 logger.info("=" * 50)
 
 # ============ INICIALIZAR RAG ============
-logger.info("Inicializando sistema RAG...")
-try:
-    # Determinar ruta de documentos segÃºn entorno
+# background: el servidor HTTP arranca de inmediato y el RAG se prepara en un hilo.
+# blocking: comportamiento anterior, el RAG queda listo antes de servir.
+# off: sin RAG, solo conocimiento del modelo.
+RAG_STARTUP_MODE = os.getenv("RAG_STARTUP_MODE", "background").lower()
+# Pre-fork (SERVER_WORKERS > 1): el maestro carga el RAG antes del fork y los hilos de
+# fondo arrancan en cada proceso hijo; un unico proceso escritor modifica el indice
+PREFORK = SERVER_WORKERS > 1 and __name__ == "__main__"
+# Cada cuanto un worker revisa si el escritor publico un indice nuevo
+INDEX_RELOAD_INTERVAL = float(os.getenv("INDEX_RELOAD_INTERVAL", "5"))
+# None: un solo proceso | "writer": proceso escritor | "reader": worker HTTP de solo lectura
+process_role = None
+
+rag = None
+rag_status = {
+    "state": "pending",     # pending | loading | ready | disabled | error
+    "stage": None,
+    "detail": {},
+    "started_at": None,
+    "ready_at": None,
+    "error": None,
+}
+rag_status_lock = threading.Lock()
+
+
+def set_rag_status(state=None, stage=None, **detail):
+    with rag_status_lock:
+        if state:
+            rag_status["state"] = state
+        if stage:
+            rag_status["stage"] = stage
+            rag_status["detail"] = detail
+        if state == "loading" and rag_status["started_at"] is None:
+            rag_status["started_at"] = time.time()
+        if state == "ready":
+            rag_status["ready_at"] = time.time()
+
+
+def get_rag_status():
+    with rag_status_lock:
+        status = dict(rag_status)
+    if status["started_at"]:
+        end = status["ready_at"] or time.time()
+        status["elapsed_seconds"] = round(end - status["started_at"], 2)
+    return status
+
+
+def resolve_docs_path():
+    """Ruta de documentos segun entorno"""
     if IS_SERVER:
-        docs_path = "/app/docs"
-    else:
-        # LOCAL: desde app/app.py, subir un nivel a la rai­z del proyecto
-        current_file = os.path.abspath(__file__)  # /ruta/proyecto/app/app.py
-        app_dir = os.path.dirname(current_file)   # /ruta/proyecto/app
-        project_root = os.path.dirname(app_dir)   # /ruta/proyecto
-        docs_path = os.path.join(project_root, "docs")  # /ruta/proyecto/docs
-    
-    docs_path = os.path.abspath(docs_path)
-    
-    logger.info("=" * 60)
-    logger.info("VERIFICANDO DOCUMENTOS:")
-    logger.info(f"   Archivo actual: {os.path.abspath(__file__)}")
-    logger.info(f"   Directorio app: {os.path.dirname(os.path.abspath(__file__))}")
-    logger.info(f"   Ruta docs calculada: {docs_path}")
-    logger.info(f"   ¿Existe la ruta? {os.path.exists(docs_path)}")
-    
-    if os.path.exists(docs_path):
-        # Listar contenido
-        all_files = os.listdir(docs_path)
-        txt_files = [f for f in all_files if f.endswith('.txt')]
-        
-        logger.info(f"   Todos los archivos: {all_files}")
-        logger.info(f"   Archivos .txt: {txt_files}")
-        
-        if not txt_files:
-            logger.error("No hay archivos TXT en la carpeta docs!")
-            logger.info("   Verifica que los archivos existan en: " + docs_path)
-            rag = None
+        return os.path.abspath("/app/docs")
+    # LOCAL: desde app/app.py, subir un nivel a la raiz del proyecto
+    project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return os.path.abspath(os.path.join(project_root, "docs"))
+
+
+def init_rag():
+    """Cargar modelo e indice; publica el RAG en la variable global solo cuando esta listo"""
+    global rag
+    set_rag_status("loading", "verificando documentos")
+    try:
+        docs_path = resolve_docs_path()
+        logger.info(f"Inicializando sistema RAG (docs: {docs_path})")
+
+        if INDEX_BUNDLE_PATH:
+            # Bundle precompilado (build_index.py): no hace falta docs/ ni calcular embeddings
+            logger.info(f"Usando bundle del indice: {INDEX_BUNDLE_PATH}")
+        elif not os.path.exists(docs_path):
+            logger.error(f"No existe la carpeta: {docs_path}")
+            set_rag_status("disabled", "sin carpeta docs", docs_path=docs_path)
+            return
         else:
-            # Mostrar preview de cada archivo
-            for txt_file in txt_files:
-                filepath = os.path.join(docs_path, txt_file)
-                with open(filepath, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                logger.info(f"  {txt_file}: {len(content)} caracteres")
-                logger.info(f"      Preview: {content[:100]}...")
-            
-            logger.info("=" * 60)
-            
-            # Inicializar RAG
-            logger.info("Inicializando RAG System...")
-            rag = RAGSystem(docs_dir=docs_path)
-            
-            # Verificar indexacion
-            stats = rag.get_stats()
-            logger.info(f"RAG Stats:")
-            logger.info(f"   - Total chunks: {stats.get('total_chunks', 0)}")
-            logger.info(f"   - Por materia: {stats.get('subjects', {})}")
-            
-            if stats.get('total_chunks', 0) == 0:
-                logger.error("RAG inicializado pero SIN CHUNKS!")
-                rag = None
-            else:
-                logger.info("RAG inicializado correctamente")
-                
-                # HACER BÚSQUEDA DE PRUEBA
-                logger.info("PRUEBA DE BÚSQUEDA:")
-                test_query = "¿Que es la suma?"
-                context, sources, distance = rag.search_forced(test_query, n_results=3)
-                logger.info(f"   Query: {test_query}")
-                logger.info(f"   Contexto encontrado: {len(context)} chars")
-                logger.info(f"   Fuentes: {sources}")
-                logger.info(f"   Distancia: {distance:.3f}")
-                if context:
-                    logger.info(f"   Preview: {context[:200]}...")
-                else:
-                    logger.error("    NO SE ENCONTRo CONTEXTO!")
-                logger.info("=" * 60)
+            # Solo listar: el contenido lo lee RAGSystem en streaming al indexar
+            doc_files = [document_name(f, docs_path) for f in list_documents(docs_path)]
+            logger.info(f"Documentos (TXT/PDF): {len(doc_files)} -> {doc_files[:20]}")
+
+            if not doc_files:
+                logger.error("No hay documentos TXT/PDF en la carpeta docs!")
+                set_rag_status("disabled", "sin documentos", docs_path=docs_path)
+                return
+
+        # Importar aqui: sentence-transformers/torch tardan varios segundos en cargar
+        set_rag_status(stage="cargando librerias")
+        from rag_system import RAGSystem
+
+        system = RAGSystem(
+            docs_dir=docs_path,
+            progress=lambda stage, **detail: set_rag_status(stage=stage, **detail)
+        )
+
+        total_chunks = system.collection.count()
+        if total_chunks == 0:
+            logger.error("RAG inicializado pero SIN CHUNKS!")
+            set_rag_status("disabled", "indice vacio")
+            return
+
+        rag = system
+        # Lo respondido mientras cargaba no uso documentos
+        invalidate_answer_caches()
+        set_rag_status("ready", "listo", total_chunks=total_chunks)
+        logger.info(f"RAG inicializado correctamente ({total_chunks} chunks)")
+
+    except Exception as e:
+        logger.error(f"Error al iniciar RAG: {e}")
+        import traceback
+        logger.error(traceback.format_exc())
+        with rag_status_lock:
+            rag_status["error"] = str(e)
+        set_rag_status("error", "fallo")
+
+
+def rebuild_rag():
+    """Reindexar todo en un RAGSystem nuevo y reemplazar el actual.
+
+    El anterior sigue sirviendo hasta el cambio. Bajo RAGSystem.write_lock: una
+    actualizacion del vigilante o del rastreador en curso termina antes, y las que
+    llegan despues a la instancia vieja la encuentran retirada y no persisten (si
+    no, volverian a publicar su indice encima del nuevo).
+    """
+    global rag
+    from rag_system import RAGSystem
+    with RAGSystem.write_lock:
+        previous = rag
+        rag = RAGSystem(docs_dir=resolve_docs_path(), force_reindex=True,
+                        embedder=previous.embedder if previous else None)
+        if previous is not None:
+            previous.retired = True
+    invalidate_answer_caches()
+    set_rag_status("ready", "listo", total_chunks=rag.collection.count())
+    return rag
+
+
+metrics.RAG_INDEX_CHUNKS.set_function(lambda: rag.collection.count() if rag else None)
+metrics.RAG_READY.set_function(lambda: 1 if rag else 0)
+
+
+def start_rag():
+    if RAG_STARTUP_MODE == "blocking":
+        init_rag()
+    elif RAG_STARTUP_MODE == "off":
+        # Solo modelo (p. ej. benchmarks que inyectan su propio indice)
+        set_rag_status("disabled", "desactivado por RAG_STARTUP_MODE")
     else:
-        logger.error(f"No existe la carpeta: {docs_path}")
-        logger.error(f"   Verifica que la carpeta 'docs' estÃ© en la rai­z del proyecto")
-        rag = None
-        
-except Exception as e:
-    logger.error(f"Error al iniciar RAG: {e}")
-    import traceback
-    logger.error(traceback.format_exc())
-    rag = None
+        threading.Thread(target=init_rag, name="rag-warmup", daemon=True).start()
+
+
+def load_rag_before_fork():
+    """Pre-fork: dejar el RAG cargado en el maestro para que los workers lo hereden.
+
+    Si hay que indexar, se hace en un proceso hijo desechable; el maestro solo
+    carga el modelo y el indice, sin ejecutar inferencia (el pool de hilos de
+    torch/OpenMP no sobrevive a un fork).
+    """
+    if RAG_STARTUP_MODE == "off":
+        set_rag_status("disabled", "desactivado por RAG_STARTUP_MODE")
+        return
+    if os.getenv("VECTOR_STORE", "chroma").lower() != "compact":
+        # ChromaDB (sqlite + hilos propios) no se puede compartir entre procesos tras un fork
+        logger.warning("Pre-fork: se usa VECTOR_STORE=compact (indice mapeado en memoria, compartido)")
+        os.environ["VECTOR_STORE"] = "compact"
+
+    if not INDEX_BUNDLE_PATH:
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                init_rag()
+                code = 0 if rag else 1
+            finally:
+                structured_logging.shutdown()
+                os._exit(code)
+        os.waitpid(pid, 0)
+    init_rag()
 
 # ============ CONFIGURACIÃ“N DE VOCES ============
 EDGE_VOICES_ES = {
@@ -195,9 +403,6 @@ EDGE_VOICES_ES = {
 }
 
 # ============ CACHE Y CONFIGURACIÃ“N ============
-SCRAPED_CACHE = {}
-CACHE_TIMEOUT = 3600  # 1 hora
-
 # Palabras clave por materia
 SUBJECT_KEYWORDS = {
     'ciencias_naturales': [
@@ -262,6 +467,38 @@ AVAS2_REAL_INFO = {
     }
 }
 
+# ============ RASTREO DE AVAS-2 ============
+# Paginas de cada asignatura -> docs/avas2/<materia>/*.txt -> actualizacion incremental del RAG
+avas2_crawler = AVAS2Crawler(
+    subjects={key: info["url"] for key, info in AVAS2_REAL_INFO["asignaturas"].items()},
+    docs_dir=resolve_docs_path(),
+    get_rag=lambda: rag,
+)
+
+
+def invalidate_answer_caches():
+    """Tras cambiar el indice: las respuestas en cache y lo anticipado salieron del indice anterior
+    (result_cache lo limpia el propio RAGSystem)"""
+    response_cache.clear()
+    prefetch_store.clear()
+
+
+# ============ DOCUMENTOS EN VIVO ============
+# Ediciones en docs/ -> debounce -> solo los archivos cambiados al indice (las paginas
+# de AVAS-2 las actualiza el rastreo, por eso su carpeta se ignora)
+docs_watcher = DocsWatcher(
+    docs_dir=resolve_docs_path(),
+    get_rag=lambda: rag,
+    on_update=lambda result: invalidate_answer_caches(),
+    ignore=(CRAWL_DOCS_SUBDIR,),
+)
+
+
+def start_docs_watcher():
+    """Solo en el proceso que escribe el indice; un bundle es de solo lectura"""
+    if DOCS_WATCH and not INDEX_BUNDLE_PATH:
+        docs_watcher.start()
+
 # ============ CONFIGURACIÃ“N ASYNCIO PARA TTS ============
 loop = None
 thread = None
@@ -272,11 +509,15 @@ def start_async_loop():
     asyncio.set_event_loop(loop)
     loop.run_forever()
 
-thread = threading.Thread(target=start_async_loop, daemon=True)
-thread.start()
-time.sleep(0.5)
+def start_tts_loop():
+    global thread
+    thread = threading.Thread(target=start_async_loop, daemon=True)
+    thread.start()
 
 def run_async(coro):
+    # Esperar al loop solo si aun no arranco (antes: sleep fijo de 0.5s al importar)
+    while loop is None or not loop.is_running():
+        time.sleep(0.01)
     future = asyncio.run_coroutine_threadsafe(coro, loop)
     return future.result()
 
@@ -294,7 +535,58 @@ def normalize_text(text):
 @app.route("/")
 def index():
     """PÃ¡gina principal"""
-    return render_template("index.html")
+    return static_assets.page("index.html")
+
+def record_llm_tokens(llm_metrics):
+    if not llm_metrics:
+        return
+    if llm_metrics.get("prompt_eval_count"):
+        metrics.LLM_TOKENS.inc(llm_metrics["prompt_eval_count"], kind="prompt_eval")
+    if llm_metrics.get("eval_count"):
+        metrics.LLM_TOKENS.inc(llm_metrics["eval_count"], kind="eval")
+
+def request_llm(backend, payload, generation, deadline=None):
+    """Generar en un backend via PHP; los fallos del servicio se elevan como BackendError (failover)"""
+    # Modelo frio en este backend: la respuesta incluye la carga del modelo
+    timeout = generation.timeout if backend.is_warm() else max(generation.timeout, OLLAMA_COLD_TIMEOUT)
+    backend_timeout = timeout
+    if deadline is not None:
+        # Tambien en el failover a otro backend: solo lo que queda del plazo de la peticion
+        deadline.require("llm", DEADLINE_LLM_MIN_SECONDS)
+        timeout = deadline.timeout(cap=timeout)
+    body = {**payload, "model": backend.model}
+    if OLLAMA_BACKENDS:
+        # Con un solo backend PHP usa su propio OLLAMA_URL, como antes
+        body["ollama_url"] = backend.url
+    try:
+        php_response = requests.post(
+            PHP_API_URL,
+            json=body,
+            timeout=timeout,
+            headers={'Content-Type': 'application/json; charset=utf-8'}
+        )
+    except requests.exceptions.Timeout:
+        # Timeout recortado por el plazo: se agoto la peticion, no el backend (no abre su circuito)
+        if timeout < backend_timeout:
+            raise DeadlineExceeded("llm", deadline.remaining())
+        raise
+
+    if php_response.status_code != 200:
+        logger.error("Error HTTP %s en %s", php_response.status_code, backend.name)
+        raise BackendError("Error en el servicio")
+
+    try:
+        php_data = php_response.json()
+    except json.JSONDecodeError:
+        logger.error("Respuesta no es JSON valido")
+        raise BackendError("Error en respuesta del servicio")
+
+    if not php_data.get('success'):
+        error_msg = php_data.get('error', 'Error desconocido')
+        logger.error("Error desde PHP (%s): %s", backend.name, error_msg)
+        raise BackendError(error_msg)
+
+    return php_data, backend
 
 @app.route("/chat", methods=["POST", "OPTIONS"])
 def chat():
@@ -308,10 +600,45 @@ def chat():
     if not prompt:
         return jsonify({"error": "No se proporciona pregunta"}), 400
     
-    cache_key = normalize_text(prompt)
+    session_id = data.get("session_id")
+    if not ConversationStore.valid_session_id(session_id):
+        session_id = ConversationStore.new_session_id()
+
+    request_start = time.perf_counter()
+    # Plazo de toda la peticion: cada etapa usa lo que queda y la busqueda se salta si no alcanza
+    deadline = Deadline(CHAT_DEADLINE_SECONDS)
+    request_log = RequestLog(logger, "chat", prompt_chars=len(prompt))
+
+    def remember(answer):
+        if CONVERSATION_MEMORY:
+            conversation_store.record(session_id, prompt, answer)
+
+    def observe_chat(strategy, outcome):
+        CHAT_REQUEST_SECONDS.observe(time.perf_counter() - request_start, strategy=strategy)
+        CHAT_REQUESTS.inc(strategy=strategy, outcome=outcome)
+        for stage in deadline.skipped:
+            metrics.CHAT_DEADLINE_SKIPS.inc(stage=stage)
+        if deadline.skipped:
+            request_log.set(deadline_skipped=deadline.skipped)
+        request_log.emit(logging.INFO if outcome == "ok" else logging.WARNING, strategy=strategy, outcome=outcome)
+
+    with CHAT_STAGE_SECONDS.time(stage="normalize"):
+        quick_key = normalize_text(prompt)
+        # Seguimientos ("¿y la resta?"): la busqueda y la cache usan la pregunta con su tema
+        query, history = conversation_store.prepare(session_id, prompt) if CONVERSATION_MEMORY else (prompt, "")
+        cache_key = normalize_text(query)
+    if query != prompt:
+        request_log.set(follow_up=True)
 
     if cache_key:
-        quick_reply = QUICK_REPLIES.get(cache_key)
+        stage_start = time.perf_counter()
+        quick_reply = QUICK_REPLIES.get(quick_key)
+        # Con historial la respuesta depende de la conversacion de esta sesion: la cache es compartida
+        cached = None if quick_reply or history else get_cached_chat_response(cache_key)
+        CHAT_STAGE_SECONDS.observe(time.perf_counter() - stage_start, stage="cache_lookup")
+        if not quick_reply and not history:
+            record_cache_lookup("response", cached is not None)
+
         if quick_reply:
             result = {
                 "response": quick_reply,
@@ -320,134 +647,120 @@ def chat():
                 "used_docs": False,
                 "model": OLLAMA_MODEL
             }
-            cache_chat_response(cache_key, result)
-            return jsonify({**result, "cached": False})
+            cache_chat_response(quick_key, result)
+            observe_chat("quick_reply", "ok")
+            return jsonify({**result, "cached": False, "session_id": session_id})
 
-        cached = get_cached_chat_response(cache_key)
         if cached:
-            logger.info("Cache hit: reusing cached reply")
             cached_copy = dict(cached)
             cached_copy["cached"] = True
+            cached_copy["session_id"] = session_id
+            remember(cached["response"])
+            observe_chat("cached", "ok")
             return jsonify(cached_copy)
 
+    strategy = "unknown"
     try:
-        # 1. BUSCAR EN DOCUMENTOS LOCALES
-        context_rag = ""
-        sources = []
+        # 1. BUSCAR EN DOCUMENTOS LOCALES (etapas embedding / vector_query / rerank en rag_system)
+        chunks = []
         best_distance = 999
+        # Solo se guarda en cache lo que salio de una busqueda completa (no durante la carga del indice)
+        cacheable = rag is not None and not history
         
         if rag:
-            logger.info(f"ðŸ” Buscando en documentos: {prompt[:50]}...")
-            context_rag, sources, best_distance = rag.search_forced(prompt, n_results=2)  # Solo 2 chunks
-            
-            if context_rag:
-                logger.info(f"Encontrado: {len(context_rag)} chars de {sources} (dist: {best_distance:.3f})")
+            # Si /rag/prefetch ya busco (casi) la misma pregunta mientras se escribia, no se repite
+            prefetched = prefetch_store.take(session_id, cache_key) if PREFETCH_ENABLED else None
+            if PREFETCH_ENABLED:
+                record_cache_lookup("prefetch", prefetched is not None)
+            if prefetched is not None:
+                chunks, best_distance = prefetched
+                request_log.set(prefetched=True)
             else:
-                logger.info(f"Sin docs relevantes")
+                chunks, best_distance = rag.search_chunks(query, deadline=deadline)
+            request_log.set(chunks_found=len(chunks), best_distance=round(best_distance, 3))
         
         # 2. DECIDIR ESTRATEGIA Y CREAR PROMPT AMIGABLE
+        stage_start = time.perf_counter()
+        used_chunks = []
         
-        if context_rag and len(context_rag) > 50 and best_distance < 0.9:
+        if chunks and best_distance < rag.policy.max_best_distance:
             # ESTRATEGIA: Docs disponibles
-            strategy = "docs_friendly"
-            logger.info(f"Usando documentos (distancia: {best_distance:.3f})")
-            
-            # PROMPT MUY AMIGABLE PARA DOCS
-            contexto_final = f"""Eres el Profesor Axel, un maestro amable y paciente que explica las cosas de manera simple y clara.
+            generation = generation_policy.decide(
+                "docs_friendly", cold=not llm_pool.any_warm(), deadline_seconds=deadline.remaining()
+            )
 
-TU PERSONALIDAD:
-- Eres calido, motivador y siempre positivo
-- Explicas con ejemplos cotidianos que los niños entienden
-- Celebras el aprendizaje: "¡Excelente pregunta!", "¡Muy bien!"
-- Hablas de manera natural, como un amigo que enseña
-
-MATERIAL EDUCATIVO:
-{context_rag[:800]}
-
-INSTRUCCIONES:
-1. Responde de manera SIMPLE y DIRECTA (maximo 3 oraciones cortas)
-2. Usa ejemplos de la vida diaria
-3. Sé motivador y positivo
-4. NO copies textual del material, explica con tus palabras
-5. Si puedes, da un ejemplo práctico
-
-PREGUNTA: {prompt}
-
-RESPUESTA AMIGABLE:"""
-            
-            temperature = 0.25
-            optimal_tokens = 120  # Respuestas mÃ¡s cortas
+            # Empaquetar chunks completos dentro del presupuesto de tokens
+            contexto_final, used_chunks, prompt_stats = context_assembler.build_prompt(
+                get_prompt_template("docs_friendly"), prompt, chunks, generation.num_predict, history
+            )
 
+        if used_chunks:
+            strategy = "docs_friendly"
         else:
             # ESTRATEGIA: Solo modelo
             strategy = "model_friendly"
-            logger.info(f"Usando conocimiento general")
             
-            # PROMPT MUY AMIGABLE PARA MODELO
-            contexto_final = f"""Eres el Profesor Axel, un maestro amable y entusiasta que adora enseñar.
+            generation = generation_policy.decide(
+                strategy, cold=not llm_pool.any_warm(), deadline_seconds=deadline.remaining()
+            )
+            contexto_final, _, prompt_stats = context_assembler.build_prompt(
+                get_prompt_template(strategy), prompt, [], generation.num_predict, history
+            )
 
-TU ESTILO:
-- Explicas de forma simple, clara y divertida
-- Siempre eres positivo y motivador
-- Usas ejemplos que los niños conocen de su vida diaria
-- Eres paciente y comprensivo
-- Te emociona cuando los niños hacen preguntas
-
-REGLAS:
-1. Responde en MÁXIMO 3 oraciones simples
-2. Usa palabras sencillas que un niño entienda
-3. Da un ejemplo práctico si es posible
-4. Sé entusiasta pero no exagerado
-
-PREGUNTA: {prompt}
-
-TU RESPUESTA COMO PROFESOR AXEL:"""
-            
-            temperature = 0.35
-            optimal_tokens = 90  
+        sources = []
+        for chunk in used_chunks:
+            if chunk['source'] not in sources:
+                sources.append(chunk['source'])
         
-        # 3. PREPARAR PAYLOAD
-        max_tokens = min(optimal_tokens, OLLAMA_MAX_TOKENS, 160)
+        CHAT_STAGE_SECONDS.observe(time.perf_counter() - stage_start, stage="prompt_build")
 
+        # 3. PREPARAR PAYLOAD
         payload = {
             "prompt": prompt,
             "context": contexto_final,
-            "model": OLLAMA_MODEL,
-            "temperature": temperature,
-            "max_tokens": max_tokens
+            "temperature": generation.temperature,
+            "max_tokens": generation.num_predict,
+            "num_ctx": context_assembler.num_ctx,
+            "keep_alive": OLLAMA_KEEP_ALIVE
         }
         
-        logger.info(f"Enviando a Ollama (estrategia: {strategy})...")
-        
-        # 4. LLAMAR A OLLAMA
-        php_response = requests.post(
-            PHP_API_URL,
-            json=payload,
-            timeout=OLLAMA_TIMEOUT,
-            headers={'Content-Type': 'application/json; charset=utf-8'}
+        request_log.set(
+            sources=sources,
+            prompt_tokens=prompt_stats['prompt_tokens'],
+            history_tokens=prompt_stats['history_tokens'],
+            num_ctx=prompt_stats['num_ctx'],
+            num_predict=generation.num_predict,
+            load_level=generation.level,
+            queue_depth=generation.queue_depth,
+            deadline_left_ms=round(deadline.remaining() * 1000),
         )
         
-        if php_response.status_code != 200:
-            logger.error(f"âŒ Error HTTP {php_response.status_code}")
-            return jsonify({"error": "Error en el servicio"}), 500
-        
-        try:
-            php_data = php_response.json()
-        except json.JSONDecodeError:
-            logger.error("Respuesta no es JSON valido")
-            return jsonify({"error": "Error en respuesta del servicio"}), 500
-        
-        if not php_data.get('success'):
-            error_msg = php_data.get('error', 'Error desconocido')
-            logger.error(f"Error desde PHP: {error_msg}")
-            return jsonify({"error": error_msg}), 500
+        # 4. LLAMAR A OLLAMA (backend con menos peticiones en curso, failover si esta caido)
+        # El plazo se revisa antes de pedir backend: agotarlo en la busqueda no es fallo de Ollama
+        deadline.require("llm", DEADLINE_LLM_MIN_SECONDS)
+        with generation_policy.track(generation), CHAT_STAGE_SECONDS.time(stage="llm_wait"):
+            php_data, backend = llm_pool.call(lambda backend: request_llm(backend, payload, generation, deadline))
         
+        model_used = php_data.get('data', {}).get('model', backend.model)
         response_text = php_data.get('data', {}).get('response', '')
+        llm_metrics = php_data.get('data', {}).get('metrics')
+        prompt_eval = prompt_eval_stats.record(strategy, prompt_stats['prompt_tokens'], llm_metrics)
+        generation_policy.record(llm_metrics)
+        record_llm_tokens(llm_metrics)
+        request_log.set(backend=backend.name)
+        if prompt_eval:
+            request_log.set(
+                prompt_eval_count=prompt_eval['prompt_eval_count'],
+                prompt_eval_ms=prompt_eval['prompt_eval_ms'],
+                reused_tokens_est=prompt_eval['reused_tokens_est'],
+            )
         
         if not response_text:
+            observe_chat(strategy, "empty")
             return jsonify({"error": "No se recibió respuesta"}), 500
 
         # 5. POST-PROCESAMIENTO PARA RESPUESTAS MÁS AMIGABLES
+        stage_start = time.perf_counter()
         response_text = response_text.strip()
         
         # Limpiar frases muy formales o roboticas
@@ -471,14 +784,8 @@ TU RESPUESTA COMO PROFESOR AXEL:"""
         # Asegurar que termina con puntuaciÃ³n
         if response_text and response_text[-1] not in ['.', '!', '?']:
             response_text += '.'
-        
-        logger.info("=" * 60)
-        logger.info(f"RESPUESTA:")
-        logger.info(f"   Estrategia: {strategy}")
-        logger.info(f"   Longitud: {len(response_text)} chars")
-        logger.info(f"   Oraciones: {len(sentences)}")
-        logger.info(f"   Fuentes: {sources if sources else 'Conocimiento general'}")
-        logger.info("=" * 60)
+        CHAT_STAGE_SECONDS.observe(time.perf_counter() - stage_start, stage="postprocess")
+        request_log.set(response_chars=len(response_text), sentences=len(sentences))
         
         # 6. DEVOLVER RESPUESTA
         base_payload = {
@@ -486,24 +793,52 @@ TU RESPUESTA COMO PROFESOR AXEL:"""
             "strategy": strategy,
             "sources": sources if sources else [],
             "used_docs": len(sources) > 0,
-            "model": OLLAMA_MODEL
+            "model": model_used
         }
 
-        cache_chat_response(cache_key, base_payload)
-        return jsonify({**base_payload, "cached": False})
+        # Una respuesta que se salto la busqueda por falta de tiempo no se sirve a otros
+        if cacheable and not deadline.skipped_retrieval():
+            cache_chat_response(cache_key, base_payload)
+        remember(response_text)
+        observe_chat(strategy, "ok")
+        return jsonify({
+            **base_payload,
+            "cached": False,
+            "session_id": session_id,
+            "prompt_eval": prompt_eval,
+            "generation": generation.to_dict(),
+            "deadline": deadline.to_dict(),
+            "backend": backend.name
+        })
         
+    except NoBackendAvailable:
+        observe_chat(strategy, "unavailable")
+        logger.error("Sin backends de LLM disponibles")
+        return jsonify({"error": "El servicio no está disponible, intenta en un momento"}), 503
+
+    except BackendError as e:
+        observe_chat(strategy, "backend_error")
+        logger.error("Error del backend: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+    except DeadlineExceeded as e:
+        observe_chat(strategy, "deadline")
+        logger.error("Plazo agotado: %s", e)
+        return jsonify({"error": "El servicio tardó demasiado"}), 504
+
     except requests.exceptions.Timeout:
+        observe_chat(strategy, "timeout")
         logger.error("Timeout")
         return jsonify({"error": "El servicio tardó demasiado"}), 504
         
     except requests.exceptions.ConnectionError:
+        observe_chat(strategy, "connection_error")
         logger.error("Error de conexión")
         return jsonify({"error": "No se pudo conectar con el servicio"}), 503
         
     except Exception as e:
-        logger.error(f"Error: {str(e)}")
-        import traceback
-        logger.error(traceback.format_exc())
+        observe_chat(strategy, "error")
+        logger.exception("Error: %s", e)
         return jsonify({"error": "Error procesando la pregunta"}), 500
     
 # ============ TTS (Text-to-Speech) ============
@@ -515,11 +850,13 @@ async def generate_speech_async(text, voice_name):
         with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_file:
             tmp_filename = tmp_file.name
         
-        await communicate.save(tmp_filename)
+        with metrics.TTS_STAGE_SECONDS.time(stage="synthesis"):
+            await communicate.save(tmp_filename)
         
-        with open(tmp_filename, 'rb') as audio_file:
-            audio_data = audio_file.read()
-            audio_base64 = base64.b64encode(audio_data).decode('utf-8')
+        with metrics.TTS_STAGE_SECONDS.time(stage="encoding"):
+            with open(tmp_filename, 'rb') as audio_file:
+                audio_data = audio_file.read()
+                audio_base64 = base64.b64encode(audio_data).decode('utf-8')
         
         try:
             os.unlink(tmp_filename)
@@ -544,12 +881,18 @@ def text_to_speech():
     try:
         voice_name = EDGE_VOICES_ES.get(voice, EDGE_VOICES_ES['gonzalo'])
         audio_base64 = run_async(generate_speech_async(text, voice_name))
-        
-        return jsonify({
-            "audio": f"data:audio/mpeg;base64,{audio_base64}",
-            "voice": voice_name
-        })
+        # El audio en base64 vive hasta serializar la respuesta
+        tts_buffers.add(len(audio_base64))
+        try:
+            metrics.TTS_REQUESTS.inc(outcome="ok")
+            return jsonify({
+                "audio": f"data:audio/mpeg;base64,{audio_base64}",
+                "voice": voice_name
+            })
+        finally:
+            tts_buffers.release(len(audio_base64))
     except Exception as e:
+        metrics.TTS_REQUESTS.inc(outcome="error")
         logger.error(f"Error en TTS: {e}")
         return jsonify({"error": str(e)}), 500
 
@@ -571,13 +914,97 @@ def get_voices():
 
 
 
+@app.route("/ready", methods=["GET"])
+def readiness():
+    """Readiness: 200 cuando el RAG esta listo; 503 mientras carga (con progreso)"""
+    status = get_rag_status()
+    # Sin documentos el servicio funciona igual (solo modelo): se considera listo
+    ready = status["state"] in ("ready", "disabled")
+    return jsonify({
+        "ready": ready,
+        "rag": status,
+        "fallback_strategy": None if status["state"] == "ready" else "model_friendly",
+        "backends": llm_pool.snapshot()
+    }), 200 if ready else 503
+
+@app.route("/model/status", methods=["GET"])
+def model_status():
+    """Estado de cada backend de Ollama: salud, circuito, cola y warm-up"""
+    return jsonify({"backends": llm_pool.snapshot()})
+
+@app.route("/model/warmup", methods=["POST"])
+@require_admin
+def model_warmup_now():
+    """Forzar la carga del modelo en todos los backends (p. ej. antes de una clase fuera de horario)"""
+    loaded = [backend.warmup.warm() for backend in llm_pool.backends if backend.warmup]
+    return jsonify({"loaded": any(loaded), "backends": llm_pool.snapshot()}), 200 if any(loaded) else 503
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Metricas en formato Prometheus: etapas de /chat y /tts, caches, cola del LLM e indice.
+
+    Con pre-fork (SERVER_WORKERS>1) son las del proceso que atiende el scrape, no
+    un total: cada serie lleva las etiquetas worker y pid para no mezclarlas, y
+    hay que sumar sin ellas (sum without (worker, pid)) en Prometheus.
+    """
+    return Response(metrics.REGISTRY.render(), mimetype=metrics.CONTENT_TYPE)
+
+@app.route("/admin/memory", methods=["GET"])
+@require_admin
+def admin_memory():
+    """RSS del proceso (actual, pico e historial) y bytes estimados por componente.
+
+    ?history=false omite las muestras de RSS (queda el resumen). Con pre-fork
+    cada worker responde por su propio proceso (campo pid).
+    """
+    include_history = request.args.get("history", "true").lower() != "false"
+    return jsonify(memory_monitor.report(include_history=include_history))
+
+
+@app.route("/admin/memory/snapshot", methods=["POST", "DELETE"])
+@require_admin
+def admin_memory_snapshot():
+    """POST: snapshot de tracemalloc con las asignaciones mas grandes y, desde el
+    segundo, las que mas crecieron respecto al anterior. DELETE: desactivar tracemalloc.
+    """
+    if request.method == "DELETE":
+        memory_monitor.stop_tracing()
+        return jsonify({"tracemalloc": memory_monitor.tracemalloc_status()})
+
+    data = request.get_json(silent=True) or {}
+    try:
+        top = int(data.get("top") or request.args.get("top") or 0) or None
+    except ValueError:
+        return jsonify({"error": "top debe ser un entero"}), 400
+    start = time.perf_counter()
+    result = memory_monitor.take_snapshot(top=top)
+    result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+    result["tracemalloc"] = memory_monitor.tracemalloc_status()
+    return jsonify(result)
+
+
+@app.route("/prompt/stats", methods=["GET"])
+def prompt_stats_endpoint():
+    """Tokens y tiempo de prompt-eval acumulados por plantilla (verifica la reutilizacion del prefijo)"""
+    return jsonify({
+        "keep_alive": OLLAMA_KEEP_ALIVE,
+        "templates": prompt_eval_stats.snapshot(),
+        "generation": generation_policy.snapshot()
+    })
+
+@app.route("/conversation/stats", methods=["GET"])
+def conversation_stats():
+    """Sesiones en memoria, bytes usados y expulsiones (con pre-fork, desactivada y por que)"""
+    return jsonify(conversation_store.snapshot())
+
 @app.route("/rag/stats", methods=["GET"])
 def rag_stats():
     """Obtener estadísticas del RAG"""
     if not rag:
         return jsonify({
             "error": "RAG no disponible",
-            "status": "disabled"
+            "status": get_rag_status()["state"],
+            "rag": get_rag_status()
         }), 503
     
     try:
@@ -592,11 +1019,65 @@ def rag_stats():
             "status": "error"
         }), 500
 
+@app.route("/rag/prefetch", methods=["POST", "OPTIONS"])
+def rag_prefetch():
+    """Busqueda anticipada: index.html la llama (con debounce) mientras se escribe la pregunta"""
+    if request.method == "OPTIONS":
+        return '', 204
+
+    data = request.get_json(silent=True) or {}
+    prompt = data.get("prompt", "")
+    # Primera pregunta de la pagina: la sesion se crea aqui y el cliente la usa en /chat
+    session_id = data.get("session_id")
+    if not ConversationStore.valid_session_id(session_id):
+        session_id = ConversationStore.new_session_id()
+
+    if not PREFETCH_ENABLED:
+        return jsonify({"status": "disabled", "session_id": session_id})
+    if not rag:
+        # El indice todavia carga: el cliente vuelve a intentar en la proxima pausa
+        return jsonify({"status": "unavailable", "session_id": session_id})
+
+    # Misma consulta que armaria /chat (con el tema en preguntas de seguimiento)
+    query, _ = conversation_store.prepare(session_id, prompt) if CONVERSATION_MEMORY else (prompt, "")
+    quick_key = normalize_text(prompt)
+    cache_key = normalize_text(query)
+    if len(quick_key) < PREFETCH_MIN_CHARS or quick_key in QUICK_REPLIES or cache_key in response_cache:
+        return jsonify({"status": "skipped", "session_id": session_id})
+
+    # Sin cupo no se espera: la anticipacion no debe competir con las preguntas enviadas
+    if not prefetch_store.try_begin():
+        return jsonify({"status": "busy", "session_id": session_id})
+    try:
+        start = time.perf_counter()
+        chunks, best_distance = rag.search_chunks(query)
+        prefetch_store.put(session_id, cache_key, chunks, best_distance)
+    except Exception as e:
+        logger.warning("Error en busqueda anticipada: %s", e)
+        return jsonify({"status": "error", "session_id": session_id})
+    finally:
+        prefetch_store.end()
+
+    return jsonify({
+        "status": "ready",
+        "session_id": session_id,
+        "chunks": len(chunks),
+        "best_distance": round(best_distance, 3),
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+    })
+
+
+@app.route("/rag/prefetch/stats", methods=["GET"])
+def rag_prefetch_stats():
+    """Ranuras de busqueda anticipada, aciertos y descartes (con pre-fork, desactivada y por que)"""
+    return jsonify(prefetch_store.snapshot())
+
+
 @app.route("/rag/search-test", methods=["POST"])
 def rag_search_test():
     """Probar busqueda en RAG"""
     if not rag:
-        return jsonify({"error": "RAG no disponible"}), 503
+        return jsonify({"error": "RAG no disponible", "rag": get_rag_status()}), 503
     
     data = request.get_json()
     query = data.get("query", "")
@@ -605,13 +1086,21 @@ def rag_search_test():
         return jsonify({"error": "Query vacío"}), 400
     
     try:
-        context, sources = rag.search(query, n_results=3)
+        # Permite probar ajustes de la politica sin reiniciar: {"policy": {"top_k": 5}}
+        overrides = data.get("policy") or {}
+        policy = rag.policy.replace(**overrides) if overrides else rag.policy
+
+        context, sources, distance = rag.search(query, policy=policy)
         return jsonify({
             "query": query,
             "context": context,
             "sources": sources,
-            "context_length": len(context)
+            "distance": distance,
+            "context_length": len(context),
+            "policy": policy.to_dict()
         })
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
     
@@ -620,30 +1109,31 @@ def rag_diagnostics():
     """DiagnÃ³stico completo del RAG"""
     if not rag:
         return jsonify({
-            "status": "disabled",
-            "error": "RAG no inicializado"
+            "status": get_rag_status()["state"],
+            "error": "RAG no inicializado",
+            "rag": get_rag_status()
         }), 503
     
     try:
         # Obtener estadÃ­sticas
         stats = rag.get_stats()
         
-        # Verificar archivos en disco
-        docs_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "docs"))
+        # Verificar archivos en disco (sin leerlos enteros)
+        docs_path = os.path.abspath(rag.docs_dir)
         files_on_disk = []
         
         if os.path.exists(docs_path):
-            for filename in os.listdir(docs_path):
-                if filename.endswith('.txt'):
-                    filepath = os.path.join(docs_path, filename)
-                    with open(filepath, 'r', encoding='utf-8') as f:
-                        content = f.read()
-                    files_on_disk.append({
-                        "filename": filename,
-                        "size": len(content),
-                        "lines": len(content.split('\n')),
-                        "preview": content[:200]
-                    })
+            for filepath in list_documents(docs_path):
+                entry = {
+                    "filename": document_name(filepath, docs_path),
+                    "size": os.path.getsize(filepath),
+                }
+                if filepath.endswith('.txt'):
+                    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+                        entry["preview"] = f.read(200)
+                else:
+                    entry["type"] = "pdf"
+                files_on_disk.append(entry)
         
         # Hacer bÃºsqueda de prueba
         test_queries = [
@@ -656,18 +1146,20 @@ def rag_diagnostics():
         
         test_results = []
         for query in test_queries:
-            context, sources = rag.search(query, n_results=3)
+            context, sources, distance = rag.search(query)
             test_results.append({
                 "query": query,
                 "found_context": len(context) > 0,
                 "context_length": len(context),
                 "sources": sources,
+                "distance": distance,
                 "preview": context[:150] if context else "No encontrado"
             })
         
         return jsonify({
             "status": "active",
             "rag_stats": stats,
+            "policy": rag.policy.to_dict(),
             "docs_path": docs_path,
             "files_on_disk": files_on_disk,
             "test_searches": test_results
@@ -684,35 +1176,25 @@ def rag_diagnostics():
 @app.route("/rag/reindex", methods=["POST"])
 def rag_reindex():
     """Forzar reindexacion manual"""
-    global rag
+    if INDEX_BUNDLE_PATH:
+        return jsonify({
+            "success": False,
+            "error": "El indice es un bundle precompilado: reconstruirlo con build_index.py"
+        }), 409
+
+    if process_role == "reader":
+        # Solo el proceso escritor modifica el indice; los workers recargan al terminar
+        signal_writer(SIGNAL_REINDEX)
+        return jsonify({
+            "success": True,
+            "message": "Reindexacion solicitada al proceso escritor"
+        }), 202
     
     try:
         logger.info("Reindexacion manual solicitada...")
         
-        # Eliminar Ã­ndice actual
-        if rag:
-            try:
-                rag.client.delete_collection("docs_educativos")
-                logger.info("Indice anterior eliminado")
-            except:
-                pass
-        
-        # Determinar ruta de docs
-        if IS_SERVER:
-            docs_path = "/app/docs"
-        else:
-            current_file = os.path.abspath(__file__)
-            app_dir = os.path.dirname(current_file)
-            project_root = os.path.dirname(app_dir)
-            docs_path = os.path.join(project_root, "docs")
-        
-        docs_path = os.path.abspath(docs_path)
-        
-        # Reinicializar RAG
-        from rag_system import RAGSystem
-        rag = RAGSystem(docs_dir=docs_path)
-        
-        stats = rag.get_stats()
+        # Reconstruir en un RAGSystem nuevo (indice compacto o coleccion de Chroma nuevos)
+        stats = rebuild_rag().get_stats()
         
         return jsonify({
             "success": True,
@@ -730,6 +1212,106 @@ def rag_reindex():
         }), 500
 
 
+@app.route("/avas2/crawl", methods=["GET", "POST"])
+def avas2_crawl():
+    """GET: estado del rastreo de AVAS-2 | POST: lanzar un rastreo en segundo plano"""
+    if request.method == "GET":
+        return jsonify({**avas2_crawler.status(), "process_role": process_role})
+
+    if process_role == "reader":
+        # El rastreo actualiza el indice: lo hace el proceso escritor
+        signal_writer(SIGNAL_CRAWL)
+        return jsonify({"success": True, "message": "Rastreo solicitado al proceso escritor"}), 202
+    if not avas2_crawler.crawl_async():
+        return jsonify({"success": False, "message": "Ya hay un rastreo en curso"}), 409
+    return jsonify({"success": True, "message": "Rastreo iniciado"}), 202
+
+
+@app.route("/rag/watcher", methods=["GET"])
+def rag_watcher():
+    """Estado de la vigilancia de docs/ (DOCS_WATCH) y ultima actualizacion aplicada.
+    Con pre-fork corre en el proceso escritor: los workers la reportan desactivada."""
+    return jsonify({**docs_watcher.status(), "process_role": process_role})
+
+
+# ============ SERVICIOS DE FONDO ============
+def start_background_services(writer=True):
+    """Hilos de fondo del proceso: sondeo y warm-up de Ollama, loop de TTS, muestreo de
+    memoria y, solo en el proceso que escribe el indice, el rastreo periodico de AVAS-2
+    y la vigilancia de docs/"""
+    llm_pool.start()
+    start_tts_loop()
+    memory_monitor.start()
+    if writer:
+        avas2_crawler.start()
+        start_docs_watcher()
+
+
+def split_cpu_threads():
+    """Hilos de inferencia por proceso: los nucleos repartidos entre los workers"""
+    if rag:
+        rag.embedder.after_fork(max(1, (os.cpu_count() or 1) // SERVER_WORKERS))
+
+
+def start_reader(role):
+    """Inicio de cada worker HTTP tras el fork: solo lee el indice y lo recarga si cambia"""
+    global process_role
+    process_role = "reader"
+    metrics.REGISTRY.set_const_labels(worker=role.rsplit("-", 1)[-1], pid=os.getpid())
+    split_cpu_threads()
+    start_background_services(writer=False)
+
+    def watch_index():
+        while True:
+            time.sleep(INDEX_RELOAD_INTERVAL)
+            if rag:
+                try:
+                    if rag.reload_if_changed():
+                        invalidate_answer_caches()
+                except Exception as e:
+                    logger.error(f"Error recargando el indice: {e}")
+
+    threading.Thread(target=watch_index, name="index-reload", daemon=True).start()
+
+
+def run_index_writer():
+    """Proceso escritor (pre-fork): el unico que reindexa, rastrea AVAS-2 y actualiza el indice"""
+    global process_role
+    process_role = "writer"
+    split_cpu_threads()
+    # Sin sondeo de Ollama ni loop de TTS: el escritor no atiende peticiones
+    reindex_requested = threading.Event()
+    crawl_requested = threading.Event()
+    stop = threading.Event()
+    signal.signal(SIGNAL_REINDEX, lambda signum, frame: reindex_requested.set())
+    signal.signal(SIGNAL_CRAWL, lambda signum, frame: crawl_requested.set())
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    avas2_crawler.start()
+    start_docs_watcher()
+    logger.info(f"Proceso escritor (pid {os.getpid()}) listo")
+
+    while not stop.wait(0.5):
+        if reindex_requested.is_set():
+            reindex_requested.clear()
+            try:
+                logger.info("Reindexacion solicitada por un worker")
+                rebuild_rag()
+            except Exception as e:
+                logger.error(f"Error en reindexacion: {e}")
+        if crawl_requested.is_set():
+            crawl_requested.clear()
+            avas2_crawler.crawl_async()
+    avas2_crawler.stop()
+    docs_watcher.stop()
+
+
+# __mp_main__: app.py importado por el servidor de procesos de ingestion.py, que solo
+# necesita las funciones; alli no se arrancan servicios ni se carga el indice
+if not PREFORK and __name__ != "__mp_main__":
+    start_background_services()
+    start_rag()
+
+
 # ============ INICIAR SERVIDOR ============
 if __name__ == "__main__":
     port = int(os.getenv('FLASK_PORT', 5000))
@@ -739,13 +1321,21 @@ if __name__ == "__main__":
     print("=" * 60)
     print(f"Sistema iniciado")
     print(f"Accede en: {PUBLIC_URL if IS_SERVER else f'http://localhost:{port}'}")
-    print(f"RAG: {'Activo' if rag else 'No disponible'}")
+    print(f"RAG: {'Activo' if rag else get_rag_status()['state']} (modo {RAG_STARTUP_MODE})")
     print(f"Modelo: {OLLAMA_MODEL}")
     print("=" * 60)
-    
-    app.run(
-        debug=False,
-        host='0.0.0.0',
-        port=port,
-        threaded=True
-    )
+
+    if PREFORK:
+        load_rag_before_fork()
+        PreforkServer(
+            app, '0.0.0.0', port, SERVER_WORKERS,
+            on_worker_start=start_reader,
+            writer=run_index_writer,
+        ).serve()
+    else:
+        app.run(
+            debug=False,
+            host='0.0.0.0',
+            port=port,
+            threaded=True
+        )
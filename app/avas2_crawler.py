@@ -0,0 +1,383 @@
+# app/avas2_crawler.py
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urldefrag, urljoin, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Segundos entre rastreos automaticos (0 = solo manual con POST /avas2/crawl)
+CRAWL_INTERVAL_SECONDS = float(os.getenv("CRAWL_INTERVAL_SECONDS", "0"))
+# Conexiones simultaneas al sitio (tamaño del pool HTTP y de hilos)
+CRAWL_MAX_CONNECTIONS = int(os.getenv("CRAWL_MAX_CONNECTIONS", "4"))
+CRAWL_TIMEOUT = float(os.getenv("CRAWL_TIMEOUT", "15"))
+# Niveles de enlaces a seguir desde la pagina de cada asignatura (solo dentro de su URL)
+CRAWL_DEPTH = int(os.getenv("CRAWL_DEPTH", "1"))
+CRAWL_MAX_PAGES = int(os.getenv("CRAWL_MAX_PAGES", "80"))
+# Paginas con menos texto util se ignoran (menus, paginas de enlaces)
+CRAWL_MIN_TEXT_CHARS = int(os.getenv("CRAWL_MIN_TEXT_CHARS", "200"))
+CRAWL_CACHE_DIR = os.getenv("CRAWL_CACHE_DIR", os.path.abspath("./crawl_cache"))
+# Subcarpeta de docs/ donde se escriben las paginas extraidas como TXT
+CRAWL_DOCS_SUBDIR = os.getenv("CRAWL_DOCS_SUBDIR", "avas2")
+CRAWL_USER_AGENT = os.getenv("CRAWL_USER_AGENT", "AsistenteAVAS2/1.0 (+indexador educativo)")
+
+# Etiquetas sin contenido para el estudiante
+_NOISE_TAGS = ("script", "style", "noscript", "nav", "header", "footer", "form", "aside", "iframe", "svg")
+# Contenedores del contenido principal (WordPress y HTML semantico), en orden de preferencia
+_CONTENT_SELECTORS = ("main", "article", ".entry-content", "#content", ".content")
+_SKIP_EXTENSIONS = (".jpg", ".jpeg", ".png", ".gif", ".webp", ".svg", ".pdf", ".zip", ".mp3", ".mp4", ".doc", ".docx")
+_SPACES = re.compile(r"[ \t\xa0]+")
+
+
+def extract_page(html, base_url):
+    """(titulo, texto, enlaces) de una pagina HTML.
+
+    Los titulos (h1-h4) quedan en su propia linea en mayusculas para que el
+    chunker los reconozca como encabezados.
+    """
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.get_text(" ", strip=True) if soup.title else ""
+
+    links = []
+    for anchor in soup.find_all("a", href=True):
+        url = urldefrag(urljoin(base_url, anchor["href"]))[0]
+        if url.startswith(("http://", "https://")):
+            links.append(url)
+
+    for tag in soup(_NOISE_TAGS):
+        tag.decompose()
+
+    root = None
+    for selector in _CONTENT_SELECTORS:
+        root = soup.select_one(selector)
+        if root is not None:
+            break
+    root = root or soup.body or soup
+
+    lines = []
+    for element in root.find_all(["h1", "h2", "h3", "h4", "p", "li", "td", "blockquote"]):
+        # Solo bloques hoja: evita repetir el texto de un <li> que contiene <p>
+        if element.find(["p", "li", "td"]):
+            continue
+        text = _SPACES.sub(" ", element.get_text(" ", strip=True)).strip()
+        if not text:
+            continue
+        lines.append(text.upper() if element.name in ("h1", "h2", "h3", "h4") else text)
+
+    return title, "\n".join(lines), links
+
+
+def _slug(text, limit=60):
+    import unicodedata
+
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii").lower()
+    text = re.sub(r"[^a-z0-9]+", "-", text).strip("-")
+    return text[:limit].strip("-") or "pagina"
+
+
+class PageCache:
+    """Cache persistente de paginas: HTML + ETag/Last-Modified + hash del texto extraido"""
+
+    def __init__(self, path=CRAWL_CACHE_DIR):
+        self.path = os.path.abspath(path)
+        self.pages_dir = os.path.join(self.path, "pages")
+        os.makedirs(self.pages_dir, exist_ok=True)
+        self.index_file = os.path.join(self.path, "index.json")
+        self.lock = threading.Lock()
+        self.entries = {}
+        if os.path.exists(self.index_file):
+            try:
+                with open(self.index_file, "r", encoding="utf-8") as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Cache de paginas ilegible ({e}), empezando de cero")
+
+    def _html_path(self, url):
+        return os.path.join(self.pages_dir, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".html")
+
+    def get(self, url):
+        with self.lock:
+            entry = self.entries.get(url)
+        return dict(entry) if entry else None
+
+    def conditional_headers(self, url):
+        entry = self.get(url)
+        headers = {}
+        if entry and os.path.exists(self._html_path(url)):
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def read_html(self, url):
+        with open(self._html_path(url), "r", encoding="utf-8") as f:
+            return f.read()
+
+    def store(self, url, html, **fields):
+        with open(self._html_path(url), "w", encoding="utf-8") as f:
+            f.write(html)
+        with self.lock:
+            entry = self.entries.setdefault(url, {})
+            entry.update(fields, fetched_at=time.time())
+
+    def update(self, url, **fields):
+        with self.lock:
+            self.entries.setdefault(url, {}).update(fields)
+
+    def forget(self, url):
+        with self.lock:
+            entry = self.entries.pop(url, None)
+        try:
+            os.remove(self._html_path(url))
+        except FileNotFoundError:
+            pass
+        return entry
+
+    def save(self):
+        with self.lock:
+            data = json.dumps(self.entries, indent=2, ensure_ascii=False)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp_path, self.index_file)
+
+
+class AVAS2Crawler:
+    """Rastreo concurrente de las paginas de asignaturas de AVAS-2.
+
+    - Peticiones condicionales (If-None-Match / If-Modified-Since): una pagina
+      sin cambios responde 304 y no se descarga ni se reprocesa.
+    - Pool de conexiones acotado (CRAWL_MAX_CONNECTIONS) compartido por los hilos.
+    - El texto de cada pagina se escribe como TXT en docs/<CRAWL_DOCS_SUBDIR>/<materia>/
+      y solo las paginas cuyo texto cambio se pasan a rag.update_documents().
+    """
+
+    def __init__(self, subjects, docs_dir, get_rag=None, cache=None, max_connections=CRAWL_MAX_CONNECTIONS,
+                 depth=CRAWL_DEPTH, max_pages=CRAWL_MAX_PAGES, timeout=CRAWL_TIMEOUT,
+                 interval=CRAWL_INTERVAL_SECONDS, session=None):
+        # subjects: {materia: url} (las paginas de AVAS2_REAL_INFO["asignaturas"])
+        self.subjects = dict(subjects)
+        self.docs_dir = os.path.abspath(docs_dir)
+        self.output_dir = os.path.join(self.docs_dir, CRAWL_DOCS_SUBDIR)
+        self.get_rag = get_rag or (lambda: None)
+        self.cache = cache or PageCache()
+        self.max_connections = max(1, max_connections)
+        self.depth = depth
+        self.max_pages = max_pages
+        self.timeout = timeout
+        self.interval = interval
+        self.session = session or self._build_session()
+
+        self.lock = threading.Lock()
+        self.running = False
+        self.last_result = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _build_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=self.max_connections, pool_maxsize=self.max_connections,
+                              max_retries=1, pool_block=True)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        session.headers["User-Agent"] = CRAWL_USER_AGENT
+        return session
+
+    # ============ RASTREO ============
+    def crawl(self):
+        """Un rastreo completo; devuelve el resumen (tambien queda en last_result)"""
+        with self.lock:
+            if self.running:
+                return {"skipped": True, "reason": "rastreo en curso"}
+            self.running = True
+
+        start = time.perf_counter()
+        result = {"fetched": 0, "not_modified": 0, "changed": [], "removed": [], "errors": [], "pages": 0}
+        try:
+            seen = set(self.subjects.values())
+            frontier = [(url, subject) for subject, url in self.subjects.items()]
+            level = 0
+            with ThreadPoolExecutor(max_workers=self.max_connections, thread_name_prefix="crawler") as executor:
+                while frontier and level <= self.depth:
+                    next_frontier = []
+                    pages = list(executor.map(lambda item: self._visit(*item, result), frontier))
+                    for (url, subject), links in zip(frontier, pages):
+                        if level == self.depth:
+                            continue
+                        prefix = self.subjects[subject]
+                        for link in links or []:
+                            if len(seen) >= self.max_pages:
+                                break
+                            if link not in seen and self._in_scope(link, prefix):
+                                seen.add(link)
+                                next_frontier.append((link, subject))
+                    frontier = next_frontier
+                    level += 1
+            result["pages"] = len(seen)
+            self.cache.save()
+            self._feed_rag(result)
+        finally:
+            result["seconds"] = round(time.perf_counter() - start, 2)
+            result["finished_at"] = time.time()
+            with self.lock:
+                self.running = False
+                self.last_result = result
+
+        logger.info(
+            f"Rastreo AVAS-2: {result['pages']} paginas, {result['fetched']} descargadas, "
+            f"{result['not_modified']} sin cambios (304), {len(result['changed'])} actualizadas, "
+            f"{len(result['errors'])} errores en {result['seconds']}s"
+        )
+        return result
+
+    @staticmethod
+    def _in_scope(url, prefix):
+        path = urlparse(url).path.lower()
+        return url.startswith(prefix) and not path.endswith(_SKIP_EXTENSIONS)
+
+    def _visit(self, url, subject, result):
+        """Descargar (o revalidar) una pagina; devuelve sus enlaces"""
+        try:
+            response = self.session.get(url, headers=self.cache.conditional_headers(url), timeout=self.timeout)
+        except requests.RequestException as e:
+            self._error(result, url, str(e))
+            return []
+
+        if response.status_code == 304:
+            with self.lock:
+                result["not_modified"] += 1
+            try:
+                html = self.cache.read_html(url)
+            except OSError:
+                return []
+            return extract_page(html, url)[2]
+
+        if response.status_code in (404, 410):
+            self._remove_page(url, result)
+            return []
+
+        if response.status_code != 200:
+            self._error(result, url, f"HTTP {response.status_code}")
+            return []
+
+        if response.encoding is None or response.encoding.lower() == "iso-8859-1":
+            # Sin charset en el encabezado requests asume latin-1; las paginas son UTF-8
+            response.encoding = response.apparent_encoding or "utf-8"
+        html = response.text
+        with self.lock:
+            result["fetched"] += 1
+
+        title, text, links = extract_page(html, url)
+        text_hash = hashlib.md5(text.encode("utf-8")).hexdigest()
+        previous = self.cache.get(url) or {}
+        self.cache.store(
+            url, html,
+            etag=response.headers.get("ETag"),
+            last_modified=response.headers.get("Last-Modified"),
+            subject=subject,
+        )
+
+        if len(text) < CRAWL_MIN_TEXT_CHARS:
+            return links
+
+        filepath = previous.get("file") or self._page_path(subject, url, title)
+        if previous.get("text_hash") == text_hash and os.path.exists(filepath):
+            return links
+
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        with open(filepath, "w", encoding="utf-8") as f:
+            f.write(f"{title.upper()}\n\n{text}\n\nFuente: {url}\n" if title else f"{text}\n\nFuente: {url}\n")
+        self.cache.update(url, text_hash=text_hash, file=filepath)
+        with self.lock:
+            result["changed"].append(filepath)
+        return links
+
+    def _page_path(self, subject, url, title):
+        path = urlparse(url).path.strip("/")
+        slug = _slug(path.rsplit("/", 1)[-1] if path else title)
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:8]
+        return os.path.join(self.output_dir, subject, f"{slug}-{digest}.txt")
+
+    def _remove_page(self, url, result):
+        entry = self.cache.forget(url) or {}
+        filepath = entry.get("file")
+        if filepath and os.path.exists(filepath):
+            os.remove(filepath)
+            with self.lock:
+                result["removed"].append(filepath)
+
+    def _error(self, result, url, message):
+        logger.warning(f"Rastreo: error en {url}: {message}")
+        with self.lock:
+            result["errors"].append({"url": url, "error": message})
+
+    def _feed_rag(self, result):
+        rag = self.get_rag()
+        if rag is None or not (result["changed"] or result["removed"]):
+            return
+        if result["removed"]:
+            rag.remove_documents([os.path.relpath(path, self.docs_dir).replace(os.sep, "/")
+                                  for path in result["removed"]])
+        if result["changed"]:
+            result["chunks_added"], processed = rag.update_documents(result["changed"])
+            failed = {path for path in result["changed"]
+                      if os.path.relpath(path, self.docs_dir).replace(os.sep, "/") not in processed}
+            if failed:
+                # Sin validadores ni hash: el proximo rastreo descarga y vuelve a pasar esas paginas
+                with self.cache.lock:
+                    for entry in self.cache.entries.values():
+                        if entry.get("file") in failed:
+                            entry.update(etag=None, last_modified=None, text_hash=None)
+                self.cache.save()
+                result["failed"] = sorted(failed)
+
+    # ============ EJECUCION EN SEGUNDO PLANO ============
+    def crawl_async(self):
+        """Lanzar un rastreo en un hilo; False si ya hay uno en curso"""
+        with self.lock:
+            if self.running:
+                return False
+        threading.Thread(target=self._crawl_safely, name="avas2-crawl", daemon=True).start()
+        return True
+
+    def _crawl_safely(self):
+        try:
+            self.crawl()
+        except Exception as e:
+            logger.error(f"Error en rastreo AVAS-2: {e}")
+
+    def start(self):
+        """Rastreo periodico cada interval segundos (no hace nada si interval es 0)"""
+        if self.interval <= 0 or self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._loop, name="avas2-crawler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            self._crawl_safely()
+
+    def status(self):
+        with self.lock:
+            return {
+                "running": self.running,
+                "interval_seconds": self.interval,
+                "subjects": self.subjects,
+                "cached_pages": len(self.cache.entries),
+                "last_result": self.last_result,
+            }
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Preparar los archivos estaticos del chat para servirlos con cache larga
+
+Uso:
+    python build_assets.py [--static ./static] [--quality 80]
+
+- Imagenes: redimensionadas al tamaño con que las muestra index.html (x2 para
+  pantallas de alta densidad) y guardadas en AVIF, WebP y PNG optimizado.
+- CSS/JS/SVG/JSON: copiados con variantes precomprimidas .gz y .br.
+- Nombres con hash del contenido en static/dist/ y un manifest.json que usa
+  static_assets.py para generar las URLs; como el nombre cambia con el
+  contenido, el servidor los marca immutable (un año de cache).
+Requiere Pillow (AVIF desde Pillow 11.2); brotli es opcional (sin el solo .gz).
+"""
+
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+DIST_DIR = "dist"
+MANIFEST = "manifest.json"
+
+# Ancho en px de CSS con que index.html muestra cada imagen (boton 80x100, tablero 700x450)
+DISPLAY_WIDTHS = {
+    "images/normal.png": 80,
+    "images/sonriente.png": 80,
+    "images/tablero-profesor.png": 700,
+    "images/tablero-pensando.png": 700,
+}
+PIXEL_DENSITY = 2
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg")
+COMPRESSIBLE_EXTENSIONS = (".css", ".js", ".svg", ".json", ".txt")
+
+
+def hashed_name(name, data, ext=None):
+    stem, original_ext = os.path.splitext(name)
+    digest = hashlib.sha256(data).hexdigest()[:10]
+    return f"{stem}.{digest}{ext or original_ext}"
+
+
+def write(dist, relative, data):
+    path = os.path.join(dist, relative)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(data)
+    return f"{DIST_DIR}/{relative}"
+
+
+def build_image(static_dir, dist, name, quality):
+    from PIL import Image, features
+
+    with Image.open(os.path.join(static_dir, name)) as source:
+        image = source.convert("RGBA")
+    width = DISPLAY_WIDTHS.get(name)
+    if width and width * PIXEL_DENSITY < image.width:
+        target = width * PIXEL_DENSITY
+        image = image.resize((target, round(image.height * target / image.width)), Image.LANCZOS)
+
+    formats = [("webp", {"quality": quality, "method": 6}), ("png", {"optimize": True})]
+    if features.check("avif"):
+        formats.insert(0, ("avif", {"quality": quality - 20}))
+
+    entry = {"width": image.width, "height": image.height}
+    for fmt, options in formats:
+        buffer = io.BytesIO()
+        image.save(buffer, format=fmt.upper(), **options)
+        data = buffer.getvalue()
+        entry[fmt] = write(dist, hashed_name(name, data, "." + fmt), data)
+        entry[f"{fmt}_bytes"] = len(data)
+    return entry
+
+
+def build_text(static_dir, dist, name):
+    with open(os.path.join(static_dir, name), "rb") as f:
+        data = f.read()
+    relative = hashed_name(name, data)
+    path = write(dist, relative, data)
+    encodings = ["gzip"]
+    write(dist, relative + ".gz", gzip.compress(data, 9, mtime=0))
+    try:
+        import brotli
+        write(dist, relative + ".br", brotli.compress(data, quality=11))
+        encodings.insert(0, "br")
+    except ImportError:
+        pass
+    return {"file": path, "bytes": len(data), "encodings": encodings}
+
+
+def build(static_dir, quality):
+    dist = os.path.join(static_dir, DIST_DIR)
+    shutil.rmtree(dist, ignore_errors=True)
+
+    manifest = {}
+    for root, dirs, files in os.walk(static_dir):
+        dirs[:] = [d for d in dirs if os.path.join(root, d) != dist]
+        for filename in sorted(files):
+            name = os.path.relpath(os.path.join(root, filename), static_dir).replace(os.sep, "/")
+            ext = os.path.splitext(filename)[1].lower()
+            if ext in IMAGE_EXTENSIONS:
+                manifest[name] = build_image(static_dir, dist, name, quality)
+            elif ext in COMPRESSIBLE_EXTENSIONS:
+                manifest[name] = build_text(static_dir, dist, name)
+            else:
+                continue
+            original = os.path.getsize(os.path.join(static_dir, name))
+            best = min((v for k, v in manifest[name].items() if k.endswith("bytes")), default=original)
+            print(f"✅ {name}: {original / 1024:.0f} KB -> {best / 1024:.0f} KB")
+
+    os.makedirs(dist, exist_ok=True)
+    with open(os.path.join(dist, MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    print(f"💡 {len(manifest)} archivos en {dist}")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--static", default=STATIC_DIR)
+    parser.add_argument("--quality", type=int, default=80)
+    args = parser.parse_args()
+    build(os.path.abspath(args.static), args.quality)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Construir un bundle del indice (vectores, textos, metadatos, modelo y version del chunker)
+
+Uso:
+    python build_index.py [--docs ../docs] [--out ./index_bundles] [--version v] [--keep 3]
+
+Indexa docs/ con el mismo RAGSystem del servidor (indice compacto) y guarda el
+resultado en <out>/<version>/ con un manifest.json que incluye el SHA-256 de cada
+archivo; <out>/CURRENT apunta a la ultima version. El servidor lo carga con
+INDEX_BUNDLE_PATH=<out>: mapea los vectores en memoria y no calcula embeddings.
+Un bundle de otro modelo de embeddings (EMBEDDING_MODEL) se rechaza al cargar.
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DOCS = os.path.join(PROJECT_ROOT, "docs")
+DEFAULT_OUTPUT = os.path.abspath("./index_bundles")
+
+
+def build(docs_dir, out_dir, version=None):
+    # El bundle es el formato del indice compacto; se fija antes de importar rag_system
+    os.environ["VECTOR_STORE"] = "compact"
+    import chunker
+    from index_bundle import load_bundle, write_bundle
+    from rag_system import RAGSystem
+
+    docs_dir = os.path.abspath(docs_dir)
+    out_dir = os.path.abspath(out_dir)
+    work = tempfile.mkdtemp(prefix="build-index-")
+    cwd = os.getcwd()
+    # RAGSystem guarda su indice en ./chroma_db: se construye en una carpeta temporal
+    os.chdir(work)
+    try:
+        print(f"📚 Indexando {docs_dir}...")
+        rag = RAGSystem(docs_dir=docs_dir, force_reindex=True, bundle_path="")
+        if rag.collection.count() == 0:
+            raise SystemExit("❌ El indice quedo vacio: no se genera bundle")
+
+        documents = {name: {"hash": info["hash"], "size": info["size"]}
+                     for name, info in rag._get_files_hash().items()}
+        target, manifest = write_bundle(
+            rag.collection, out_dir,
+            embedding_model=rag.embedder.model_id,
+            chunker_version=chunker.CHUNKER_VERSION,
+            documents=documents,
+            version=version,
+        )
+        # Comprobar que el servidor lo podra abrir
+        load_bundle(target, rag.embedder.model_id, rag.embedder.dimension, verify=True)
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work, ignore_errors=True)
+
+    size_kb = sum(info["bytes"] for info in manifest["files"].values()) / 1024
+    print(f"✅ Bundle {manifest['version']}: {manifest['chunks']} chunks de {len(documents)} documentos, "
+          f"{size_kb:.0f} KB, modelo {manifest['embedding_model']}")
+    print(f"💡 Usa: INDEX_BUNDLE_PATH={out_dir}")
+    return target
+
+
+def prune(out_dir, keep):
+    """Borrar versiones antiguas; la actual (CURRENT) nunca se borra"""
+    from index_bundle import resolve_bundle
+
+    current = os.path.basename(resolve_bundle(out_dir))
+    versions = sorted(name for name in os.listdir(out_dir)
+                      if os.path.isdir(os.path.join(out_dir, name)) and not name.startswith("."))
+    for name in versions[:-keep] if keep > 0 else []:
+        if name != current:
+            shutil.rmtree(os.path.join(out_dir, name))
+            print(f"🗑️ Version antigua eliminada: {name}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", default=DEFAULT_DOCS)
+    parser.add_argument("--out", default=DEFAULT_OUTPUT)
+    parser.add_argument("--version", default=None, help="Nombre de la version (por defecto fecha + hash)")
+    parser.add_argument("--keep", type=int, default=3, help="Versiones a conservar en --out (0: todas)")
+    args = parser.parse_args()
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    build(args.docs, args.out, args.version)
+    prune(args.out, args.keep)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+# app/chunker.py
+import re
+
+# Cambiar cuando cambie la salida del chunker: fuerza reindexacion
+CHUNKER_VERSION = "3"
+
+DEFAULT_CHUNK_SIZE = 600
+DEFAULT_OVERLAP = 150
+# Caracteres leidos por bloque al procesar archivos en streaming
+STREAM_BLOCK_SIZE = 256 * 1024
+
+# Patrones precompilados (antes se recompilaban en cada llamada)
+_QA_LABELS = re.compile(r'(?:Pregunta|Respuesta):[ \t]*')
+_EXAMPLE_LABEL = re.compile(r'Ejemplo:[ \t]*')
+_ODD_SPACES = re.compile(r'[\t\r\f\v\xa0]')
+_SPACE_RUNS = re.compile(r'  +')
+_EXTRA_NEWLINES = re.compile(r'\n{3,}')
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def clean_text(text):
+    """Limpiar y normalizar texto conservando los saltos de linea de los titulos"""
+    # Eliminar formato de preguntas/respuestas que confunde
+    text = _QA_LABELS.sub('', text)
+    text = _EXAMPLE_LABEL.sub('Por ejemplo: ', text)
+
+    # Colapsar espacios dentro de cada linea, sin tocar los saltos de linea.
+    # Dos pasadas baratas: casi todo el texto ya usa espacios simples.
+    text = _ODD_SPACES.sub(' ', text)
+    text = _SPACE_RUNS.sub(' ', text)
+    text = text.replace(' \n', '\n').replace('\n ', '\n')
+
+    # Eliminar saltos de linea excesivos
+    text = _EXTRA_NEWLINES.sub('\n\n', text)
+
+    return text.strip()
+
+
+def is_heading(line):
+    """Titulo: linea TODO EN MAYUSCULAS o que empieza con #"""
+    if line.startswith('#'):
+        return True
+    return len(line) >= 3 and len(line) <= 80 and line.isupper()
+
+
+class _SectionBuffer:
+    """Acumula oraciones de una seccion y emite chunks de tamaño acotado"""
+
+    def __init__(self, title, chunk_size, overlap_words):
+        self.prefix = f"{title}\n" if title else ""
+        self.title_len = len(title)
+        self.chunk_size = chunk_size
+        self.overlap_words = overlap_words
+        self.sentences = []
+        self.size = len(self.prefix)
+        self.body_len = 0
+        self.emitted = False
+
+    def add_long(self, sentence):
+        """Como add(), pero una "oracion" mas larga que un chunk (texto sin puntuacion)
+        se parte en palabras; genera los chunks que se llenen"""
+        # Trozos de medio chunk: con el solapamiento del chunk anterior caben sin pasarse mucho
+        limit = self.chunk_size // 2
+        pieces = [sentence] if len(sentence) <= self.chunk_size else _split_words(sentence, limit)
+        for piece in pieces:
+            chunk = self.add(piece)
+            if chunk:
+                yield chunk
+
+    def add(self, sentence):
+        """Agregar una oracion; devuelve un chunk si el buffer se lleno"""
+        self.body_len += len(sentence) + 1
+        if self.size + len(sentence) < self.chunk_size or not self.sentences:
+            self.sentences.append(sentence)
+            self.size += len(sentence) + 1
+            return None
+
+        chunk = self.prefix + ' '.join(self.sentences)
+        self.emitted = True
+
+        tail = _overlap_tail(self.sentences, self.overlap_words)
+        self.sentences = [' '.join(tail)] if tail else []
+        self.sentences.append(sentence)
+        self.size = len(self.prefix) + sum(len(part) + 1 for part in self.sentences)
+        return chunk
+
+    def flush(self):
+        """Ultimo chunk de la seccion; las secciones diminutas (< 50 chars) se descartan"""
+        if not self.sentences:
+            return None
+        if not self.emitted and self.title_len + self.body_len < 50:
+            return None
+        return self.prefix + ' '.join(self.sentences)
+
+
+def iter_chunks(lines, chunk_size=DEFAULT_CHUNK_SIZE, overlap=DEFAULT_OVERLAP):
+    """Generar chunks con contexto de titulo a partir de lineas ya limpias.
+
+    Recorre las lineas una sola vez y solo guarda la seccion en curso, asi que
+    sirve igual para un texto en memoria que para un archivo leido por bloques.
+    """
+    overlap_words = overlap // 5
+    section = _SectionBuffer("", chunk_size, overlap_words)
+    pending = ""  # oracion incompleta que continua en la siguiente linea
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        if line[0] == '#' or (line.isupper() and is_heading(line)):
+            if pending:
+                yield from section.add_long(pending)
+                pending = ""
+            chunk = section.flush()
+            if chunk:
+                yield chunk
+            section = _SectionBuffer(line.replace('#', '').strip(), chunk_size, overlap_words)
+            continue
+
+        text = f"{pending} {line}" if pending else line
+        # La mayoria de las lineas son una sola oracion: evitar el regex
+        if '. ' in text or '? ' in text or '! ' in text:
+            pieces = _SENTENCE_END.split(text)
+        else:
+            pieces = [text]
+        pending = "" if line[-1] in '.!?' else pieces.pop()
+        # Lineas sin puntuacion (OCR, listas, tablas): una vez que la oracion incompleta
+        # llega a medio chunk, el salto de linea cuenta como fin de oracion
+        if len(pending) >= chunk_size // 2:
+            pieces.append(pending)
+            pending = ""
+
+        for sentence in pieces:
+            if sentence:
+                yield from section.add_long(sentence)
+
+    if pending:
+        yield from section.add_long(pending)
+    chunk = section.flush()
+    if chunk:
+        yield chunk
+
+
+def _split_words(text, limit):
+    """Partir text en trozos de hasta limit caracteres, en espacios (una palabra mas larga queda entera)"""
+    if len(text) <= limit:
+        return [text]
+    pieces = []
+    while len(text) > limit:
+        cut = text.rfind(' ', 0, limit + 1)
+        if cut <= 0:
+            cut = text.find(' ', limit)
+            if cut < 0:
+                break
+        pieces.append(text[:cut])
+        text = text[cut + 1:]
+    pieces.append(text)
+    return pieces
+
+
+def _overlap_tail(sentences, max_words):
+    """Ultimas max_words palabras del buffer, partiendo solo las oraciones necesarias"""
+    if max_words <= 0:
+        return []
+    tail = []
+    for sentence in reversed(sentences):
+        words = sentence.split()
+        need = max_words - len(tail)
+        if len(words) >= need:
+            return words[-need:] + tail
+        tail = words + tail
+    # El buffer entero tiene menos palabras que el solapamiento: no se repite
+    return []
+
+
+def iter_clean_lines(stream, block_size=STREAM_BLOCK_SIZE):
+    """Leer un archivo de texto por bloques acotados y devolver lineas limpias"""
+    carry = ""
+    while True:
+        block = stream.read(block_size)
+        if not block:
+            break
+        block = carry + block
+
+        # Cortar en el ultimo salto de linea; una linea gigante se corta en un espacio
+        cut = block.rfind('\n')
+        if cut == -1:
+            cut = block.rfind(' ')
+        cut = cut + 1 if cut != -1 else len(block)
+
+        carry = block[cut:]
+        yield from clean_text(block[:cut]).split('\n')
+
+    if carry:
+        yield from clean_text(carry).split('\n')
+
+
+def create_smart_chunks(text, chunk_size=DEFAULT_CHUNK_SIZE, overlap=DEFAULT_OVERLAP):
+    """Crear chunks con contexto de titulo a partir de texto ya limpio"""
+    return list(iter_chunks(text.split('\n'), chunk_size, overlap))
+
+
+def chunk_document(raw_text, chunk_size=DEFAULT_CHUNK_SIZE, overlap=DEFAULT_OVERLAP):
+    """Limpiar y dividir un documento completo"""
+    return create_smart_chunks(clean_text(raw_text), chunk_size, overlap)
+
+
+def iter_document_chunks(stream, chunk_size=DEFAULT_CHUNK_SIZE, overlap=DEFAULT_OVERLAP,
+                         block_size=STREAM_BLOCK_SIZE):
+    """Limpiar y dividir un archivo abierto sin leerlo entero en memoria"""
+    return iter_chunks(iter_clean_lines(stream, block_size), chunk_size, overlap)
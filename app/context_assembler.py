@@ -0,0 +1,107 @@
+# app/context_assembler.py
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# Ventana de contexto que Ollama usa para el modelo (num_ctx); 2048 es el valor por defecto de Ollama
+OLLAMA_NUM_CTX = int(os.getenv("OLLAMA_NUM_CTX", "2048"))
+# Tope de tokens de material educativo por prompt, para que el prompt-eval sea predecible
+RAG_CONTEXT_TOKENS = int(os.getenv("RAG_CONTEXT_TOKENS", "350"))
+# Caracteres por token: conservador para español con tokenizadores tipo Llama/phi3
+CHARS_PER_TOKEN = float(os.getenv("CHARS_PER_TOKEN", "3.0"))
+# Tokens reservados para imprecision del estimador y tokens especiales de la plantilla del modelo
+SAFETY_MARGIN_TOKENS = int(os.getenv("PROMPT_SAFETY_TOKENS", "64"))
+
+# api.php añade esto despues del contexto que le enviamos
+PHP_PROMPT_SUFFIX = "\n\nPregunta: {prompt}\nRespuesta:"
+
+CHUNK_SEPARATOR = "\n\n"
+_SENTENCE_END = re.compile(r'(?<=[.!?])\s+')
+
+
+def estimate_tokens(text):
+    """Estimacion rapida de tokens sin cargar el tokenizador del modelo"""
+    if not text:
+        return 0
+    return int(len(text) / CHARS_PER_TOKEN) + 1
+
+
+class ContextAssembler:
+    """Empaqueta chunks completos por relevancia hasta el presupuesto de tokens del prompt"""
+
+    def __init__(self, num_ctx=None, max_context_tokens=None, safety_margin=None):
+        self.num_ctx = num_ctx or OLLAMA_NUM_CTX
+        self.max_context_tokens = max_context_tokens if max_context_tokens is not None else RAG_CONTEXT_TOKENS
+        self.safety_margin = safety_margin if safety_margin is not None else SAFETY_MARGIN_TOKENS
+
+    def context_budget(self, template, prompt, max_new_tokens, history=""):
+        """Tokens disponibles para {context} dada la plantilla, la pregunta, el historial y la respuesta esperada"""
+        skeleton = template.format(context="", prompt=prompt, history=history) + PHP_PROMPT_SUFFIX.format(prompt=prompt)
+        fixed_tokens = estimate_tokens(skeleton)
+        available = self.num_ctx - fixed_tokens - max_new_tokens - self.safety_margin
+        return max(0, min(available, self.max_context_tokens))
+
+    def pack(self, chunks, budget_tokens):
+        """Elegir chunks enteros en orden de relevancia sin pasar el presupuesto.
+
+        Devuelve (context, used_chunks). Si ni el chunk mas relevante cabe,
+        se recorta en el limite de la ultima oracion completa que entra.
+        """
+        parts = []
+        used = []
+        used_tokens = 0
+        separator_tokens = estimate_tokens(CHUNK_SEPARATOR)
+
+        for chunk in chunks:
+            text = chunk['text']
+            cost = estimate_tokens(text) + (separator_tokens if parts else 0)
+            if used_tokens + cost <= budget_tokens:
+                parts.append(text)
+                used.append(chunk)
+                used_tokens += cost
+
+        if not parts and chunks and budget_tokens > 0:
+            trimmed = self._trim_to_sentences(chunks[0]['text'], budget_tokens)
+            if trimmed:
+                parts.append(trimmed)
+                used.append(chunks[0])
+
+        return CHUNK_SEPARATOR.join(parts), used
+
+    def _trim_to_sentences(self, text, budget_tokens):
+        out = []
+        used_tokens = 0
+        for sentence in _SENTENCE_END.split(text):
+            cost = estimate_tokens(sentence + " ")
+            if used_tokens + cost > budget_tokens:
+                break
+            out.append(sentence)
+            used_tokens += cost
+        return " ".join(out)
+
+    def build_prompt(self, template, prompt, chunks, max_new_tokens, history=""):
+        """Rellenar la plantilla con el contexto que cabe.
+
+        El historial de la conversacion (ya acotado por ConversationStore) se
+        descuenta del presupuesto del material educativo.
+        Devuelve (prompt_final, used_chunks, stats).
+        """
+        budget = self.context_budget(template, prompt, max_new_tokens, history)
+        context, used = self.pack(chunks, budget)
+        final_prompt = template.format(context=context, prompt=prompt, history=history)
+        stats = {
+            'num_ctx': self.num_ctx,
+            'context_budget_tokens': budget,
+            'context_tokens': estimate_tokens(context),
+            'history_tokens': estimate_tokens(history),
+            'prompt_tokens': estimate_tokens(final_prompt + PHP_PROMPT_SUFFIX.format(prompt=prompt)),
+            'chunks_used': len(used),
+            'chunks_available': len(chunks),
+        }
+        logger.debug(
+            "Contexto ensamblado: %s/%s chunks, %s/%s tokens, prompt ~%s tokens",
+            stats['chunks_used'], stats['chunks_available'], stats['context_tokens'], budget, stats['prompt_tokens'],
+        )
+        return final_prompt, used, stats
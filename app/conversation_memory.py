@@ -0,0 +1,221 @@
+# app/conversation_memory.py
+import os
+import re
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from context_assembler import CHARS_PER_TOKEN, estimate_tokens
+from prefork import SERVER_WORKERS
+
+CONVERSATION_MEMORY = os.getenv("CONVERSATION_MEMORY", "true").lower() == "true"
+# Las sesiones viven en la memoria del proceso y el kernel reparte las conexiones entre
+# workers sin mirar la sesion: con pre-fork cada turno veria un historial distinto
+CONVERSATION_DISABLED_REASON = None
+if CONVERSATION_MEMORY and SERVER_WORKERS > 1:
+    CONVERSATION_MEMORY = False
+    CONVERSATION_DISABLED_REASON = (
+        f"SERVER_WORKERS={SERVER_WORKERS}: las sesiones son por proceso y no se comparten entre workers"
+    )
+# Tope duro de memoria para todas las sesiones juntas; al pasarlo se expulsan las menos usadas (LRU)
+CONVERSATION_MAX_BYTES = int(os.getenv("CONVERSATION_MAX_BYTES", str(2 * 1024 * 1024)))
+CONVERSATION_MAX_SESSIONS = int(os.getenv("CONVERSATION_MAX_SESSIONS", "1000"))
+CONVERSATION_TTL_SECONDS = float(os.getenv("CONVERSATION_TTL_SECONDS", "1800"))
+# Turnos recientes que se guardan completos; los anteriores pasan al resumen
+CONVERSATION_RECENT_TURNS = int(os.getenv("CONVERSATION_RECENT_TURNS", "2"))
+# Tope de tokens del historial (resumen + turnos recientes) que se agrega al prompt
+CONVERSATION_HISTORY_TOKENS = int(os.getenv("CONVERSATION_HISTORY_TOKENS", "120"))
+CONVERSATION_SUMMARY_TOKENS = int(os.getenv("CONVERSATION_SUMMARY_TOKENS", "50"))
+# follow_up: historial solo en preguntas de seguimiento ("¿y la resta?") | always: en todas
+CONVERSATION_HISTORY_MODE = os.getenv("CONVERSATION_HISTORY_MODE", "follow_up").lower()
+
+# Caracteres guardados por pregunta/respuesta (el resto no cabria en el historial igual)
+_TURN_CHARS = 240
+# Costo fijo aproximado de una sesion en memoria (objetos, deque, entrada del OrderedDict)
+_SESSION_OVERHEAD_BYTES = 600
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{8,64}$")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_FOLLOW_UP_START = re.compile(
+    r"^\W*(y|e|pero|entonces|tambien|también|otra vez|otro|otra|mas|más|eso|esa|ese|esto|"
+    r"por que|por qué|como asi|cómo así|and|what about)\b",
+    re.IGNORECASE,
+)
+# Preguntas de una o dos palabras dependen del tema anterior ("¿ejemplos?", "¿por qué?")
+_FOLLOW_UP_MAX_WORDS = 2
+
+
+def is_follow_up(prompt):
+    words = prompt.split()
+    return bool(_FOLLOW_UP_START.match(prompt)) or len(words) <= _FOLLOW_UP_MAX_WORDS
+
+
+def _clip(text, limit):
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit].rsplit(" ", 1)[0] + "..."
+
+
+def _first_sentence(text):
+    return _SENTENCE_END.split(text.strip(), 1)[0] if text else ""
+
+
+class Session:
+    __slots__ = ("session_id", "turns", "summary", "topic", "last_used", "turn_count", "nbytes")
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.turns = deque()        # (pregunta, respuesta) recientes
+        self.summary = ""
+        self.topic = ""             # ultima pregunta que no era de seguimiento
+        self.last_used = time.time()
+        self.turn_count = 0
+        self.nbytes = _SESSION_OVERHEAD_BYTES
+
+    def _measure(self):
+        size = _SESSION_OVERHEAD_BYTES + len(self.summary.encode("utf-8")) + len(self.topic.encode("utf-8"))
+        for question, answer in self.turns:
+            size += len(question.encode("utf-8")) + len(answer.encode("utf-8")) + 64
+        self.nbytes = size
+
+    def add_turn(self, question, answer, recent_turns, summary_tokens):
+        if not self.topic or not is_follow_up(question):
+            self.topic = _clip(question, 120)
+        self.turns.append((_clip(question, _TURN_CHARS), _clip(answer, _TURN_CHARS)))
+        self.turn_count += 1
+        while len(self.turns) > recent_turns:
+            old_question, old_answer = self.turns.popleft()
+            self._fold(old_question, old_answer, summary_tokens)
+        self._measure()
+
+    def _fold(self, question, answer, summary_tokens):
+        """Resumen extractivo acumulado: pregunta + primera oracion de la respuesta.
+
+        No llama al modelo: cuesta microsegundos y tiene tamaño fijo. Lo mas
+        antiguo se descarta por el inicio cuando pasa de summary_tokens.
+        """
+        entry = f"{_clip(question, 80)} -> {_clip(_first_sentence(answer), 100)}"
+        summary = f"{self.summary} | {entry}" if self.summary else entry
+        max_chars = int(summary_tokens * CHARS_PER_TOKEN)
+        if len(summary) > max_chars:
+            summary = summary[-max_chars:]
+            cut = summary.find(" | ")
+            summary = summary[cut + 3:] if cut != -1 else summary
+        self.summary = summary
+
+    def history_text(self, max_tokens):
+        """Historial para el prompt, dentro de max_tokens (primero se sacrifica el resumen)"""
+        recent = [f"Estudiante: {q}\nProfesor: {a}" for q, a in self.turns]
+        parts = ([f"Antes hablaron de: {self.summary}"] if self.summary else []) + recent
+        while parts and estimate_tokens("\n".join(parts)) > max_tokens:
+            parts.pop(0)
+        if not parts:
+            return ""
+        return "CONVERSACION ANTERIOR:\n" + "\n".join(parts) + "\n\n"
+
+
+class ConversationStore:
+    """Sesiones de conversacion en memoria con tope de bytes y expulsion LRU.
+
+    Cada sesion guarda los ultimos CONVERSATION_RECENT_TURNS turnos completos y un
+    resumen acumulado de los anteriores, asi que su tamaño (y los tokens que agrega
+    al prompt) esta acotado sin importar cuantos turnos tenga la conversacion.
+    """
+
+    def __init__(self, max_bytes=CONVERSATION_MAX_BYTES, max_sessions=CONVERSATION_MAX_SESSIONS,
+                 ttl=CONVERSATION_TTL_SECONDS, recent_turns=CONVERSATION_RECENT_TURNS,
+                 history_tokens=CONVERSATION_HISTORY_TOKENS, summary_tokens=CONVERSATION_SUMMARY_TOKENS,
+                 history_mode=CONVERSATION_HISTORY_MODE):
+        self.max_bytes = max_bytes
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.recent_turns = max(0, recent_turns)
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+        self.history_mode = history_mode
+        self.sessions = OrderedDict()
+        self.nbytes = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def new_session_id():
+        return uuid.uuid4().hex
+
+    @staticmethod
+    def valid_session_id(session_id):
+        return bool(session_id) and bool(_SESSION_ID.match(session_id))
+
+    def _get(self, session_id, now):
+        session = self.sessions.get(session_id)
+        if session is None:
+            return None
+        if now - session.last_used > self.ttl:
+            self._drop(session_id)
+            self.expirations += 1
+            return None
+        self.sessions.move_to_end(session_id)
+        return session
+
+    def _drop(self, session_id):
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            self.nbytes -= session.nbytes
+
+    def _enforce_limits(self):
+        while self.sessions and (self.nbytes > self.max_bytes or len(self.sessions) > self.max_sessions):
+            session_id = next(iter(self.sessions))
+            self._drop(session_id)
+            self.evictions += 1
+
+    def prepare(self, session_id, prompt):
+        """Antes de buscar: (consulta para recuperacion/cache, historial para el prompt).
+
+        En preguntas de seguimiento la consulta incluye la pregunta del tema, para
+        que la busqueda y la clave de cache tengan el tema ("¿y la resta?" tras
+        "¿que es la suma?").
+        """
+        with self.lock:
+            session = self._get(session_id, time.time()) if session_id else None
+            if session is None or not session.turn_count:
+                return prompt, ""
+            follow_up = is_follow_up(prompt)
+            # El tema es la ultima pregunta "completa": encadenar "¿y la resta?", "¿y la division?"
+            query = f"{session.topic} {prompt}" if follow_up else prompt
+            if follow_up or self.history_mode == "always":
+                return query, session.history_text(self.history_tokens)
+            return query, ""
+
+    def record(self, session_id, question, answer):
+        now = time.time()
+        with self.lock:
+            session = self._get(session_id, now)
+            if session is None:
+                session = Session(session_id)
+                self.sessions[session_id] = session
+                self.nbytes += session.nbytes
+            self.nbytes -= session.nbytes
+            session.add_turn(question, answer, self.recent_turns, self.summary_tokens)
+            session.last_used = now
+            self.nbytes += session.nbytes
+            self._enforce_limits()
+
+    def forget(self, session_id):
+        with self.lock:
+            self._drop(session_id)
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "enabled": CONVERSATION_MEMORY,
+                "disabled_reason": CONVERSATION_DISABLED_REASON,
+                "sessions": len(self.sessions),
+                "bytes": self.nbytes,
+                "max_bytes": self.max_bytes,
+                "max_sessions": self.max_sessions,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "recent_turns": self.recent_turns,
+                "history_tokens": self.history_tokens,
+                "history_mode": self.history_mode,
+            }
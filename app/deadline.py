@@ -0,0 +1,69 @@
+# app/deadline.py
+import os
+import time
+
+# Tiempo total de una peticion a /chat, de la recepcion a la respuesta (incluye
+# busqueda, espera en cola y generacion). Con el modelo frio tambien manda sobre
+# OLLAMA_COLD_TIMEOUT: mejor un 504 a tiempo que un estudiante esperando minutos.
+CHAT_DEADLINE_SECONDS = float(os.getenv("CHAT_DEADLINE_SECONDS", "60"))
+# Presupuesto minimo para que valga la pena llamar al LLM; se reserva antes de buscar
+DEADLINE_LLM_MIN_SECONDS = float(os.getenv("DEADLINE_LLM_MIN_SECONDS", "5"))
+# Minimo para intentar la recuperacion (embedding + consulta al indice)
+DEADLINE_RETRIEVAL_MIN_SECONDS = float(os.getenv("DEADLINE_RETRIEVAL_MIN_SECONDS", "0.5"))
+# Etapas de la busqueda: si se salta alguna, la respuesta no representa a la pregunta
+RETRIEVAL_STAGES = ("retrieval", "embedding", "vector_query", "rerank")
+
+
+class DeadlineExceeded(Exception):
+    """No queda presupuesto para una etapa que no se puede saltar (la generacion)"""
+
+    def __init__(self, stage, remaining):
+        super().__init__(f"Sin tiempo para {stage} (quedan {remaining:.2f}s)")
+        self.stage = stage
+
+
+class Deadline:
+    """Plazo de una peticion que se pasa por todas sus etapas.
+
+    Cada etapa pide lo que queda con remaining() o timeout(); si no alcanza,
+    allows() registra la etapa como saltada (p. ej. responder sin RAG) y
+    require() corta la peticion con DeadlineExceeded.
+    """
+
+    def __init__(self, seconds=CHAT_DEADLINE_SECONDS):
+        self.seconds = seconds
+        self.expires_at = time.monotonic() + seconds
+        self.skipped = []
+
+    def remaining(self, reserve=0.0):
+        """Segundos disponibles, descontando reserve (lo que necesitan las etapas siguientes)"""
+        return max(0.0, self.expires_at - time.monotonic() - reserve)
+
+    def expired(self):
+        return self.remaining() <= 0
+
+    def allows(self, stage, needed, reserve=0.0):
+        """True si quedan al menos needed segundos (sin tocar reserve); si no, la etapa se salta"""
+        if self.remaining(reserve) >= needed:
+            return True
+        self.skipped.append(stage)
+        return False
+
+    def skipped_retrieval(self):
+        return any(stage in RETRIEVAL_STAGES for stage in self.skipped)
+
+    def require(self, stage, needed):
+        if self.remaining() < needed:
+            raise DeadlineExceeded(stage, self.remaining())
+
+    def timeout(self, cap=None, reserve=0.0):
+        """Timeout para una llamada bloqueante: lo que queda, sin pasar de cap"""
+        remaining = self.remaining(reserve)
+        return remaining if cap is None else min(cap, remaining)
+
+    def to_dict(self):
+        return {
+            "seconds": self.seconds,
+            "remaining_ms": round(self.remaining() * 1000),
+            "skipped": list(self.skipped),
+        }
@@ -0,0 +1,211 @@
+# app/docs_watcher.py
+import logging
+import os
+import threading
+import time
+
+import ingestion
+from pdf_extractor import file_md5
+
+logger = logging.getLogger(__name__)
+
+# Vigilar docs/ y aplicar al indice los documentos que cambian, sin reindexar ni reiniciar
+DOCS_WATCH = os.getenv("DOCS_WATCH", "false").lower() == "true"
+# auto: inotify (paquete watchdog) si esta instalado, si no sondeo | inotify | poll
+DOCS_WATCH_MODE = os.getenv("DOCS_WATCH_MODE", "auto").lower()
+# Cada cuanto se revisan los archivos en modo sondeo (con inotify es solo una red de seguridad)
+DOCS_WATCH_INTERVAL = float(os.getenv("DOCS_WATCH_INTERVAL", "2"))
+# Silencio necesario antes de aplicar: guardar varias veces seguidas genera una sola actualizacion
+DOCS_WATCH_DEBOUNCE = float(os.getenv("DOCS_WATCH_DEBOUNCE", "3"))
+# Con ediciones continuas se aplica de todos modos pasado este tiempo
+DOCS_WATCH_MAX_DELAY = float(os.getenv("DOCS_WATCH_MAX_DELAY", "30"))
+
+
+class DocsWatcher:
+    """Actualizacion incremental del indice cuando se editan documentos de docs/.
+
+    Los eventos (inotify) o el sondeo solo marcan que algo cambio; tras
+    DOCS_WATCH_DEBOUNCE segundos sin cambios se comparan los MD5 con lo que
+    esta indexado y solo los documentos nuevos, modificados o borrados se
+    pasan a rag.update_documents() / rag.remove_documents(). on_update recibe
+    el resumen para invalidar lo que dependa del indice (p. ej. respuestas en cache).
+    ignore: subcarpetas de docs/ que mantiene otro proceso (las paginas del rastreo).
+    """
+
+    def __init__(self, docs_dir, get_rag, on_update=None, ignore=(), mode=DOCS_WATCH_MODE,
+                 interval=DOCS_WATCH_INTERVAL, debounce=DOCS_WATCH_DEBOUNCE, max_delay=DOCS_WATCH_MAX_DELAY):
+        self.docs_dir = os.path.abspath(docs_dir)
+        self.get_rag = get_rag
+        self.on_update = on_update or (lambda result: None)
+        self.ignore = tuple(name.strip("/") + "/" for name in ignore if name)
+        self.mode = mode
+        self.interval = interval
+        self.debounce = debounce
+        self.max_delay = max_delay
+
+        self.lock = threading.Lock()
+        self.backend = None
+        self.last_result = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._observer = None
+        self._rag = None            # RAGSystem al que corresponde _indexed (cambia tras reindexar)
+        self._indexed = {}          # nombre -> MD5 de lo que esta en el indice
+        self._stats = {}            # nombre -> (mtime_ns, size) en la ultima revision
+        self._applied_stats = {}    # nombre -> (mtime_ns, size) cuando se aplico por ultima vez
+        self._first_change = None
+        self._last_change = None
+
+    # ============ EJECUCION EN SEGUNDO PLANO ============
+    def start(self):
+        if self._thread is not None:
+            return
+        if not os.path.isdir(self.docs_dir):
+            logger.warning(f"No se vigila {self.docs_dir}: la carpeta no existe")
+            return
+        self.backend = self._start_observer() if self.mode in ("auto", "inotify") else None
+        self.backend = self.backend or "poll"
+        self._thread = threading.Thread(target=self._loop, name="docs-watcher", daemon=True)
+        self._thread.start()
+        logger.info(f"Vigilando {self.docs_dir} ({self.backend}, debounce {self.debounce:.0f}s)")
+
+    def _start_observer(self):
+        try:
+            # Dependencia opcional: sin watchdog se revisa por sondeo
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            if self.mode == "inotify":
+                logger.warning("DOCS_WATCH_MODE=inotify requiere el paquete watchdog: se usa sondeo")
+            return None
+
+        wake = self._wake
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                wake.set()
+
+        self._observer = Observer()
+        self._observer.daemon = True
+        self._observer.schedule(Handler(), self.docs_dir, recursive=True)
+        self._observer.start()
+        return "inotify"
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._observer is not None:
+            self._observer.stop()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self._wake.wait(self._next_timeout())
+            self._wake.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.check()
+            except Exception as e:
+                logger.error(f"Error vigilando documentos: {e}")
+                # Reintentar despues de otro periodo de silencio, no en cada vuelta
+                self._last_change = time.monotonic()
+
+    def _next_timeout(self):
+        if self._last_change is None:
+            return self.interval
+        waited = time.monotonic() - self._last_change
+        return max(0.05, min(self.interval, self.debounce - waited))
+
+    # ============ DETECCION DE CAMBIOS ============
+    def scan(self):
+        """nombre -> (mtime_ns, size) de los documentos indexables, sin las carpetas ignoradas"""
+        stats = {}
+        for path in ingestion.list_documents(self.docs_dir):
+            name = ingestion.document_name(path, self.docs_dir)
+            if name.startswith(self.ignore):
+                continue
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            stats[name] = (st.st_mtime_ns, st.st_size)
+        return stats
+
+    def check(self):
+        """Una revision: registrar cambios y aplicarlos si ya paso el debounce"""
+        rag = self.get_rag()
+        if rag is None:
+            return
+        now = time.monotonic()
+        stats = self.scan()
+        if rag is not self._rag:
+            # Indice nuevo (arranque o reindexacion completa): punto de partida = lo indexado
+            self._rag = rag
+            self._indexed = {name: digest for name, digest in rag.indexed_files().items()
+                             if not name.startswith(self.ignore)}
+            self._applied_stats = {}
+            self._first_change = self._first_change or now
+        if stats != self._stats:
+            self._stats = stats
+            self._last_change = now
+            self._first_change = self._first_change or now
+
+        if self._first_change is None:
+            return
+        quiet = now - self._last_change >= self.debounce if self._last_change else True
+        if quiet or now - self._first_change >= self.max_delay:
+            self.apply(rag, stats)
+
+    def apply(self, rag, stats):
+        start = time.perf_counter()
+        changed, hashes = [], {}
+        for name, stat in stats.items():
+            # Solo se lee el contenido de lo que cambio de fecha o tamaño desde la ultima vez
+            if self._applied_stats.get(name) == stat and name in self._indexed:
+                continue
+            digest = file_md5(os.path.join(self.docs_dir, name))
+            if digest != self._indexed.get(name):
+                changed.append(name)
+                hashes[name] = digest
+        removed = [name for name in self._indexed if name not in stats]
+
+        result = {"changed": changed, "removed": removed, "chunks_added": 0, "failed": []}
+        if removed:
+            rag.remove_documents(removed)
+        processed = set()
+        if changed:
+            result["chunks_added"], processed = rag.update_documents(
+                [os.path.join(self.docs_dir, name) for name in changed])
+        # Lo que no se pudo indexar (error de extraccion, indice de bundle) no cuenta
+        # como aplicado: se vuelve a intentar en la proxima aplicacion
+        failed = [name for name in changed if name not in processed]
+        result["failed"] = failed
+
+        for name in removed:
+            self._indexed.pop(name, None)
+        self._indexed.update({name: hashes[name] for name in changed if name in processed})
+        self._applied_stats = {name: stat for name, stat in stats.items() if name not in failed}
+        self._first_change = self._last_change = None
+
+        if changed or removed:
+            result["seconds"] = round(time.perf_counter() - start, 2)
+            result["finished_at"] = time.time()
+            with self.lock:
+                self.last_result = result
+            logger.info(f"Documentos actualizados en vivo: {len(changed)} modificados, "
+                        f"{len(removed)} eliminados, {result['chunks_added']} chunks en {result['seconds']}s")
+            self.on_update(result)
+        return result
+
+    def status(self):
+        with self.lock:
+            return {
+                "enabled": self._thread is not None,
+                "backend": self.backend,
+                "docs_dir": self.docs_dir,
+                "debounce_seconds": self.debounce,
+                "indexed_documents": len(self._indexed),
+                "pending": self._first_change is not None,
+                "last_result": self.last_result,
+            }
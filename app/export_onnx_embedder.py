@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Exportar all-MiniLM-L6-v2 a ONNX y cuantizarlo a int8 para EMBEDDER_BACKEND=onnx
+
+Uso (en una maquina con sentence-transformers y onnxruntime instalados):
+    python export_onnx_embedder.py [carpeta_salida]
+
+Genera model.onnx, model_int8.onnx y tokenizer.json en la carpeta de salida
+(por defecto ./models/all-MiniLM-L6-v2-onnx, la ruta que usa EMBEDDER_ONNX_PATH).
+"""
+
+import os
+import sys
+
+MODEL_NAME = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+DEFAULT_OUTPUT = os.path.abspath("./models/all-MiniLM-L6-v2-onnx")
+
+
+def export(output_dir):
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from sentence_transformers import SentenceTransformer
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    print(f"📦 Cargando {MODEL_NAME}...")
+    st_model = SentenceTransformer(MODEL_NAME, device="cpu")
+    transformer = st_model[0].auto_model.eval()
+    tokenizer = st_model.tokenizer
+
+    # Solo el transformer: pooling y normalizacion se hacen en ONNXEmbedder
+    sample = tokenizer(["Hola, ¿qué es la suma?"], return_tensors="pt")
+    inputs = (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"])
+    dynamic_axes = {name: {0: "batch", 1: "sequence"}
+                    for name in ("input_ids", "attention_mask", "token_type_ids", "last_hidden_state")}
+
+    model_path = os.path.join(output_dir, "model.onnx")
+    print("🔧 Exportando a ONNX...")
+    with torch.no_grad():
+        torch.onnx.export(
+            transformer,
+            inputs,
+            model_path,
+            input_names=["input_ids", "attention_mask", "token_type_ids"],
+            output_names=["last_hidden_state"],
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+
+    int8_path = os.path.join(output_dir, "model_int8.onnx")
+    print("🔧 Cuantizando a int8...")
+    quantize_dynamic(model_path, int8_path, weight_type=QuantType.QInt8)
+
+    tokenizer.backend_tokenizer.save(os.path.join(output_dir, "tokenizer.json"))
+
+    for name in ("model.onnx", "model_int8.onnx", "tokenizer.json"):
+        size_mb = os.path.getsize(os.path.join(output_dir, name)) / (1024 * 1024)
+        print(f"✅ {name}: {size_mb:.1f} MB")
+    print(f"\n💡 Usa: EMBEDDER_BACKEND=onnx EMBEDDER_ONNX_PATH={output_dir}")
+
+
+if __name__ == "__main__":
+    export(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_OUTPUT)
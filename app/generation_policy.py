@@ -0,0 +1,204 @@
+# app/generation_policy.py
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Tope absoluto de tokens de respuesta (antes repetido en /chat y en OllamaIAService)
+GEN_MAX_TOKENS = int(os.getenv("GEN_MAX_TOKENS", "160"))
+# Minimo para que una respuesta bajo carga siga siendo util (2-3 oraciones cortas)
+GEN_MIN_TOKENS = int(os.getenv("GEN_MIN_TOKENS", "48"))
+# Peticiones que Ollama atiende a la vez (OLLAMA_NUM_PARALLEL del servidor)
+GEN_PARALLEL_SLOTS = int(os.getenv("GEN_PARALLEL_SLOTS", "1"))
+# Latencia objetivo por respuesta, incluida la espera en cola
+GEN_TARGET_SECONDS = float(os.getenv("GEN_TARGET_SECONDS", "12"))
+# Timeout base y maximo hacia PHP/Ollama (api.php corta a los 120s)
+GEN_BASE_TIMEOUT = int(os.getenv("OLLAMA_TIMEOUT", "30"))
+GEN_MAX_TIMEOUT = int(os.getenv("OLLAMA_COLD_TIMEOUT", "120"))
+# Velocidad supuesta hasta tener mediciones (tokens/s de phi3:mini en CPU)
+GEN_DEFAULT_TPS = float(os.getenv("GEN_DEFAULT_TPS", "8"))
+# Peso de la ultima medicion en los promedios moviles
+GEN_EWMA_ALPHA = float(os.getenv("GEN_EWMA_ALPHA", "0.3"))
+
+# Parametros base por estrategia (antes fijos dentro de /chat)
+STRATEGY_DEFAULTS = {
+    "docs_friendly": {"max_tokens": 120, "temperature": 0.25},
+    "model_friendly": {"max_tokens": 90, "temperature": 0.35},
+}
+
+# Niveles de carga: (peticiones en cola por slot, factor sobre max_tokens)
+LOAD_LEVELS = (
+    ("normal", 0, 1.0),
+    ("ocupado", 1, 0.75),
+    ("saturado", 3, 0.5),
+)
+
+
+class GenerationDecision:
+    """Parametros de generacion elegidos para una peticion"""
+
+    def __init__(self, strategy, num_predict, temperature, timeout, level, queue_depth, tokens_per_second, reason):
+        self.strategy = strategy
+        self.num_predict = num_predict
+        self.temperature = temperature
+        self.timeout = timeout
+        self.level = level
+        self.queue_depth = queue_depth
+        self.tokens_per_second = tokens_per_second
+        self.reason = reason
+
+    def to_dict(self):
+        return {
+            "strategy": self.strategy,
+            "num_predict": self.num_predict,
+            "temperature": self.temperature,
+            "timeout": self.timeout,
+            "level": self.level,
+            "queue_depth": self.queue_depth,
+            "tokens_per_second": round(self.tokens_per_second, 2),
+            "reason": self.reason,
+        }
+
+
+class GenerationPolicy:
+    """Elige num_predict, temperatura y timeout segun estrategia, cola y velocidad observada.
+
+    - Sin carga: los valores base de la estrategia.
+    - Con cola: respuestas mas cortas (por nivel y para entrar en GEN_TARGET_SECONDS)
+      y timeout mas holgado, porque parte del tiempo se va esperando turno.
+    """
+
+    def __init__(self, strategies=None, max_tokens=None, min_tokens=None, slots=None,
+                 target_seconds=None, base_timeout=None, max_timeout=None):
+        self.strategies = strategies or STRATEGY_DEFAULTS
+        self.max_tokens = max_tokens or GEN_MAX_TOKENS
+        self.min_tokens = min_tokens or GEN_MIN_TOKENS
+        self.slots = max(1, slots or GEN_PARALLEL_SLOTS)
+        self.target_seconds = target_seconds or GEN_TARGET_SECONDS
+        self.base_timeout = base_timeout or GEN_BASE_TIMEOUT
+        self.max_timeout = max_timeout or GEN_MAX_TIMEOUT
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._tokens_per_second = GEN_DEFAULT_TPS
+        self._response_seconds = None
+        self._completed = 0
+        self._shortened = 0
+
+    # ============ DECISION ============
+    def decide(self, strategy, cold=False, deadline_seconds=None):
+        """Parametros para la proxima llamada; cold=True si el modelo aun no esta cargado.
+
+        deadline_seconds: lo que queda del plazo de la peticion; acota el timeout y
+        los tokens (a la velocidad observada) para que la respuesta llegue a tiempo.
+        """
+        base = self.strategies.get(strategy, self.strategies["model_friendly"])
+        with self._lock:
+            waiting = self._in_flight  # peticiones ya en curso delante de esta
+            tps = self._tokens_per_second
+            response_seconds = self._response_seconds
+
+        queued_per_slot = max(0, waiting - self.slots + 1) / self.slots
+        level, factor = "normal", 1.0
+        for name, threshold, level_factor in LOAD_LEVELS:
+            if queued_per_slot >= threshold:
+                level, factor = name, level_factor
+
+        num_predict = min(base["max_tokens"], self.max_tokens)
+        reason = "base"
+        if factor < 1.0:
+            num_predict = int(num_predict * factor)
+            reason = f"cola x{factor}"
+
+        # Con cola: espera estimada y tokens que aun caben en la latencia objetivo
+        queue_wait = queued_per_slot * (response_seconds or num_predict / tps)
+        if queue_wait > 0:
+            budget_seconds = self.target_seconds - queue_wait
+            if budget_seconds <= 0:
+                num_predict = self.min_tokens
+                reason = "cola por encima del objetivo"
+            elif int(budget_seconds * tps) < num_predict:
+                num_predict = int(budget_seconds * tps)
+                reason = f"objetivo {self.target_seconds:.0f}s a {tps:.1f} tok/s"
+        if deadline_seconds is not None and int((deadline_seconds - queue_wait) * tps) < num_predict:
+            num_predict = int((deadline_seconds - queue_wait) * tps)
+            reason = f"plazo {deadline_seconds:.0f}s a {tps:.1f} tok/s"
+        num_predict = max(self.min_tokens, min(num_predict, self.max_tokens))
+
+        # Bajo carga se sacrifica largo de respuesta, no la respuesta: timeout holgado
+        timeout = self.base_timeout + queue_wait
+        if cold:
+            timeout = max(timeout, self.max_timeout)
+        timeout = int(min(max(timeout, self.base_timeout), self.max_timeout))
+        if deadline_seconds is not None:
+            timeout = round(min(timeout, deadline_seconds), 1)
+
+        decision = GenerationDecision(
+            strategy=strategy,
+            num_predict=num_predict,
+            temperature=base["temperature"],
+            timeout=timeout,
+            level=level,
+            queue_depth=waiting,
+            tokens_per_second=tps,
+            reason=reason,
+        )
+        # Por peticion: los campos principales van en el registro "chat" de app.py
+        logger.debug(
+            "Generacion: %s | nivel %s | en curso %s | num_predict %s (%s) | temp %s | timeout %ss | %.1f tok/s",
+            strategy, level, waiting, num_predict, reason, decision.temperature, timeout, tps,
+        )
+        return decision
+
+    # ============ MEDICION ============
+    @contextmanager
+    def track(self, decision=None):
+        """Contar la peticion como en curso mientras dura la llamada al modelo"""
+        with self._lock:
+            self._in_flight += 1
+            if decision is not None and decision.reason != "base":
+                self._shortened += 1
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._in_flight -= 1
+                self._completed += 1
+                self._response_seconds = self._ewma(self._response_seconds, elapsed)
+
+    def record(self, metrics):
+        """Actualizar tokens/s con eval_count / eval_duration que reporta Ollama"""
+        if not metrics:
+            return
+        eval_count = metrics.get("eval_count")
+        eval_duration = metrics.get("eval_duration")
+        if not eval_count or not eval_duration:
+            return
+        tps = eval_count / (eval_duration / 1e9)
+        with self._lock:
+            self._tokens_per_second = self._ewma(self._tokens_per_second, tps)
+
+    @staticmethod
+    def _ewma(current, value):
+        if current is None:
+            return value
+        return GEN_EWMA_ALPHA * value + (1 - GEN_EWMA_ALPHA) * current
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "in_flight": self._in_flight,
+                "slots": self.slots,
+                "tokens_per_second": round(self._tokens_per_second, 2),
+                "avg_response_seconds": round(self._response_seconds, 2) if self._response_seconds else None,
+                "completed": self._completed,
+                "shortened": self._shortened,
+                "target_seconds": self.target_seconds,
+                "max_tokens": self.max_tokens,
+                "min_tokens": self.min_tokens,
+            }
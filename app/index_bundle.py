@@ -0,0 +1,153 @@
+# app/index_bundle.py
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from vector_store import READABLE_STORE_FORMATS, STORE_FILES, STORE_FORMAT_VERSION, CompactVectorStore
+
+logger = logging.getLogger(__name__)
+
+# Bundle precompilado con build_index.py: carpeta de una version o carpeta con varias
+# versiones y un archivo CURRENT. Vacio: el indice se construye desde docs/ al arrancar.
+INDEX_BUNDLE_PATH = os.getenv("INDEX_BUNDLE_PATH", "")
+# Verificar los SHA-256 al cargar (lee el bundle completo una vez; tambien lo deja en cache del SO)
+INDEX_BUNDLE_VERIFY = os.getenv("INDEX_BUNDLE_VERIFY", "true").lower() == "true"
+
+BUNDLE_FORMAT_VERSION = 1
+MANIFEST = "manifest.json"
+CURRENT = "CURRENT"
+
+
+class BundleError(ValueError):
+    """Bundle ausente, corrupto o incompatible con el modelo de embeddings cargado"""
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def write_bundle(store, out_dir, embedding_model, chunker_version, documents, version=None):
+    """Guardar un CompactVectorStore como bundle versionado en out_dir/<version>/.
+
+    Se escribe en una carpeta temporal y se renombra al final; despues se
+    actualiza out_dir/CURRENT, asi un servidor que la lea nunca ve un bundle a medias.
+    documents: {nombre: {"hash", "size"}} de los documentos indexados.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    staging = tempfile.mkdtemp(dir=out_dir, prefix=".build-")
+    try:
+        for name in STORE_FILES:
+            shutil.copy2(os.path.join(store.data_dir, name), os.path.join(staging, name))
+            os.chmod(os.path.join(staging, name), 0o644)
+        files = {name: {"sha256": _sha256(os.path.join(staging, name)),
+                        "bytes": os.path.getsize(os.path.join(staging, name))}
+                 for name in STORE_FILES}
+
+        content_id = hashlib.sha256(
+            "".join(files[name]["sha256"] for name in STORE_FILES).encode("ascii")
+        ).hexdigest()[:12]
+        version = version or f"{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}-{content_id}"
+        manifest = {
+            "bundle_format": BUNDLE_FORMAT_VERSION,
+            "store_format": STORE_FORMAT_VERSION,
+            "version": version,
+            "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "embedding_model": embedding_model,
+            "dimension": store.dim,
+            "chunker_version": chunker_version,
+            "chunks": store.count(),
+            "documents": documents,
+            "files": files,
+        }
+        with open(os.path.join(staging, MANIFEST), "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, ensure_ascii=False)
+
+        os.chmod(staging, 0o755)
+        target = os.path.join(out_dir, version)
+        if os.path.exists(target):
+            raise BundleError(f"Ya existe la version {version} en {out_dir}")
+        os.rename(staging, target)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    fd, tmp_path = tempfile.mkstemp(dir=out_dir, suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(version + "\n")
+    os.chmod(tmp_path, 0o644)
+    os.replace(tmp_path, os.path.join(out_dir, CURRENT))
+    return target, manifest
+
+
+def resolve_bundle(path):
+    """Carpeta del bundle activo: path mismo si tiene manifest, si no la version de path/CURRENT"""
+    path = os.path.abspath(path)
+    if os.path.exists(os.path.join(path, MANIFEST)):
+        return path
+    try:
+        with open(os.path.join(path, CURRENT), "r", encoding="utf-8") as f:
+            version = f.read().strip()
+    except FileNotFoundError:
+        raise BundleError(f"No hay {MANIFEST} ni {CURRENT} en {path}")
+    return os.path.join(path, version)
+
+
+def read_manifest(bundle_dir):
+    try:
+        with open(os.path.join(bundle_dir, MANIFEST), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        raise BundleError(f"Bundle sin {MANIFEST}: {bundle_dir}")
+
+
+def generation(path):
+    """Marca del bundle activo (cambia al publicar otra version): para recargar sin reiniciar"""
+    try:
+        return os.stat(os.path.join(resolve_bundle(path), MANIFEST)).st_mtime_ns
+    except (BundleError, FileNotFoundError):
+        return None
+
+
+def load_bundle(path, embedding_model, dimension=None, verify=INDEX_BUNDLE_VERIFY):
+    """Abrir el bundle activo como CompactVectorStore (vectores mapeados en memoria).
+
+    Rechaza (BundleError) bundles de otro modelo de embeddings o dimension, de
+    otro formato, o con archivos que no coinciden con los SHA-256 del manifiesto.
+    """
+    bundle_dir = resolve_bundle(path)
+    manifest = read_manifest(bundle_dir)
+
+    if manifest.get("bundle_format") != BUNDLE_FORMAT_VERSION:
+        raise BundleError(f"Formato de bundle no soportado: {manifest.get('bundle_format')}")
+    if manifest.get("store_format") not in READABLE_STORE_FORMATS:
+        raise BundleError(f"Formato de indice no soportado: {manifest.get('store_format')}")
+    if manifest.get("embedding_model") != embedding_model:
+        raise BundleError(
+            f"El bundle {manifest.get('version')} se creo con '{manifest.get('embedding_model')}' "
+            f"y el servidor usa '{embedding_model}': reconstruir con build_index.py"
+        )
+    if dimension and manifest.get("dimension") and manifest["dimension"] != dimension:
+        raise BundleError(f"Dimension del bundle {manifest['dimension']} distinta a la del modelo ({dimension})")
+
+    if verify:
+        start = time.perf_counter()
+        for name, info in manifest["files"].items():
+            file_path = os.path.join(bundle_dir, name)
+            if not os.path.exists(file_path) or _sha256(file_path) != info["sha256"]:
+                raise BundleError(f"Checksum invalido en {name} (bundle {manifest['version']})")
+        logger.info(f"Checksums del bundle verificados en {time.perf_counter() - start:.2f}s")
+
+    store = CompactVectorStore(bundle_dir).load()
+    if store.count() != manifest.get("chunks"):
+        raise BundleError(f"El bundle declara {manifest.get('chunks')} chunks y tiene {store.count()}")
+    logger.info(f"Bundle {manifest['version']} cargado: {store.count()} chunks, "
+                f"modelo {manifest['embedding_model']}, chunker v{manifest['chunker_version']}")
+    return store
@@ -0,0 +1,226 @@
+# app/ingestion.py
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import chunker
+import pdf_extractor
+
+logger = logging.getLogger(__name__)
+
+# Procesos para leer/limpiar/dividir archivos (0 = uno por nucleo)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "0")) or (os.cpu_count() or 1)
+# Documentos preparados que pueden esperar a la etapa de embeddings
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "8"))
+# Por debajo de este tamaño total el pool cuesta mas de lo que ahorra
+INGEST_PARALLEL_MIN_BYTES = int(os.getenv("INGEST_PARALLEL_MIN_BYTES", str(1024 * 1024)))
+
+# Archivos de texto desde este tamaño se procesan en streaming en el consumidor
+INGEST_STREAM_MIN_BYTES = int(os.getenv("INGEST_STREAM_MIN_BYTES", str(8 * 1024 * 1024)))
+
+# Formatos que se indexan
+SUPPORTED_EXTENSIONS = ('.txt', '.pdf')
+
+_DONE = object()
+
+
+def is_supported(filename):
+    return filename.lower().endswith(SUPPORTED_EXTENSIONS)
+
+
+def list_documents(root):
+    """Rutas de los documentos indexables bajo root, incluidas subcarpetas por materia"""
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        # Ignorar carpetas ocultas (.git, .cache, ...)
+        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        for name in filenames:
+            if is_supported(name):
+                found.append(os.path.join(dirpath, name))
+    return sorted(found)
+
+
+def batched(items, size):
+    """Agrupar un iterable (lista o generador) en listas de hasta size elementos"""
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def open_document(filepath):
+    """Documento abierto como texto para leerlo por bloques (los PDF, desde el cache de extraccion)"""
+    if filepath.lower().endswith('.pdf'):
+        return pdf_extractor.open_extracted_text(filepath)
+    return open(filepath, 'r', encoding='utf-8', errors='ignore')
+
+
+def document_name(filepath, root=None):
+    """Nombre estable del documento: ruta relativa a docs/ con '/'"""
+    if not root:
+        return os.path.basename(filepath)
+    return os.path.relpath(filepath, root).replace(os.sep, '/')
+
+
+def prepare_document(filepath, chunk_size=chunker.DEFAULT_CHUNK_SIZE, overlap=chunker.DEFAULT_OVERLAP, root=None):
+    """Leer, limpiar y dividir un archivo. Se ejecuta en un proceso del pool."""
+    filename = document_name(filepath, root)
+    try:
+        with open_document(filepath) as stream:
+            chunks = list(chunker.iter_document_chunks(stream, chunk_size, overlap))
+
+        return {
+            'path': filepath,
+            'filename': filename,
+            'size': os.path.getsize(filepath),
+            'chunks': chunks,
+            'error': None,
+        }
+    except Exception as e:
+        return {'path': filepath, 'filename': filename, 'chunks': [], 'error': str(e)}
+
+
+def stream_document(filepath, chunk_size=chunker.DEFAULT_CHUNK_SIZE, overlap=chunker.DEFAULT_OVERLAP, root=None):
+    """Igual que prepare_document pero 'chunks' es un generador: memoria constante para archivos grandes"""
+    def chunks():
+        with open_document(filepath) as stream:
+            yield from chunker.iter_document_chunks(stream, chunk_size, overlap)
+
+    return {
+        'path': filepath,
+        'filename': document_name(filepath, root),
+        'size': os.path.getsize(filepath),
+        'chunks': chunks(),
+        'error': None,
+    }
+
+
+def _pool_context():
+    """'forkserver' si existe, si no 'spawn'; nunca 'fork'.
+
+    El pool se crea desde un hilo (carga en segundo plano, vigilancia de docs/)
+    en un proceso con otros hilos vivos: con 'fork' un hijo puede heredar un
+    candado tomado y quedarse colgado. El servidor de forkserver importa el
+    script principal una vez (como __mp_main__) y los hijos salen de ese
+    proceso limpio; app.py no arranca sus servicios cuando se importa asi.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+
+
+def _should_parallelize(paths, workers):
+    if workers <= 1 or len(paths) <= 1:
+        return False
+    # Extraer PDFs (y sobre todo el OCR) siempre compensa el pool
+    if any(path.lower().endswith('.pdf') for path in paths):
+        return True
+    total = 0
+    for path in paths:
+        try:
+            total += os.path.getsize(path)
+        except OSError:
+            pass
+    return total >= INGEST_PARALLEL_MIN_BYTES
+
+
+def _is_large_text(path):
+    try:
+        return path.lower().endswith('.txt') and os.path.getsize(path) >= INGEST_STREAM_MIN_BYTES
+    except OSError:
+        return False
+
+
+def iter_prepared_documents(paths, chunk_size=chunker.DEFAULT_CHUNK_SIZE, overlap=chunker.DEFAULT_OVERLAP,
+                            workers=None, queue_size=None, root=None):
+    """Documentos preparados a medida que terminan, listos para embeddings.
+
+    Con varios nucleos y suficiente texto, la lectura y el chunking corren en un
+    ProcessPoolExecutor que alimenta una cola acotada; el consumidor (embeddings
+    e insercion en ChromaDB) avanza mientras los procesos preparan lo siguiente.
+    Los archivos de texto grandes no pasan por el pool: se entregan con un
+    generador de chunks para que la memoria no dependa del tamaño del archivo.
+    """
+    paths = list(paths)
+    large = [path for path in paths if _is_large_text(path)]
+    paths = [path for path in paths if path not in large]
+    workers = workers or INGEST_WORKERS
+    queue_size = max(1, queue_size or INGEST_QUEUE_SIZE)
+
+    yield from _iter_pooled(paths, chunk_size, overlap, workers, queue_size, root)
+
+    for path in large:
+        yield stream_document(path, chunk_size, overlap, root)
+
+
+def _iter_pooled(paths, chunk_size, overlap, workers, queue_size, root):
+    if not _should_parallelize(paths, workers):
+        for path in paths:
+            yield prepare_document(path, chunk_size, overlap, root)
+        return
+
+    workers = min(workers, len(paths))
+    logger.info(f"Preparando {len(paths)} archivos con {workers} procesos")
+
+    results = queue.Queue(maxsize=queue_size)
+    stop = threading.Event()
+    reported = set()
+
+    def put(result):
+        reported.add(result['path'])
+        results.put(result)
+
+    def producer():
+        pending = set()
+        try:
+            with ProcessPoolExecutor(max_workers=workers, mp_context=_pool_context()) as pool:
+                for path in paths:
+                    if stop.is_set():
+                        break
+                    pending.add(pool.submit(prepare_document, path, chunk_size, overlap, root))
+                    # No adelantar mas trabajo del que la cola puede absorber
+                    if len(pending) >= queue_size:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            put(future.result())
+                while pending and not stop.is_set():
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        put(future.result())
+        except Exception as e:
+            # Un error por documento sin resultado: quien indexa sabe exactamente que falto
+            logger.error(f"Error en el pool de ingesta: {e}")
+            # Al salir del with el pool ya espero a lo enviado: lo que termino bien se entrega
+            for future in pending:
+                if future.done() and not future.cancelled() and future.exception() is None:
+                    put(future.result())
+            for path in paths:
+                if path not in reported and not stop.is_set():
+                    put({'path': path, 'filename': document_name(path, root), 'chunks': [],
+                         'error': f"pool de ingesta: {e}"})
+        finally:
+            results.put(_DONE)
+
+    thread = threading.Thread(target=producer, name="ingest-producer", daemon=True)
+    thread.start()
+
+    try:
+        while True:
+            item = results.get()
+            if item is _DONE:
+                break
+            yield item
+    finally:
+        # Si el consumidor se detiene antes, liberar al productor
+        stop.set()
+        while thread.is_alive():
+            try:
+                results.get(timeout=0.1)
+            except queue.Empty:
+                pass
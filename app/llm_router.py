@@ -0,0 +1,276 @@
+# app/llm_router.py
+import itertools
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+
+from deadline import DeadlineExceeded
+
+logger = logging.getLogger(__name__)
+
+# Backends: "url|modelo,url|modelo"; vacio = solo OLLAMA_URL con OLLAMA_MODEL
+OLLAMA_BACKENDS = os.getenv("OLLAMA_BACKENDS", "")
+# Fallos seguidos que abren el circuito de un backend
+ROUTER_FAILURE_THRESHOLD = int(os.getenv("ROUTER_FAILURE_THRESHOLD", "3"))
+# Segundos con el circuito abierto antes de dejar pasar una peticion de prueba
+ROUTER_OPEN_SECONDS = float(os.getenv("ROUTER_OPEN_SECONDS", "30"))
+# Sondeo de salud (/api/tags) de cada backend
+ROUTER_HEALTH_INTERVAL = float(os.getenv("ROUTER_HEALTH_INTERVAL", "10"))
+ROUTER_HEALTH_TIMEOUT = float(os.getenv("ROUTER_HEALTH_TIMEOUT", "3"))
+# Backends distintos que se prueban por peticion ante errores de conexion
+ROUTER_MAX_ATTEMPTS = int(os.getenv("ROUTER_MAX_ATTEMPTS", "2"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class NoBackendAvailable(Exception):
+    """No queda backend por probar (todos ya fallaron en esta peticion)"""
+
+
+class BackendError(Exception):
+    """El backend respondio pero no pudo generar (Ollama caido detras de PHP, modelo ausente...)"""
+
+
+def parse_backends(value, default_url, default_model):
+    """'url|modelo,url' -> [(url, modelo), ...]; sin modelo se usa default_model"""
+    backends = []
+    for entry in value.split(","):
+        entry = entry.strip()
+        if not entry:
+            continue
+        url, _, model = entry.partition("|")
+        backends.append((url.strip().rstrip("/"), model.strip() or default_model))
+    return backends or [(default_url.rstrip("/"), default_model)]
+
+
+class Backend:
+    """Un endpoint de Ollama con su modelo, su cola de peticiones y su circuito"""
+
+    def __init__(self, url, model, warmup=None):
+        self.url = url
+        self.model = model
+        self.name = f"{model}@{url}"
+        self.warmup = warmup
+
+        self.outstanding = 0
+        self.healthy = True
+        self.circuit = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.failed_at = None         # monotonic del ultimo fallo
+        self.latency = None
+        self.requests = 0
+        self.errors = 0
+        self.last_error = None
+        self.last_probe = None
+
+    def is_warm(self):
+        return self.warmup is None or self.warmup.is_loaded()
+
+    def available(self, now):
+        """Puede recibir una peticion ahora (solo se llama con el lock del pool)"""
+        if not self.healthy and self.circuit == CLOSED:
+            return False
+        if self.circuit == OPEN:
+            if now - self.opened_at < ROUTER_OPEN_SECONDS:
+                return False
+            # Tiempo cumplido: una peticion de prueba decide si se cierra
+            self.circuit = HALF_OPEN
+            return self.outstanding == 0
+        if self.circuit == HALF_OPEN:
+            return self.outstanding == 0
+        return True
+
+    def snapshot(self):
+        return {
+            "name": self.name,
+            "url": self.url,
+            "model": self.model,
+            "healthy": self.healthy,
+            "circuit": self.circuit,
+            "outstanding": self.outstanding,
+            "failures": self.failures,
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_seconds": round(self.latency, 2) if self.latency else None,
+            "last_error": self.last_error,
+            "last_probe": self.last_probe,
+            "warm": self.warmup.status() if self.warmup else None,
+        }
+
+
+class BackendPool:
+    """Reparte llamadas al LLM entre backends: menos peticiones en curso, salud y circuit breaker.
+
+    Uso:
+        with pool.lease() as backend:
+            ... llamar a backend.url / backend.model ...
+    Un error dentro del bloque cuenta como fallo del backend; salir sin error, como exito.
+    DeadlineExceeded no cuenta: es el plazo de la peticion el que se agoto, no el backend.
+    """
+
+    def __init__(self, backends):
+        if not backends:
+            raise ValueError("Se necesita al menos un backend")
+        self.backends = backends
+        self._lock = threading.Lock()
+        self._round_robin = itertools.count()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_env(cls, default_url, default_model, warmup_factory=None):
+        backends = []
+        for url, model in parse_backends(OLLAMA_BACKENDS, default_url, default_model):
+            warmup = warmup_factory(url, model) if warmup_factory else None
+            backends.append(Backend(url, model, warmup))
+        return cls(backends)
+
+    @property
+    def urls(self):
+        return [backend.url for backend in self.backends]
+
+    # ============ SELECCION ============
+    def _pick(self, exclude=()):
+        now = time.monotonic()
+        with self._lock:
+            candidates = [b for b in self.backends if b.name not in exclude and b.available(now)]
+            if candidates:
+                # Menos peticiones en curso; empate: el mas rapido, y luego rotando
+                offset = next(self._round_robin)
+                ordered = candidates[offset % len(candidates):] + candidates[:offset % len(candidates)]
+                backend = min(ordered, key=lambda b: (b.outstanding, b.latency or 0.0))
+            else:
+                # Ninguno sano: antes que rechazar, probar el que fallo hace mas tiempo
+                # (el sondeo o el circuito pueden ir atrasados respecto a una recuperacion)
+                rest = [b for b in self.backends if b.name not in exclude]
+                if not rest:
+                    return None
+                backend = min(rest, key=lambda b: (b.failed_at or 0.0, b.outstanding))
+                logger.warning(f"Sin backends sanos: probando {backend.name} (fallo hace mas tiempo)")
+            backend.outstanding += 1
+            backend.requests += 1
+            return backend
+
+    @contextmanager
+    def lease(self, exclude=()):
+        backend = self._pick(exclude)
+        if backend is None:
+            raise NoBackendAvailable("No hay backends de LLM disponibles")
+        start = time.perf_counter()
+        try:
+            yield backend
+        except DeadlineExceeded:
+            self._release(backend, neutral=True)
+            raise
+        except Exception as e:
+            self._release(backend, error=e)
+            raise
+        else:
+            self._release(backend, elapsed=time.perf_counter() - start)
+
+    def _release(self, backend, elapsed=None, error=None, neutral=False):
+        with self._lock:
+            backend.outstanding -= 1
+            if neutral:
+                return
+            if error is None:
+                backend.failures = 0
+                if backend.circuit != CLOSED:
+                    logger.info(f"Backend {backend.name}: circuito cerrado")
+                backend.circuit = CLOSED
+                backend.latency = elapsed if backend.latency is None else 0.3 * elapsed + 0.7 * backend.latency
+                return
+
+            backend.errors += 1
+            backend.failures += 1
+            backend.failed_at = time.monotonic()
+            backend.last_error = str(error)[:200]
+            if backend.circuit == HALF_OPEN or backend.failures >= ROUTER_FAILURE_THRESHOLD:
+                if backend.circuit != OPEN:
+                    logger.warning(f"Backend {backend.name}: circuito abierto ({backend.failures} fallos: {error})")
+                backend.circuit = OPEN
+                backend.opened_at = time.monotonic()
+
+    def call(self, fn, retry_on=(requests.ConnectionError, BackendError), attempts=None):
+        """Ejecutar fn(backend) con failover a otro backend ante errores de conexion.
+
+        Los timeouts cuentan como fallo pero no se reintentan: el backend pudo
+        haber empezado a generar y repetir duplicaria la carga en plena cola.
+        """
+        attempts = attempts or ROUTER_MAX_ATTEMPTS
+        tried = []
+        last_error = None
+        for _ in range(attempts):
+            try:
+                with self.lease(exclude=tried) as backend:
+                    tried.append(backend.name)
+                    return fn(backend)
+            except NoBackendAvailable:
+                if last_error is not None:
+                    raise last_error
+                raise
+            except retry_on as e:
+                last_error = e
+                logger.warning(f"Backend {tried[-1]} fallo ({e}); probando otro")
+        raise last_error
+
+    # ============ SALUD ============
+    def probe(self, backend):
+        """Sondear /api/tags: responde y tiene el modelo"""
+        try:
+            response = requests.get(f"{backend.url}/api/tags", timeout=ROUTER_HEALTH_TIMEOUT)
+            response.raise_for_status()
+            names = {entry.get("name") for entry in response.json().get("models", [])}
+            healthy = backend.model in names or f"{backend.model}:latest" in names
+            error = None if healthy else f"modelo {backend.model} no disponible"
+        except (requests.RequestException, ValueError) as e:
+            healthy, error = False, str(e)[:200]
+
+        with self._lock:
+            if healthy != backend.healthy:
+                logger.info(f"Backend {backend.name}: {'sano' if healthy else 'sin salud'}"
+                            + (f" ({error})" if error else ""))
+            backend.healthy = healthy
+            backend.last_probe = time.time()
+            if error:
+                backend.last_error = error
+        return healthy
+
+    def probe_all(self):
+        for backend in self.backends:
+            self.probe(backend)
+
+    def _run(self):
+        while True:
+            self.probe_all()
+            if self._stop.wait(ROUTER_HEALTH_INTERVAL):
+                return
+
+    def start(self):
+        """Sondeo periodico y warm-up de cada backend"""
+        for backend in self.backends:
+            if backend.warmup:
+                backend.warmup.start()
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="llm-health", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        for backend in self.backends:
+            if backend.warmup:
+                backend.warmup.stop()
+
+    def any_warm(self):
+        return any(backend.is_warm() for backend in self.backends)
+
+    def snapshot(self):
+        with self._lock:
+            return [backend.snapshot() for backend in self.backends]
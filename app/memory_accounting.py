@@ -0,0 +1,265 @@
+# app/memory_accounting.py
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Activar tracemalloc al arrancar: cuesta CPU y memoria (del orden de un 10-30 %), por eso
+# por defecto se activa solo al pedir el primer snapshot en /admin/memory/snapshot
+MEMORY_TRACEMALLOC = os.getenv("MEMORY_TRACEMALLOC", "false").lower() == "true"
+# Marcos de pila por asignacion: 1 agrupa por linea; mas marcos dan trazas pero cuestan mas
+MEMORY_TRACEMALLOC_FRAMES = int(os.getenv("MEMORY_TRACEMALLOC_FRAMES", "1"))
+# Muestreo del RSS en segundo plano (por defecto 4 horas de historial, una muestra por minuto)
+MEMORY_SAMPLE_INTERVAL = float(os.getenv("MEMORY_SAMPLE_INTERVAL", "60"))
+MEMORY_HISTORY_SAMPLES = int(os.getenv("MEMORY_HISTORY_SAMPLES", "240"))
+MEMORY_TOP_ALLOCATIONS = int(os.getenv("MEMORY_TOP_ALLOCATIONS", "15"))
+
+# Asignaciones del propio tracemalloc y del sistema de imports: ruido en los snapshots
+_SNAPSHOT_FILTERS = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+    tracemalloc.Filter(False, "<unknown>"),
+)
+
+
+def read_rss():
+    """(RSS actual, pico de RSS) del proceso en bytes"""
+    try:
+        with open("/proc/self/status", "r", encoding="ascii") as f:
+            values = {}
+            for line in f:
+                key, _, rest = line.partition(":")
+                if key in ("VmRSS", "VmHWM"):
+                    values[key] = int(rest.split()[0]) * 1024
+        return values.get("VmRSS"), values.get("VmHWM")
+    except (OSError, ValueError):
+        # Sin /proc (macOS, Windows): solo el pico, y en macOS ru_maxrss ya viene en bytes
+        try:
+            import resource
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return None, peak if sys.platform == "darwin" else peak * 1024
+        except ImportError:
+            return None, None
+
+
+def deep_sizeof(obj, seen=None):
+    """Bytes aproximados de obj y lo que contiene (dict, list, tuple, set, objetos con __dict__).
+
+    Los arrays de numpy cuentan su buffer (nbytes); los objetos compartidos se cuentan una vez.
+    """
+    if seen is None:
+        seen = set()
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int) and hasattr(obj, "dtype"):
+        return sys.getsizeof(obj) + (0 if obj.base is not None else nbytes)
+
+    size = sys.getsizeof(obj)
+    if isinstance(obj, (str, bytes, bytearray, int, float, bool, type(None))):
+        return size
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset, deque)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif hasattr(obj, "__dict__"):
+        size += deep_sizeof(vars(obj), seen)
+    elif hasattr(obj, "__slots__"):
+        size += sum(deep_sizeof(getattr(obj, name), seen)
+                    for name in obj.__slots__ if hasattr(obj, name))
+    return size
+
+
+class BufferGauge:
+    """Bytes en vuelo de buffers temporales (p. ej. el audio de /tts) y su maximo"""
+
+    def __init__(self):
+        self.current = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+
+    def add(self, nbytes):
+        with self.lock:
+            self.current += nbytes
+            self.peak = max(self.peak, self.current)
+
+    def release(self, nbytes):
+        with self.lock:
+            self.current -= nbytes
+
+    def snapshot(self):
+        with self.lock:
+            return {"bytes": self.current, "peak_bytes": self.peak}
+
+
+def _format_stat(stat):
+    frame = stat.traceback[0]
+    entry = {
+        "location": f"{frame.filename}:{frame.lineno}",
+        "size_bytes": stat.size,
+        "count": stat.count,
+    }
+    if hasattr(stat, "size_diff"):
+        entry["size_diff_bytes"] = stat.size_diff
+        entry["count_diff"] = stat.count_diff
+    if len(stat.traceback) > 1:
+        entry["traceback"] = [f"{f.filename}:{f.lineno}" for f in stat.traceback]
+    return entry
+
+
+class MemoryMonitor:
+    """Contabilidad de memoria del proceso: RSS con historial, tamaño estimado por
+    componente (caches, indice, embedder...) y snapshots de tracemalloc.
+
+    Los componentes se registran con register(nombre, funcion), donde la funcion
+    devuelve un dict con al menos "bytes", o con register_group(funcion) si una
+    funcion mide varios ({nombre: dict}); se evaluan solo al pedir el reporte.
+    Cada snapshot se compara con el anterior (asignaciones que mas crecieron),
+    util para encontrar fugas entre dos momentos de carga.
+    """
+
+    def __init__(self, sample_interval=MEMORY_SAMPLE_INTERVAL, history_samples=MEMORY_HISTORY_SAMPLES,
+                 top=MEMORY_TOP_ALLOCATIONS):
+        self.sample_interval = sample_interval
+        self.history = deque(maxlen=max(1, history_samples))
+        self.top = top
+        self.components = []    # (nombre, funcion, es_grupo)
+        self.snapshots = deque(maxlen=2)    # (instante, tracemalloc.Snapshot)
+        self.lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+
+    def register(self, name, measure):
+        self.components.append((name, measure, False))
+
+    def register_group(self, name, measure):
+        """name solo identifica el grupo si la medicion falla"""
+        self.components.append((name, measure, True))
+
+    # ============ RSS ============
+    def start(self):
+        """Hilo de muestreo del RSS (uno por proceso: tras un fork se vuelve a llamar)"""
+        if MEMORY_TRACEMALLOC and not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_TRACEMALLOC_FRAMES)
+        if self._pid == os.getpid() or self.sample_interval <= 0:
+            return
+        # El historial heredado del maestro no es el de este proceso
+        self._pid = os.getpid()
+        self.history.clear()
+        self.snapshots.clear()
+        self._thread = threading.Thread(target=self._sample_loop, name="memory-sampler", daemon=True)
+        self._thread.start()
+
+    def _sample_loop(self):
+        while True:
+            self.sample()
+            time.sleep(self.sample_interval)
+
+    def sample(self):
+        rss, _ = read_rss()
+        if rss is not None:
+            with self.lock:
+                self.history.append((round(time.time(), 1), rss))
+        return rss
+
+    # ============ COMPONENTES ============
+    def measure_components(self):
+        sizes = {}
+        for name, measure, group in list(self.components):
+            try:
+                if group:
+                    sizes.update(measure())
+                else:
+                    sizes[name] = measure()
+            except Exception as e:
+                sizes[name] = {"error": str(e)}
+        return sizes
+
+    def report(self, include_history=True):
+        rss, peak = read_rss()
+        components = self.measure_components()
+        accounted = sum(c.get("bytes") or 0 for c in components.values())
+        with self.lock:
+            history = list(self.history)
+        report = {
+            "pid": os.getpid(),
+            "rss_bytes": rss,
+            "rss_peak_bytes": peak,
+            # Lo que no cubren los componentes: interprete, librerias, arenas liberadas pero retenidas
+            "unaccounted_bytes": rss - accounted if rss is not None else None,
+            "components": components,
+            "tracemalloc": self.tracemalloc_status(),
+        }
+        if history:
+            values = [value for _, value in history]
+            report["rss_history_summary"] = {
+                "samples": len(history),
+                "interval_seconds": self.sample_interval,
+                "min_bytes": min(values),
+                "max_bytes": max(values),
+                "growth_bytes": values[-1] - values[0],
+            }
+            if include_history:
+                report["rss_history"] = [{"time": t, "rss_bytes": value} for t, value in history]
+        return report
+
+    # ============ TRACEMALLOC ============
+    def tracemalloc_status(self):
+        if not tracemalloc.is_tracing():
+            return {"tracing": False, "snapshots": len(self.snapshots)}
+        current, peak = tracemalloc.get_traced_memory()
+        return {
+            "tracing": True,
+            "frames": tracemalloc.get_traceback_limit(),
+            "traced_bytes": current,
+            "traced_peak_bytes": peak,
+            "overhead_bytes": tracemalloc.get_tracemalloc_memory(),
+            "snapshots": len(self.snapshots),
+        }
+
+    def take_snapshot(self, top=None):
+        """Snapshot de tracemalloc: asignaciones mas grandes y diferencia con el anterior.
+
+        Si tracemalloc no estaba activo se activa aqui; ese primer snapshot solo ve
+        lo asignado desde ahora, y sirve como linea base para el siguiente.
+        """
+        top = top or self.top
+        started = False
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(MEMORY_TRACEMALLOC_FRAMES)
+            started = True
+            logger.info("tracemalloc activado para snapshots de memoria")
+
+        snapshot = tracemalloc.take_snapshot().filter_traces(_SNAPSHOT_FILTERS)
+        key = "traceback" if tracemalloc.get_traceback_limit() > 1 else "lineno"
+        with self.lock:
+            previous = self.snapshots[-1] if self.snapshots else None
+            self.snapshots.append((time.time(), snapshot))
+
+        result = {
+            "tracing_started": started,
+            "total_traced_bytes": sum(stat.size for stat in snapshot.statistics("filename")),
+            "top": [_format_stat(stat) for stat in snapshot.statistics(key)[:top]],
+        }
+        if previous is not None:
+            taken_at, previous_snapshot = previous
+            diff = snapshot.compare_to(previous_snapshot, key)
+            result["since_seconds"] = round(time.time() - taken_at, 1)
+            result["diff"] = [_format_stat(stat) for stat in diff[:top] if stat.size_diff]
+        return result
+
+    def stop_tracing(self):
+        """Desactivar tracemalloc y soltar los snapshots (devuelve la memoria que usaban)"""
+        with self.lock:
+            self.snapshots.clear()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            logger.info("tracemalloc desactivado")
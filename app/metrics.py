@@ -0,0 +1,294 @@
+# app/metrics.py
+import bisect
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+# Buckets en segundos: de operaciones en memoria (ms) a generaciones largas del LLM
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120)
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name}: etiquetas esperadas {self.labelnames}, recibidas {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """Valor puntual; con set_function se calcula al momento de cada scrape"""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._function = None
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set_function(self, function):
+        """function() -> numero, o {tupla de etiquetas: numero} si la metrica tiene etiquetas"""
+        self._function = function
+
+    def render(self):
+        if self._function is not None:
+            try:
+                result = self._function()
+            except Exception:
+                result = None
+            if result is None:
+                items = []
+            elif isinstance(result, dict):
+                items = sorted((tuple(str(v) for v in key), value) for key, value in result.items())
+            else:
+                items = [((), result)]
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, ([*counts], total, count)) for key, (counts, total, count) in self._values.items())
+        lines = self.header()
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = _labels(self.labelnames, key, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{le} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+        self._const_labels = ()
+
+    def set_const_labels(self, **labels):
+        """Etiquetas que se agregan a todas las series (p. ej. worker y pid con pre-fork)"""
+        self._const_labels = tuple(sorted(labels.items()))
+
+    def register(self, metric):
+        with self._lock:
+            if metric.name in self._metrics:
+                raise ValueError(f"Metrica duplicada: {metric.name}")
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """Formato de texto de Prometheus (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        if self._const_labels:
+            lines = [_add_labels(line, self._const_labels) for line in lines]
+        return "\n".join(lines) + "\n"
+
+
+def _add_labels(line, labels):
+    """Agregar etiquetas a una linea de muestra ('nombre{...} valor' o 'nombre valor')"""
+    if line.startswith("#"):
+        return line
+    extra = ",".join(f'{name}="{_escape(value)}"' for name, value in labels)
+    end = min(i for i in (line.find("{"), line.find(" ")) if i >= 0)
+    if line[end] == "{":
+        return f"{line[:end + 1]}{extra},{line[end + 1:]}"
+    return f"{line[:end]}{{{extra}}}{line[end:]}"
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REGISTRY = MetricsRegistry()
+
+# ============ METRICAS DEL CHATBOT ============
+CHAT_STAGE_SECONDS = REGISTRY.histogram(
+    "chatbot_chat_stage_seconds",
+    "Duracion de cada etapa de /chat",
+    ["stage"],
+)
+CHAT_REQUEST_SECONDS = REGISTRY.histogram(
+    "chatbot_chat_request_seconds",
+    "Duracion total de /chat por estrategia",
+    ["strategy"],
+)
+CHAT_REQUESTS = REGISTRY.counter(
+    "chatbot_chat_requests_total",
+    "Peticiones a /chat por estrategia y resultado",
+    ["strategy", "outcome"],
+)
+CHAT_DEADLINE_SKIPS = REGISTRY.counter(
+    "chatbot_chat_deadline_skips_total",
+    "Etapas de /chat saltadas por falta de tiempo en el plazo de la peticion",
+    ["stage"],
+)
+TTS_STAGE_SECONDS = REGISTRY.histogram(
+    "chatbot_tts_stage_seconds",
+    "Duracion de cada etapa de /tts",
+    ["stage"],
+)
+TTS_REQUESTS = REGISTRY.counter(
+    "chatbot_tts_requests_total",
+    "Peticiones a /tts por resultado",
+    ["outcome"],
+)
+CACHE_LOOKUPS = REGISTRY.counter(
+    "chatbot_cache_lookups_total",
+    "Consultas a caches en memoria (response_cache, result_cache, prefetch)",
+    ["cache", "result"],
+)
+LLM_TOKENS = REGISTRY.counter(
+    "chatbot_llm_tokens_total",
+    "Tokens reportados por Ollama (prompt_eval y eval)",
+    ["kind"],
+)
+LLM_IN_FLIGHT = REGISTRY.gauge(
+    "chatbot_llm_in_flight",
+    "Llamadas al LLM en curso (profundidad de la cola)",
+)
+LLM_BACKEND_OUTSTANDING = REGISTRY.gauge(
+    "chatbot_llm_backend_outstanding",
+    "Peticiones en curso por backend de Ollama",
+    ["backend"],
+)
+LLM_BACKEND_UP = REGISTRY.gauge(
+    "chatbot_llm_backend_up",
+    "1 si el backend esta sano y con el circuito cerrado",
+    ["backend"],
+)
+RAG_INDEX_CHUNKS = REGISTRY.gauge(
+    "chatbot_rag_index_chunks",
+    "Chunks en el indice de vectores",
+)
+RAG_READY = REGISTRY.gauge(
+    "chatbot_rag_ready",
+    "1 cuando el RAG esta listo para buscar",
+)
+
+LOG_RECORDS_DROPPED = REGISTRY.gauge(
+    "chatbot_log_records_dropped",
+    "Registros de log descartados porque la cola de escritura estaba llena",
+)
+
+CONVERSATION_SESSIONS = REGISTRY.gauge(
+    "chatbot_conversation_sessions",
+    "Sesiones de conversacion en memoria",
+)
+CONVERSATION_BYTES = REGISTRY.gauge(
+    "chatbot_conversation_bytes",
+    "Bytes estimados de la memoria de conversacion (tope CONVERSATION_MAX_BYTES)",
+)
+
+PROCESS_RSS_BYTES = REGISTRY.gauge(
+    "chatbot_process_rss_bytes",
+    "Memoria residente (RSS) del proceso",
+)
+
+
+def record_cache_lookup(cache, hit):
+    CACHE_LOOKUPS.inc(cache=cache, result="hit" if hit else "miss")
@@ -0,0 +1,237 @@
+# app/model_warmup.py
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # pragma: no cover - Python < 3.9
+    ZoneInfo = None
+
+# Precargar el modelo al arrancar y mantenerlo caliente en horario escolar
+WARMUP_ENABLED = os.getenv("MODEL_WARMUP", "true").lower() == "true"
+# Cada cuanto se revisa/refresca el modelo; debe ser menor que keep_alive
+WARMUP_INTERVAL_SECONDS = int(os.getenv("WARMUP_INTERVAL_SECONDS", "240"))
+# Horario escolar (HH:MM-HH:MM) y dias (0=lunes ... 6=domingo)
+WARMUP_SCHOOL_HOURS = os.getenv("WARMUP_SCHOOL_HOURS", "06:30-18:30")
+WARMUP_SCHOOL_DAYS = os.getenv("WARMUP_SCHOOL_DAYS", "0-5")
+WARMUP_TIMEZONE = os.getenv("WARMUP_TIMEZONE", "America/Bogota")
+# Descargar el modelo si Ollama no lo tiene (la primera vez puede tardar minutos)
+WARMUP_AUTO_PULL = os.getenv("WARMUP_AUTO_PULL", "false").lower() == "true"
+# Tiempo maximo para cargar el modelo en memoria (mucho mayor que OLLAMA_TIMEOUT de /chat)
+WARMUP_LOAD_TIMEOUT = int(os.getenv("WARMUP_LOAD_TIMEOUT", "300"))
+
+
+def parse_hours(value):
+    """'06:30-18:30' -> (390, 1110) en minutos desde medianoche"""
+    start, end = value.split("-")
+    to_minutes = lambda hhmm: int(hhmm.split(":")[0]) * 60 + int(hhmm.split(":")[1])
+    return to_minutes(start.strip()), to_minutes(end.strip())
+
+
+def parse_days(value):
+    """'0-4' o '0,2,4' -> {0, 2, 4}"""
+    days = set()
+    for part in value.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-")
+            days.update(range(int(first), int(last) + 1))
+        else:
+            days.add(int(part))
+    return days
+
+
+class ModelWarmupManager:
+    """Precarga el modelo de Ollama, lo fija con keep_alive y lo refresca en horario escolar.
+
+    Fuera de horario deja de refrescarlo: Ollama lo descarga al vencer keep_alive
+    y libera la memoria. El estado queda disponible para /model/status y /ready.
+    """
+
+    def __init__(self, ollama_url, model, keep_alive, num_ctx=None, warm_prompts=(),
+                 interval=None, school_hours=None, school_days=None, timezone=None):
+        self.ollama_url = ollama_url.rstrip("/")
+        self.model = model
+        self.keep_alive = keep_alive
+        self.num_ctx = num_ctx
+        # Prefijos constantes de las plantillas: dejan lista tambien la cache KV
+        self.warm_prompts = [p for p in warm_prompts if p]
+        self.interval = interval or WARMUP_INTERVAL_SECONDS
+        self.school_hours = parse_hours(school_hours or WARMUP_SCHOOL_HOURS)
+        self.school_days = parse_days(school_days or WARMUP_SCHOOL_DAYS)
+        self.timezone = self._load_timezone(timezone or WARMUP_TIMEZONE)
+
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._status = {
+            "model": model,
+            "state": "unknown",   # unknown | pulling | loading | loaded | unloaded | missing | error
+            "keep_alive": keep_alive,
+            "school_hours": self.in_school_hours(),
+            "last_load_seconds": None,
+            "last_check": None,
+            "last_warm": None,
+            "expires_at": None,
+            "error": None,
+        }
+
+    @staticmethod
+    def _load_timezone(name):
+        if ZoneInfo is None:
+            return None
+        try:
+            return ZoneInfo(name)
+        except Exception:
+            logger.warning(f"Zona horaria {name} no disponible, usando la hora local")
+            return None
+
+    # ============ ESTADO ============
+    def _set(self, **values):
+        with self._lock:
+            self._status.update(values)
+
+    def status(self):
+        with self._lock:
+            return dict(self._status)
+
+    def is_loaded(self):
+        return self.status()["state"] == "loaded"
+
+    def in_school_hours(self, now=None):
+        now = now or datetime.now(self.timezone)
+        if now.weekday() not in self.school_days:
+            return False
+        minutes = now.hour * 60 + now.minute
+        start, end = self.school_hours
+        return start <= minutes < end
+
+    # ============ OLLAMA ============
+    def _options(self):
+        # Mismo num_ctx que /chat: si cambia, Ollama recarga el modelo
+        options = {"num_predict": 1, "temperature": 0}
+        if self.num_ctx:
+            options["num_ctx"] = self.num_ctx
+        return options
+
+    def _running_model(self):
+        """Entrada de /api/ps para el modelo, o None si no esta cargado"""
+        response = requests.get(f"{self.ollama_url}/api/ps", timeout=5)
+        response.raise_for_status()
+        for entry in response.json().get("models", []):
+            if entry.get("name") == self.model or entry.get("model") == self.model:
+                return entry
+        return None
+
+    def _model_available(self):
+        response = requests.get(f"{self.ollama_url}/api/tags", timeout=5)
+        response.raise_for_status()
+        names = {entry.get("name") for entry in response.json().get("models", [])}
+        return self.model in names or f"{self.model}:latest" in names
+
+    def _pull(self):
+        self._set(state="pulling")
+        logger.info(f"Descargando modelo {self.model}...")
+        response = requests.post(
+            f"{self.ollama_url}/api/pull",
+            json={"model": self.model, "stream": False},
+            timeout=None,
+        )
+        response.raise_for_status()
+        logger.info(f"Modelo {self.model} descargado")
+
+    def _generate(self, prompt):
+        response = requests.post(f"{self.ollama_url}/api/generate", json={
+            "model": self.model,
+            "prompt": prompt,
+            "stream": False,
+            "keep_alive": self.keep_alive,
+            "options": self._options(),
+        }, timeout=WARMUP_LOAD_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    def warm(self):
+        """Cargar el modelo (si hace falta) y evaluar los prefijos; devuelve True si quedo cargado"""
+        try:
+            if not self._model_available():
+                if not WARMUP_AUTO_PULL:
+                    self._set(state="missing", error=f"Ollama no tiene el modelo {self.model}")
+                    logger.warning(f"Ollama no tiene el modelo {self.model} (WARMUP_AUTO_PULL=false)")
+                    return False
+                self._pull()
+
+            was_loaded = self._running_model() is not None
+            if not was_loaded:
+                self._set(state="loading")
+                logger.info(f"Cargando modelo {self.model} en Ollama...")
+
+            start = time.perf_counter()
+            data = {}
+            for prompt in self.warm_prompts or [""]:
+                data = self._generate(prompt)
+            elapsed = time.perf_counter() - start
+
+            running = self._running_model()
+            values = {
+                "state": "loaded" if running else "unloaded",
+                "last_warm": time.time(),
+                "expires_at": running.get("expires_at") if running else None,
+                "error": None,
+            }
+            if not was_loaded:
+                values["last_load_seconds"] = round(
+                    (data.get("load_duration") or 0) / 1e9 or elapsed, 2
+                )
+                logger.info(f"Modelo {self.model} listo en {elapsed:.1f}s (keep_alive={self.keep_alive})")
+            self._set(**values)
+            return running is not None
+
+        except requests.RequestException as e:
+            self._set(state="error", error=str(e))
+            logger.warning(f"Warm-up de {self.model} fallo: {e}")
+            return False
+
+    def check(self):
+        """Actualizar el estado sin cargar nada (para fuera de horario)"""
+        try:
+            running = self._running_model()
+            self._set(
+                state="loaded" if running else "unloaded",
+                expires_at=running.get("expires_at") if running else None,
+                error=None,
+            )
+        except requests.RequestException as e:
+            self._set(state="error", error=str(e))
+
+    # ============ HILO ============
+    def _run(self):
+        # Al arrancar se precarga siempre, este o no en horario escolar
+        self.warm()
+        while not self._stop.wait(self.interval):
+            school = self.in_school_hours()
+            self._set(school_hours=school, last_check=time.time())
+            if school:
+                # En horario: refrescar keep_alive y recargar si Ollama lo descargo
+                self.warm()
+            else:
+                self.check()
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="model-warmup", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
@@ -0,0 +1,115 @@
+# app/pdf_extractor.py
+import hashlib
+import io
+import logging
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+try:
+    import pdfplumber
+except ImportError:  # pragma: no cover - depende del entorno
+    pdfplumber = None
+
+try:
+    import pytesseract
+    from pdf2image import convert_from_path
+except ImportError:  # pragma: no cover - depende del entorno
+    pytesseract = None
+    convert_from_path = None
+
+# Cambiar cuando cambie la forma de extraer: invalida el cache
+EXTRACTOR_VERSION = "1"
+
+EXTRACTION_CACHE_DIR = os.getenv(
+    "EXTRACTION_CACHE_DIR",
+    os.path.join(os.path.abspath("./chroma_db"), "extracted")
+)
+# Paginas con menos texto que esto se consideran escaneadas y pasan por OCR
+OCR_MIN_CHARS = int(os.getenv("OCR_MIN_CHARS", "25"))
+OCR_LANG = os.getenv("OCR_LANG", "spa")
+OCR_DPI = int(os.getenv("OCR_DPI", "200"))
+# Paginas de un mismo PDF en OCR a la vez. pdftoppm y tesseract son procesos externos, asi que
+# los hilos corren en paralelo de verdad; cada pagina en vuelo es una imagen de varios MB a OCR_DPI
+OCR_WORKERS = max(1, int(os.getenv("OCR_WORKERS", "4")))
+
+
+def file_md5(filepath, block_size=1024 * 1024):
+    """Hash del contenido leyendo por bloques"""
+    digest = hashlib.md5()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _cache_path(content_hash):
+    return os.path.join(EXTRACTION_CACHE_DIR, f"{content_hash}-v{EXTRACTOR_VERSION}-{OCR_LANG}.txt")
+
+
+def _write_cache(content_hash, text):
+    os.makedirs(EXTRACTION_CACHE_DIR, exist_ok=True)
+    # Escritura atomica: varios procesos del pool pueden extraer a la vez
+    fd, tmp_path = tempfile.mkstemp(dir=EXTRACTION_CACHE_DIR, suffix='.tmp')
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, _cache_path(content_hash))
+
+
+def _ocr_page(filepath, page_number):
+    """OCR de una sola pagina (1-based)"""
+    images = convert_from_path(filepath, dpi=OCR_DPI, first_page=page_number, last_page=page_number)
+    return "\n".join(pytesseract.image_to_string(image, lang=OCR_LANG) for image in images)
+
+
+def _try_ocr_page(filepath, page_number):
+    try:
+        return _ocr_page(filepath, page_number)
+    except Exception as e:
+        logger.warning(f"OCR fallo en {os.path.basename(filepath)} pagina {page_number}: {e}")
+        return None
+
+
+def ocr_available():
+    return pytesseract is not None and convert_from_path is not None
+
+
+def _extract_uncached(filepath):
+    if pdfplumber is None:
+        raise RuntimeError("pdfplumber no esta instalado")
+
+    filename = os.path.basename(filepath)
+    with pdfplumber.open(filepath) as pdf:
+        pages = [(page.extract_text() or "").strip() for page in pdf.pages]
+
+    # Paginas escaneadas: OCR en paralelo dentro del archivo (un PDF escaneado grande
+    # no queda en un solo nucleo mientras el resto del pool ya termino)
+    scanned = [i for i, text in enumerate(pages) if len(text) < OCR_MIN_CHARS]
+    ocr_pages = 0
+    if scanned and ocr_available():
+        with ThreadPoolExecutor(max_workers=min(OCR_WORKERS, len(scanned))) as pool:
+            results = pool.map(lambda i: _try_ocr_page(filepath, i + 1), scanned)
+            for i, text in zip(scanned, results):
+                if text is not None:
+                    pages[i] = text.strip()
+                    ocr_pages += 1
+
+    logger.info(f"PDF extraido: {filename} ({len(pages)} paginas, {ocr_pages} con OCR)")
+    return "\n\n".join(page for page in pages if page)
+
+
+def open_extracted_text(filepath, content_hash=None):
+    """Texto extraido como stream: el archivo de cache, o en memoria si no se pudo guardar"""
+    content_hash = content_hash or file_md5(filepath)
+    path = _cache_path(content_hash)
+    if not os.path.exists(path):
+        text = _extract_uncached(filepath)
+        try:
+            _write_cache(content_hash, text)
+        except OSError as e:
+            logger.warning(f"No se pudo guardar el cache de extraccion: {e}")
+            return io.StringIO(text)
+    return open(path, 'r', encoding='utf-8')
+
@@ -0,0 +1,104 @@
+# app/prefetch.py
+import difflib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from prefork import SERVER_WORKERS
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "true").lower() == "true"
+# Las ranuras son de cada proceso: con pre-fork /rag/prefetch y /chat casi nunca caen en el
+# mismo worker, y cada anticipacion seria una busqueda extra que nadie aprovecha
+PREFETCH_DISABLED_REASON = None
+if PREFETCH_ENABLED and SERVER_WORKERS > 1:
+    PREFETCH_ENABLED = False
+    PREFETCH_DISABLED_REASON = (
+        f"SERVER_WORKERS={SERVER_WORKERS}: las ranuras son por proceso y no se comparten entre workers"
+    )
+# Vida de un resultado anticipado: el estudiante suele enviar segundos despues de dejar de escribir
+PREFETCH_TTL_SECONDS = float(os.getenv("PREFETCH_TTL_SECONDS", "30"))
+PREFETCH_MAX_SESSIONS = int(os.getenv("PREFETCH_MAX_SESSIONS", "1000"))
+# Similitud minima (difflib, 0-1) entre el texto anticipado y la pregunta enviada
+PREFETCH_MIN_SIMILARITY = float(os.getenv("PREFETCH_MIN_SIMILARITY", "0.9"))
+# Textos mas cortos no se anticipan (la pregunta todavia no dice nada)
+PREFETCH_MIN_CHARS = int(os.getenv("PREFETCH_MIN_CHARS", "12"))
+# Busquedas anticipadas simultaneas; si se pasa, la anticipacion se descarta (no se encola)
+PREFETCH_MAX_CONCURRENT = int(os.getenv("PREFETCH_MAX_CONCURRENT", "2"))
+
+
+def similarity(a, b):
+    if a == b:
+        return 1.0
+    return difflib.SequenceMatcher(None, a, b, autojunk=False).ratio()
+
+
+class PrefetchStore:
+    """Resultados de busqueda anticipados mientras el estudiante escribe, uno por sesion.
+
+    /rag/prefetch guarda (consulta normalizada, chunks, best_distance) y /chat lo
+    toma con take() si su consulta es igual o casi igual; el resultado se consume
+    una sola vez y caduca a los PREFETCH_TTL_SECONDS. Con pre-fork se desactiva
+    (PREFETCH_DISABLED_REASON).
+    """
+
+    def __init__(self, ttl=PREFETCH_TTL_SECONDS, max_sessions=PREFETCH_MAX_SESSIONS,
+                 min_similarity=PREFETCH_MIN_SIMILARITY, max_concurrent=PREFETCH_MAX_CONCURRENT):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.min_similarity = min_similarity
+        self.slots = OrderedDict()      # session_id -> (consulta, chunks, best_distance, creado)
+        self.lock = threading.Lock()
+        self._searches = threading.BoundedSemaphore(max(1, max_concurrent))
+        self.stats = {"stored": 0, "hits": 0, "misses": 0, "stale": 0, "busy": 0}
+
+    def try_begin(self):
+        """Reservar un cupo de busqueda sin esperar; False si ya hay PREFETCH_MAX_CONCURRENT"""
+        if self._searches.acquire(blocking=False):
+            return True
+        with self.lock:
+            self.stats["busy"] += 1
+        return False
+
+    def end(self):
+        self._searches.release()
+
+    def put(self, session_id, query, chunks, best_distance):
+        with self.lock:
+            self.slots[session_id] = (query, chunks, best_distance, time.monotonic())
+            self.slots.move_to_end(session_id)
+            while len(self.slots) > self.max_sessions:
+                self.slots.popitem(last=False)
+            self.stats["stored"] += 1
+
+    def take(self, session_id, query):
+        """(chunks, best_distance) anticipados para query, o None. La ranura se vacia siempre."""
+        with self.lock:
+            slot = self.slots.pop(session_id, None) if session_id else None
+            if slot is None:
+                return None
+            prefetched_query, chunks, best_distance, created = slot
+            if time.monotonic() - created > self.ttl:
+                self.stats["stale"] += 1
+                return None
+            if similarity(prefetched_query, query) < self.min_similarity:
+                self.stats["misses"] += 1
+                return None
+            self.stats["hits"] += 1
+            return chunks, best_distance
+
+    def clear(self):
+        """Descartar todo lo anticipado (el indice cambio)"""
+        with self.lock:
+            self.slots.clear()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "enabled": PREFETCH_ENABLED,
+                "disabled_reason": PREFETCH_DISABLED_REASON,
+                "slots": len(self.slots),
+                "ttl_seconds": self.ttl,
+                "min_similarity": self.min_similarity,
+                **self.stats,
+            }
@@ -0,0 +1,156 @@
+# app/prefork.py
+import gc
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+
+import structured_logging
+
+logger = logging.getLogger(__name__)
+
+# Procesos HTTP; con 1 se usa el servidor de Flask de siempre (un proceso, varios hilos)
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "1"))
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", "128"))
+# Espera antes de relanzar un proceso que murio (evita un bucle de reinicios si falla al arrancar)
+PREFORK_RESPAWN_DELAY = float(os.getenv("PREFORK_RESPAWN_DELAY", "1"))
+PREFORK_STOP_TIMEOUT = float(os.getenv("PREFORK_STOP_TIMEOUT", "10"))
+
+# Señales que un worker envia al maestro; el maestro las reenvia al proceso escritor
+SIGNAL_REINDEX = signal.SIGUSR1
+SIGNAL_CRAWL = signal.SIGUSR2
+
+
+class PreforkServer:
+    """Servidor pre-fork: el maestro carga lo pesado una vez y luego hace fork.
+
+    El maestro abre el socket y crea SERVER_WORKERS procesos HTTP que lo heredan
+    (el kernel reparte las conexiones) junto con el modelo de embeddings y el
+    indice ya cargados, compartidos copy-on-write. El maestro no atiende
+    peticiones ni inicia hilos: solo vigila a los hijos y relanza los que mueren.
+
+    writer (opcional) corre en un proceso aparte sin HTTP: es el unico que
+    modifica el indice. Los workers le piden trabajo con signal_writer(), que
+    envia una señal al maestro y este la reenvia al escritor.
+    """
+
+    def __init__(self, app, host, port, workers=SERVER_WORKERS, on_worker_start=None, writer=None):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = max(1, workers)
+        self.on_worker_start = on_worker_start
+        self.writer = writer
+        self.children = {}          # pid -> rol ("worker-0", ..., "writer")
+        self.socket = None
+        self._stopping = False
+
+    # ============ MAESTRO ============
+    def serve(self):
+        self.socket = socket.create_server((self.host, self.port), backlog=SERVER_BACKLOG)
+        # No bloqueante: cuando varios workers despiertan por la misma conexion,
+        # los que no la obtienen vuelven a esperar en vez de quedar bloqueados en accept()
+        self.socket.setblocking(False)
+
+        # Lo cargado hasta aqui no lo recorre el GC de los hijos: sus paginas siguen compartidas
+        gc.collect()
+        gc.freeze()
+
+        signal.signal(signal.SIGTERM, self._handle_stop)
+        signal.signal(signal.SIGINT, self._handle_stop)
+        signal.signal(SIGNAL_REINDEX, self._forward_to_writer)
+        signal.signal(SIGNAL_CRAWL, self._forward_to_writer)
+
+        if self.writer:
+            self._spawn("writer")
+        for i in range(self.workers):
+            self._spawn(f"worker-{i}")
+        logger.info(f"Maestro {os.getpid()}: {self.workers} workers en {self.host}:{self.port}"
+                    f"{' + proceso escritor' if self.writer else ''}")
+
+        while self.children:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            role = self.children.pop(pid, None)
+            if role is None or self._stopping:
+                continue
+            logger.warning(f"{role} (pid {pid}) termino con estado {status}; relanzando")
+            time.sleep(PREFORK_RESPAWN_DELAY)
+            if not self._stopping:
+                self._spawn(role)
+        self.socket.close()
+        logger.info("Maestro detenido")
+
+    def _handle_stop(self, signum, frame):
+        if self._stopping:
+            return
+        self._stopping = True
+        for pid in list(self.children):
+            self._kill(pid, signal.SIGTERM)
+        # Si un hijo no termina a tiempo, se fuerza
+        timer = threading.Timer(PREFORK_STOP_TIMEOUT, self._kill_remaining)
+        timer.daemon = True
+        timer.start()
+
+    def _kill_remaining(self):
+        for pid in list(self.children):
+            self._kill(pid, signal.SIGKILL)
+
+    def _forward_to_writer(self, signum, frame):
+        for pid, role in list(self.children.items()):
+            if role == "writer":
+                self._kill(pid, signum)
+                return
+        logger.warning(f"Señal {signum} ignorada: no hay proceso escritor")
+
+    @staticmethod
+    def _kill(pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def _spawn(self, role):
+        pid = os.fork()
+        if pid:
+            self.children[pid] = role
+            return pid
+
+        # ---- proceso hijo ----
+        code = 0
+        try:
+            for signum in (signal.SIGTERM, signal.SIGINT, SIGNAL_REINDEX, SIGNAL_CRAWL):
+                signal.signal(signum, signal.SIG_DFL)
+            if role == "writer":
+                self.socket.close()
+                self.writer()
+            else:
+                self._serve_worker(role)
+        except Exception:
+            logger.exception(f"Error en {role}")
+            code = 1
+        finally:
+            structured_logging.shutdown()
+            # _exit: no correr los atexit ni los finalizadores heredados del maestro
+            os._exit(code)
+
+    # ============ WORKER ============
+    def _serve_worker(self, role):
+        from werkzeug.serving import make_server
+
+        if self.on_worker_start:
+            self.on_worker_start(role)
+        server = make_server(self.host, self.port, self.app, threaded=True, fd=self.socket.fileno())
+        signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+        logger.info(f"{role} (pid {os.getpid()}) atendiendo peticiones")
+        server.serve_forever()
+        server.server_close()
+
+
+def signal_writer(signum):
+    """Desde un worker: pedir al proceso escritor (via el maestro) que reindexe o rastree"""
+    os.kill(os.getppid(), signum)
@@ -0,0 +1,157 @@
+# app/prompt_templates.py
+import hashlib
+import logging
+import string
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class PromptTemplate:
+    """Plantilla con un prefijo constante y un cuerpo variable, compilada una sola vez.
+
+    El prefijo (persona + reglas) va siempre primero y sin variables: asi el texto
+    inicial es identico en cada peticion y Ollama reutiliza su cache KV para esa
+    parte en lugar de volver a evaluarla. Solo el cuerpo ({context}, {history},
+    {prompt}) cambia entre peticiones. Los campos de `optional` valen "" si no se pasan.
+    """
+
+    def __init__(self, name, prefix, body, optional=("history",)):
+        self.name = name
+        self.optional = frozenset(optional)
+        self.prefix = prefix
+        self.body = body
+        # Trozos (literal, campo) ya separados: render solo concatena
+        self._parts = [
+            (literal, field)
+            for literal, field, _spec, _conv in string.Formatter().parse(body)
+        ]
+        self.fields = {field for _literal, field in self._parts if field}
+        if any(field for _literal, field, _spec, _conv in string.Formatter().parse(prefix)):
+            raise ValueError(f"El prefijo de '{name}' no puede tener variables")
+        self.prefix_hash = hashlib.md5(prefix.encode("utf-8")).hexdigest()[:8]
+
+    def render(self, **values):
+        out = [self.prefix]
+        for literal, field in self._parts:
+            out.append(literal)
+            if field:
+                if field in values:
+                    out.append(str(values[field]))
+                elif field not in self.optional:
+                    raise KeyError(field)
+        return "".join(out)
+
+    # Compatible con str.format para ContextAssembler.build_prompt
+    format = render
+
+    def __repr__(self):
+        return f"PromptTemplate({self.name!r}, prefix={self.prefix_hash})"
+
+
+# ============ PLANTILLAS ============
+DOCS_FRIENDLY = PromptTemplate(
+    "docs_friendly",
+    prefix="""Eres el Profesor Axel, un maestro amable y paciente que explica las cosas de manera simple y clara.
+
+TU PERSONALIDAD:
+- Eres calido, motivador y siempre positivo
+- Explicas con ejemplos cotidianos que los niños entienden
+- Celebras el aprendizaje: "¡Excelente pregunta!", "¡Muy bien!"
+- Hablas de manera natural, como un amigo que enseña
+
+INSTRUCCIONES:
+1. Responde de manera SIMPLE y DIRECTA (maximo 3 oraciones cortas)
+2. Usa ejemplos de la vida diaria
+3. Sé motivador y positivo
+4. NO copies textual del material, explica con tus palabras
+5. Si puedes, da un ejemplo práctico
+
+""",
+    body="""MATERIAL EDUCATIVO:
+{context}
+
+{history}PREGUNTA: {prompt}
+
+RESPUESTA AMIGABLE:""",
+)
+
+MODEL_FRIENDLY = PromptTemplate(
+    "model_friendly",
+    prefix="""Eres el Profesor Axel, un maestro amable y entusiasta que adora enseñar.
+
+TU ESTILO:
+- Explicas de forma simple, clara y divertida
+- Siempre eres positivo y motivador
+- Usas ejemplos que los niños conocen de su vida diaria
+- Eres paciente y comprensivo
+- Te emociona cuando los niños hacen preguntas
+
+REGLAS:
+1. Responde en MÁXIMO 3 oraciones simples
+2. Usa palabras sencillas que un niño entienda
+3. Da un ejemplo práctico si es posible
+4. Sé entusiasta pero no exagerado
+
+""",
+    body="""{history}PREGUNTA: {prompt}
+
+TU RESPUESTA COMO PROFESOR AXEL:""",
+)
+
+PROMPT_TEMPLATES = {template.name: template for template in (DOCS_FRIENDLY, MODEL_FRIENDLY)}
+
+
+def get_prompt_template(name):
+    try:
+        return PROMPT_TEMPLATES[name]
+    except KeyError:
+        raise KeyError(f"Plantilla de prompt desconocida: {name}") from None
+
+
+# ============ MEDICION DE PROMPT-EVAL ============
+class PromptEvalStats:
+    """Acumula tokens y tiempo de prompt-eval que reporta Ollama, por plantilla.
+
+    Si el prefijo se reutiliza, prompt_eval_count queda muy por debajo de los
+    tokens estimados del prompt completo (Ollama solo evalua lo que no estaba en cache).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, template_name, estimated_tokens, metrics):
+        if not metrics or metrics.get("prompt_eval_count") is None:
+            return None
+        evaluated = int(metrics["prompt_eval_count"])
+        eval_ms = (metrics.get("prompt_eval_duration") or 0) / 1e6
+        sample = {
+            "prompt_tokens_est": estimated_tokens,
+            "prompt_eval_count": evaluated,
+            "prompt_eval_ms": round(eval_ms, 1),
+            "reused_tokens_est": max(0, estimated_tokens - evaluated),
+        }
+        with self._lock:
+            entry = self._stats.setdefault(template_name, {
+                "requests": 0,
+                "prompt_tokens_est": 0,
+                "prompt_eval_count": 0,
+                "prompt_eval_ms": 0.0,
+            })
+            entry["requests"] += 1
+            entry["prompt_tokens_est"] += estimated_tokens
+            entry["prompt_eval_count"] += evaluated
+            entry["prompt_eval_ms"] += eval_ms
+        return sample
+
+    def snapshot(self):
+        with self._lock:
+            stats = {name: dict(entry) for name, entry in self._stats.items()}
+        for name, entry in stats.items():
+            requests = entry["requests"] or 1
+            entry["avg_prompt_eval_count"] = round(entry["prompt_eval_count"] / requests, 1)
+            entry["avg_prompt_eval_ms"] = round(entry["prompt_eval_ms"] / requests, 1)
+            entry["prompt_eval_ms"] = round(entry["prompt_eval_ms"], 1)
+            entry["prefix_hash"] = PROMPT_TEMPLATES[name].prefix_hash if name in PROMPT_TEMPLATES else None
+        return stats
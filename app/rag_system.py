@@ -1,132 +1,391 @@
 ﻿# app/rag_system.py
-import chromadb
-from chromadb.config import Settings
 import os
-import glob
-from sentence_transformers import SentenceTransformer
+import sys
 import logging
-import re
-import hashlib
 import json
+import threading
+import time
 from functools import lru_cache
-from concurrent.futures import ThreadPoolExecutor
+from retrieval_policy import RetrievalPolicy
+import chunker
+import ingestion
+from pdf_extractor import file_md5
+from vector_store import CompactVectorStore
+import index_bundle
+from metrics import CHAT_STAGE_SECONDS, record_cache_lookup
+from structured_logging import trace_enabled
+from deadline import DEADLINE_LLM_MIN_SECONDS, DEADLINE_RETRIEVAL_MIN_SECONDS
+from memory_accounting import deep_sizeof
 logger = logging.getLogger(__name__)
 
+# Chunks por lote al generar embeddings durante la indexacion
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
+# chroma: ChromaDB (float32 + metadatos por chunk) | compact: float16 + columnas (vector_store.py)
+VECTOR_STORE = os.getenv("VECTOR_STORE", "chroma").lower()
+# Coleccion de Chroma: cada reindexacion crea <nombre>_<marca> y la activa queda en chroma_db/ACTIVE_COLLECTION
+CHROMA_COLLECTION = "docs_educativos"
+
+# ============ EMBEDDERS ============
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+# sentence-transformers (PyTorch) | onnx (ONNX Runtime, sin torch)
+EMBEDDER_BACKEND = os.getenv("EMBEDDER_BACKEND", "sentence-transformers").lower()
+# Carpeta con model.onnx (o model_int8.onnx) y tokenizer.json, generada por export_onnx_embedder.py
+EMBEDDER_ONNX_PATH = os.getenv("EMBEDDER_ONNX_PATH", os.path.abspath("./models/all-MiniLM-L6-v2-onnx"))
+
+
+class Embedder:
+    """Interfaz comun: encode(texto | lista) -> numpy array, como SentenceTransformer.encode"""
+
+    # Identifica el espacio vectorial: backends con el mismo model_id son intercambiables
+    model_id = None
+    dimension = None
+
+    def encode(self, texts, batch_size=32):
+        raise NotImplementedError
+
+    def after_fork(self, threads):
+        """En un proceso hijo (pre-fork): ajustar los hilos de inferencia al reparto de CPU"""
+
+    def memory_bytes(self):
+        """Bytes aproximados de los pesos del modelo en memoria (None si no se sabe)"""
+        return None
+
+
+class SentenceTransformerEmbedder(Embedder):
+    """Modelo original en PyTorch"""
+
+    def __init__(self, model_name=EMBEDDING_MODEL):
+        # Import diferido: torch solo se carga si se usa este backend
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+        self.model_id = model_name
+        self.dimension = self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts, batch_size=32):
+        return self.model.encode(texts, batch_size=batch_size)
+
+    def after_fork(self, threads):
+        import torch
+        torch.set_num_threads(threads)
+
+    def memory_bytes(self):
+        # Pesos y buffers del modelo; no incluye el arena del allocator ni los hilos de torch
+        return sum(t.numel() * t.element_size()
+                   for t in list(self.model.parameters()) + list(self.model.buffers()))
+
+
+class ONNXEmbedder(Embedder):
+    """MiniLM exportado a ONNX (opcionalmente cuantizado a int8) sobre ONNX Runtime.
+
+    Reproduce el pipeline de sentence-transformers: tokenizar, mean pooling con la
+    mascara de atencion y normalizacion L2, para que los vectores sean compatibles
+    con un indice creado por SentenceTransformerEmbedder.
+    """
+
+    def __init__(self, model_dir=EMBEDDER_ONNX_PATH, model_name=EMBEDDING_MODEL, max_length=256, threads=None):
+        import numpy as np
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        self.np = np
+        model_file = None
+        for candidate in ("model_int8.onnx", "model.onnx"):
+            path = os.path.join(model_dir, candidate)
+            if os.path.exists(path):
+                model_file = path
+                break
+        if model_file is None:
+            raise FileNotFoundError(f"No hay model_int8.onnx ni model.onnx en {model_dir}")
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+
+        self.model_file = model_file
+        self.session = self._create_session(threads)
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        self.model_id = model_name
+        self.dimension = self.session.get_outputs()[0].shape[-1]
+        logger.info(f"Embedder ONNX cargado: {model_file}")
+
+    def _create_session(self, threads):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        return ort.InferenceSession(self.model_file, options, providers=["CPUExecutionProvider"])
+
+    def after_fork(self, threads):
+        # El pool de hilos de la sesion se creo en el maestro y no existe en el hijo
+        self.session = self._create_session(threads)
+
+    def memory_bytes(self):
+        # ONNX Runtime carga los pesos completos: aproximadamente el tamaño del .onnx
+        return os.path.getsize(self.model_file)
+
+    def _encode_batch(self, texts):
+        np = self.np
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        token_embeddings = self.session.run(None, feeds)[0]
+
+        # Mean pooling + normalizacion L2 (igual que all-MiniLM-L6-v2)
+        mask = attention_mask[..., None].astype(np.float32)
+        summed = (token_embeddings * mask).sum(axis=1)
+        counts = np.clip(mask.sum(axis=1), 1e-9, None)
+        pooled = summed / counts
+        norms = np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+        return (pooled / norms).astype(np.float32)
+
+    def encode(self, texts, batch_size=32):
+        single = isinstance(texts, str)
+        items = [texts] if single else list(texts)
+        if not items:
+            return self.np.zeros((0, self.dimension), dtype=self.np.float32)
+
+        batches = [self._encode_batch(items[i:i + batch_size]) for i in range(0, len(items), batch_size)]
+        result = self.np.vstack(batches)
+        return result[0] if single else result
+
+
+def create_embedder(backend=None):
+    """Crear el embedder configurado; si ONNX no esta disponible se usa el modelo PyTorch"""
+    backend = (backend or EMBEDDER_BACKEND).lower()
+    if backend == "onnx":
+        try:
+            return ONNXEmbedder()
+        except Exception as e:
+            logger.warning(f"Embedder ONNX no disponible ({e}), usando sentence-transformers")
+    return SentenceTransformerEmbedder()
+
+
 class RAGSystem:
-    def __init__(self, docs_dir="../docs"):
+    # Un solo escritor del indice por proceso, comun a todas las instancias: una
+    # reindexacion completa (que reemplaza la instancia) no se intercala con
+    # update_documents/remove_documents de la anterior
+    write_lock = threading.RLock()
+
+    def __init__(self, docs_dir="../docs", policy=None, progress=None, force_reindex=False, embedder=None,
+                 bundle_path=None):
         self.docs_dir = docs_dir
+        # Bundle precompilado (build_index.py): se carga tal cual, sin revisar docs/ ni indexar
+        self.bundle_path = index_bundle.INDEX_BUNDLE_PATH if bundle_path is None else bundle_path
+        # progress(stage, **detail): avisa el avance de la carga (p. ej. al endpoint /ready)
+        self.progress = progress
+        self.policy = policy or RetrievalPolicy.from_env()
+        logger.info(f"Politica de recuperacion: {self.policy.to_dict()}")
         
         abs_path = os.path.abspath(docs_dir)
         logger.info(f"Buscando documentos en: {abs_path}")
         
-        if not os.path.exists(abs_path):
+        if not os.path.exists(abs_path) and not self.bundle_path:
             logger.error(f"La carpeta {abs_path} no existe!")
             raise FileNotFoundError(f"No se encuentra la carpeta: {abs_path}")
         
-        txt_files = glob.glob(os.path.join(abs_path, "*.txt"))
-        logger.info(f"Archivos TXT encontrados: {[os.path.basename(f) for f in txt_files]}")
+        doc_files = self._list_documents()
+        logger.info(f"Documentos encontrados: {[self._document_name(f) for f in doc_files]}")
         
-        if not txt_files:
-            logger.warning("No se encontraron archivos TXT en docs/")
+        if not doc_files:
+            logger.warning("No se encontraron documentos (TXT/PDF) en docs/")
         
         logger.info("Cargando modelo de embeddings...")
-        self.embedder = SentenceTransformer('all-MiniLM-L6-v2')
-        logger.info("Modelo de embeddings cargado")
+        self._report("cargando modelo de embeddings")
+        self.embedder = embedder or create_embedder()
+        logger.info(f"Modelo de embeddings cargado ({type(self.embedder).__name__}: {self.embedder.model_id})")
         
         db_path = os.path.abspath("./chroma_db")
         os.makedirs(db_path, exist_ok=True)
-        
-        self.client = chromadb.PersistentClient(
-            path=db_path,
-            settings=Settings(
-                anonymized_telemetry=False,
-                allow_reset=True
-            )
-        )
-        
-        # Verificar si los archivos cambiaron
-        needs_reindex = self._check_files_changed()
-        
-        if needs_reindex:
+        self.db_path = db_path
+        self.client = None
+        self.collection_name = None
+        
+        if self.bundle_path:
+            self._report("cargando bundle del indice")
+            self.collection = self._open_collection(reset=False)
+        elif self._needs_reindex(force_reindex):
             logger.info("Archivos modificados detectados, reindexando...")
-            try:
-                self.client.delete_collection("docs_educativos")
-            except:
-                pass
-            
-            self.collection = self.client.create_collection("docs_educativos")
-            self.index_documents()
+            self.collection = self._open_collection(reset=True)
+            failed = self.index_documents()
+            self._persist_collection()
             
-            # Guardar hash de los archivos actuales
-            self._save_files_hash()
+            # Guardar hash de los archivos actuales, sin los que fallaron: se reintentan al reiniciar
+            files_data = self._get_files_hash()
+            for filename in failed:
+                files_data.pop(filename, None)
+            self._save_files_hash(files_data)
         else:
             logger.info("Usando índice existente (archivos sin cambios)")
-            self.collection = self.client.get_collection("docs_educativos")
+            self.collection = self._open_collection(reset=False)
             logger.info(f"Chunks en base de datos: {self.collection.count()}")
 
-        self.query_cache = {}
         self.result_cache = {}
+        # Serializa consultas y actualizaciones incrementales del indice (update_documents)
+        self.index_lock = threading.RLock()
+        # True cuando otra instancia la reemplazo: ya no escribe el indice ni files_hash.json
+        self.retired = False
+        self._generation = self.index_generation()
     
+    def _needs_reindex(self, force_reindex):
+        # Verificar si los archivos cambiaron
+        self._report("verificando cambios en documentos")
+        needs_reindex = force_reindex or self._check_files_changed()
+        if VECTOR_STORE == "compact" and not CompactVectorStore(os.path.join(self.db_path, "compact_index")).exists():
+            logger.info("No existe indice compacto, se necesita indexar")
+            needs_reindex = True
+        return needs_reindex
+
+    def _open_collection(self, reset):
+        """Coleccion de vectores segun VECTOR_STORE; reset=True la vacia para reindexar"""
+        if self.bundle_path:
+            return index_bundle.load_bundle(self.bundle_path, self.embedder.model_id, self.embedder.dimension)
+        if VECTOR_STORE == "compact":
+            store = CompactVectorStore(os.path.join(self.db_path, "compact_index"))
+            if reset:
+                store.reset()
+                return store
+            return store.load()
+
+        # Import diferido: el modo compacto no necesita cargar chromadb
+        import chromadb
+        from chromadb.config import Settings
+
+        if self.client is None:
+            self.client = chromadb.PersistentClient(
+                path=self.db_path,
+                settings=Settings(
+                    anonymized_telemetry=False,
+                    allow_reset=True
+                )
+            )
+        active = self._active_collection_name()
+        if not reset:
+            self.collection_name = active
+            return self.client.get_collection(active)
+
+        # Se indexa en una coleccion nueva: la activa sigue respondiendo (en este proceso
+        # y en los workers) hasta que _persist_collection la reemplace. Solo se borran
+        # las de reindexaciones anteriores que ya nadie usa.
+        self.collection_name = f"{CHROMA_COLLECTION}_{time.time_ns()}"
+        for collection in self.client.list_collections():
+            name = getattr(collection, "name", collection)
+            if name.startswith(CHROMA_COLLECTION) and name != active:
+                try:
+                    self.client.delete_collection(name)
+                except Exception as e:
+                    logger.warning(f"No se pudo borrar la coleccion {name}: {e}")
+        return self.client.create_collection(self.collection_name)
+
+    def _active_collection_name(self):
+        try:
+            with open(os.path.join(self.db_path, "ACTIVE_COLLECTION"), 'r', encoding='utf-8') as f:
+                return f.read().strip() or CHROMA_COLLECTION
+        except FileNotFoundError:
+            # Indices anteriores: una sola coleccion con el nombre fijo
+            return CHROMA_COLLECTION
+
+    def _persist_collection(self):
+        if isinstance(self.collection, CompactVectorStore):
+            self.collection.persist()
+            logger.info(f"Indice compacto guardado: {self.collection.nbytes() / 1024:.0f} KB")
+        else:
+            # Publicar la coleccion (Chroma ya guarda cada add): desde aqui es la activa
+            tmp_path = os.path.join(self.db_path, "ACTIVE_COLLECTION.tmp")
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(self.collection_name + "\n")
+            os.replace(tmp_path, os.path.join(self.db_path, "ACTIVE_COLLECTION"))
+
+    def _report(self, stage, **detail):
+        if self.progress:
+            try:
+                self.progress(stage, **detail)
+            except Exception as e:
+                logger.warning(f"Error reportando progreso: {e}")
+
     @lru_cache(maxsize=100)
     def _get_embedding_cached(self, text):
         """Embeddings con caché para queries repetidas"""
         return tuple(self.embedder.encode(text).tolist())
     
-    def search_forced1(self, query, n_results=2):
-        logger.info(f"Buscando: '{query}'")
-        
-        if self.collection.count() == 0:
-            return "", [], 999
-        
-        # Usar cachÃ© de embeddings
-        query_lower = query.lower().strip()
-        if query_lower in self.query_cache:
-            logger.info("Usando embedding cacheado")
-            query_embedding = self.query_cache[query_lower]
-        else:
-            query_embedding = list(self._get_embedding_cached(query))
-            self.query_cache[query_lower] = query_embedding
-
-        with ThreadPoolExecutor(max_workers=2) as executor:
-            future = executor.submit(
-                self.collection.query,
-                query_embeddings=[query_embedding],
-                n_results=3
-            )
-            results = future.result(timeout=2)
+    def _list_documents(self):
+        """Rutas de los documentos indexables (TXT y PDF), incluidas subcarpetas por materia"""
+        return ingestion.list_documents(os.path.abspath(self.docs_dir))
+
+    def _document_name(self, filepath):
+        return ingestion.document_name(filepath, os.path.abspath(self.docs_dir))
 
     def _get_files_hash(self):
-        """Calcular hash de todos los archivos .txt"""
-        abs_docs_dir = os.path.abspath(self.docs_dir)
+        """Calcular hash de todos los documentos indexables"""
         files_data = {}
         
-        for filepath in glob.glob(os.path.join(abs_docs_dir, "*.txt")):
-            filename = os.path.basename(filepath)
-            
-            # Hash del contenido + fecha de modificaciÃ³n
-            with open(filepath, 'rb') as f:
-                content_hash = hashlib.md5(f.read()).hexdigest()
-            
-            mod_time = os.path.getmtime(filepath)
+        for filepath in self._list_documents():
+            filename = self._document_name(filepath)
             
-            files_data[filename] = {
-                'hash': content_hash,
-                'modified': mod_time,
-                'size': os.path.getsize(filepath)
-            }
+            files_data[filename] = self._file_hash_entry(filepath)
         
         return files_data
 
-    def _save_files_hash(self):
-        """Guardar hash de archivos para comparación futura"""
-        files_data = self._get_files_hash()
+    @staticmethod
+    def _file_hash_entry(filepath):
+        # Hash del contenido (leido por bloques) + fecha de modificación
+        return {
+            'hash': file_md5(filepath),
+            'modified': os.path.getmtime(filepath),
+            'size': os.path.getsize(filepath)
+        }
+
+    def _save_files_hash(self, files_data=None):
+        """Guardar hash de archivos para comparación futura (por defecto, todos los actuales)"""
+        files_data = self._get_files_hash() if files_data is None else files_data
+        files_data['__meta__'] = {
+            'chunker_version': chunker.CHUNKER_VERSION,
+            'embedding_model': self.embedder.model_id,
+            'vector_store': VECTOR_STORE
+        }
         hash_file = os.path.join(os.path.abspath("./chroma_db"), "files_hash.json")
         
-        with open(hash_file, 'w', encoding='utf-8') as f:
+        # Reemplazo atomico: los workers (pre-fork) lo leen para saber si hay indice nuevo
+        tmp_file = hash_file + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
             json.dump(files_data, f, indent=2)
+        os.replace(tmp_file, hash_file)
         
         logger.info("âœ… Hash de archivos guardado")
 
+    def _update_files_hash(self, updated, removed_names):
+        """Registrar solo los documentos procesados en una actualizacion parcial.
+
+        Volver a calcular el hash de todo docs/ marcaria como indexadas ediciones
+        que nunca se aplicaron (p. ej. las de un profesor durante un rastreo).
+        """
+        try:
+            with open(os.path.join(self.db_path, "files_hash.json"), 'r', encoding='utf-8') as f:
+                files_data = json.load(f)
+        except (OSError, ValueError):
+            # Sin registro previo solo se conoce lo procesado; al reiniciar se reindexa todo
+            files_data = {}
+        files_data.update(updated)
+        for filename in removed_names:
+            files_data.pop(filename, None)
+        self._save_files_hash(files_data)
+
+    def indexed_files(self):
+        """{documento: MD5} segun la ultima indexacion o actualizacion (files_hash.json)"""
+        try:
+            with open(os.path.join(self.db_path, "files_hash.json"), 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return {name: info['hash'] for name, info in data.items() if name != '__meta__'}
+
     def _check_files_changed(self):
         """Verificar si los archivos cambiaron desde la última indexación"""
         hash_file = os.path.join(os.path.abspath("./chroma_db"), "files_hash.json")
@@ -144,6 +403,22 @@ class RAGSystem:
             logger.warning("Error leyendo hash anterior")
             return True
         
+        # Si cambio el chunker, los chunks guardados ya no corresponden
+        old_meta = old_hash.pop('__meta__', {})
+        if old_meta.get('chunker_version') != chunker.CHUNKER_VERSION:
+            logger.info(f"Version del chunker cambio ({old_meta.get('chunker_version')} -> {chunker.CHUNKER_VERSION})")
+            return True
+
+        # Cada backend guarda su propio indice
+        if old_meta.get('vector_store', 'chroma') != VECTOR_STORE:
+            logger.info(f"Backend de vectores cambio ({old_meta.get('vector_store', 'chroma')} -> {VECTOR_STORE})")
+            return True
+
+        # Vectores de otro modelo no son comparables con las consultas
+        if old_meta.get('embedding_model', EMBEDDING_MODEL) != self.embedder.model_id:
+            logger.info(f"Modelo de embeddings cambio ({old_meta.get('embedding_model')} -> {self.embedder.model_id})")
+            return True
+
         # Comparar con hash actual
         current_hash = self._get_files_hash()
         
@@ -175,7 +450,7 @@ class RAGSystem:
     def _check_reindex_needed(self):
         """Verificar si necesita reindexar comparando fechas de modificación"""
         try:
-            collection = self.client.get_collection("docs_educativos")
+            collection = self.client.get_collection(self._active_collection_name())
             stored_count = collection.count()
             
             # Si no hay datos, reindexar
@@ -184,12 +459,11 @@ class RAGSystem:
                 return True
             
             # Contar archivos actuales
-            abs_docs_dir = os.path.abspath(self.docs_dir)
-            current_files = glob.glob(os.path.join(abs_docs_dir, "*.txt"))
+            current_files = self._list_documents()
             
             # Si cambiÃ³ el nÃºmero de archivos, reindexar
             if len(current_files) == 0:
-                logger.warning("No hay archivos TXT")
+                logger.warning("No hay documentos TXT/PDF")
                 return False
             
             logger.info(f"indice existente con {stored_count} chunks")
@@ -200,65 +474,48 @@ class RAGSystem:
             return True
     
     def index_documents(self):
-        """Indexar documentos TXT con chunks optimizados"""
+        """Indexar documentos TXT/PDF con chunks optimizados; devuelve los nombres que fallaron"""
         doc_count = 0
         chunk_count = 0
+        failed = set()
         
-        abs_docs_dir = os.path.abspath(self.docs_dir)
-        pattern = os.path.join(abs_docs_dir, "*.txt")
+        doc_files = self._list_documents()
+        logger.info(f"Documentos a indexar en {os.path.abspath(self.docs_dir)}: {len(doc_files)}")
         
-        logger.info(f"Buscando archivos con patron: {pattern}")
-        
-        for filepath in glob.glob(pattern):
+        # Lectura/extraccion + limpieza + chunking en procesos; aqui solo embeddings e insercion
+        for doc in ingestion.iter_prepared_documents(doc_files, root=os.path.abspath(self.docs_dir)):
             doc_count += 1
-            filename = os.path.basename(filepath)
-            logger.info(f"Indexando: {filename}")
+            filename = doc['filename']
+            self._report("indexando", documents_done=doc_count - 1, documents_total=len(doc_files),
+                         chunks_done=chunk_count, current=filename)
+            logger.info(f"Indexando: {filename} ({doc.get('size', 0)} bytes)")
+
+            if doc['error']:
+                logger.error(f"Error indexando {filename}: {doc['error']}")
+                failed.add(filename)
+                continue
             
             try:
-                with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-                    content = f.read()
-                
-                # Limpiar contenido
-                content = self._clean_text(content)
-
-                logger.info(f"   - Tamaño: {len(content)} caracteres")
-                logger.info(f"   - Preview: {content[:100]}...")
-                
-                # CHUNKS MÁS GRANDES para mejor contexto
-                chunk_size = 600  # Aumentado de 400
-                overlap = 150     # Aumentado de 100
-                
-                chunks = self._create_smart_chunks(content, chunk_size, overlap)
-                
-                logger.info(f"   - Dividido en {len(chunks)} chunks")
-                
-                # Indexar cada chunk
                 materia = self.detect_subject(filename)
-                
-                for i, chunk in enumerate(chunks):
-                    chunk_count += 1
-                    
-                    # Generar embedding
-                    embedding = self.embedder.encode(chunk).tolist()
-                    
-                    # AÃ±adir a ChromaDB
-                    self.collection.add(
-                        embeddings=[embedding],
-                        documents=[chunk],
-                        metadatas=[{
-                            "source": filename,
-                            "chunk_id": i,
-                            "subject": materia,
-                            "chunk_size": len(chunk),
-                            "total_chunks": len(chunks)
-                        }],
-                        ids=[f"{filename}_{i}"]
-                    )
+                file_chunks = 0
+
+                # 'chunks' puede ser un generador (archivos grandes): se consume por lotes
+                for batch in ingestion.batched(doc['chunks'], EMBED_BATCH_SIZE):
+                    # Embeddings en lote: mucho mas rapido que un encode por chunk
+                    embeddings = self.embedder.encode(batch, batch_size=EMBED_BATCH_SIZE).tolist()
+                    self._add_batch(filename, materia, batch, embeddings, file_chunks)
+                    file_chunks += len(batch)
+
+                chunk_count += file_chunks
+                logger.info(f"   - Dividido en {file_chunks} chunks")
                     
             except Exception as e:
                 logger.error(f"Error indexando {filename}: {e}")
+                failed.add(filename)
 
         logger.info(f"✔️ Indexación completa: {doc_count} documentos, {chunk_count} chunks")
+        if failed:
+            logger.warning(f"{len(failed)} documentos con error (no se registran como indexados): {sorted(failed)}")
 
         # Verificar indexación
         total = self.collection.count()
@@ -266,65 +523,146 @@ class RAGSystem:
         
         if total == 0:
             logger.error("✔️ No se indexó ningun chunk!")
+        return failed
     
+    def _add_batch(self, filename, materia, batch, embeddings, first):
+        self.collection.add(
+            embeddings=embeddings,
+            documents=batch,
+            metadatas=[{
+                "source": filename,
+                "chunk_id": first + i,
+                "subject": materia
+            } for i in range(len(batch))],
+            ids=[f"{filename}_{first + i}" for i in range(len(batch))]
+        )
+
+    # ============ ACTUALIZACION INCREMENTAL ============
+    def update_documents(self, paths):
+        """Reindexar solo estos archivos (nuevos o modificados) sin reconstruir todo el indice.
+
+        Los embeddings se calculan fuera del candado; el reemplazo de los chunks
+        de cada documento (borrar + agregar) se hace bajo index_lock para que las
+        busquedas nunca vean un documento a medias. Devuelve (chunks agregados,
+        nombres de los documentos procesados); los que fallaron quedan fuera.
+        """
+        with self.write_lock:
+            if self.retired:
+                logger.warning(f"Indice reemplazado: {len(paths)} documentos quedan para el indice nuevo")
+                return 0, set()
+            return self._update_documents(paths)
+
+    def _update_documents(self, paths):
+        if self.bundle_path:
+            logger.warning(f"Indice de bundle (solo lectura): {len(paths)} documentos "
+                           f"quedan para el proximo build_index.py")
+            return 0, set()
+        root = os.path.abspath(self.docs_dir)
+        added = 0
+        # Hash tomado antes de leer: si el archivo cambia durante la actualizacion,
+        # el registro no coincide y la edicion se vuelve a aplicar despues
+        hashes = {}
+        for path in paths:
+            try:
+                hashes[os.path.abspath(path)] = self._file_hash_entry(path)
+            except FileNotFoundError:
+                pass
+        processed = {}
+        for doc in ingestion.iter_prepared_documents(paths, root=root):
+            filename = doc['filename']
+            if doc['error']:
+                logger.error(f"Error indexando {filename}: {doc['error']}")
+                continue
+
+            materia = self.detect_subject(filename)
+            batches = [
+                (batch, self.embedder.encode(batch, batch_size=EMBED_BATCH_SIZE).tolist())
+                for batch in ingestion.batched(doc['chunks'], EMBED_BATCH_SIZE)
+            ]
+            with self.index_lock:
+                self.collection.delete(where={"source": filename})
+                first = 0
+                for batch, embeddings in batches:
+                    self._add_batch(filename, materia, batch, embeddings, first)
+                    first += len(batch)
+            added += first
+            if os.path.abspath(doc['path']) in hashes:
+                processed[filename] = hashes[os.path.abspath(doc['path'])]
+            logger.info(f"Actualizado: {filename} ({first} chunks)")
+
+        self._commit_update(updated=processed)
+        return added, set(processed)
+
+    def remove_documents(self, filenames):
+        """Quitar del indice los chunks de documentos borrados (nombres relativos a docs/)"""
+        with self.write_lock:
+            if self.retired:
+                logger.warning(f"Indice reemplazado: no se eliminan {len(filenames)} documentos")
+                return
+            self._remove_documents(filenames)
+
+    def _remove_documents(self, filenames):
+        if self.bundle_path:
+            logger.warning(f"Indice de bundle (solo lectura): no se eliminan {len(filenames)} documentos")
+            return
+        with self.index_lock:
+            for filename in filenames:
+                self.collection.delete(where={"source": filename})
+                logger.info(f"Eliminado del indice: {filename}")
+        self._commit_update(removed_names=filenames)
+
+    def _commit_update(self, updated=None, removed_names=()):
+        with self.index_lock:
+            self._persist_collection()
+            self.result_cache.clear()
+        # Solo lo procesado: reiniciar no reindexa todo, pero si lo que quedo pendiente
+        self._update_files_hash(updated or {}, removed_names)
+
+    # ============ PROCESOS LECTORES (pre-fork) ============
+    def index_generation(self):
+        """Marca de la ultima escritura del indice.
+
+        files_hash.json se guarda al final de cada reindexacion o actualizacion,
+        despues de persistir los vectores: si su mtime cambio, hay indice nuevo.
+        Con bundle: el manifiesto de la version activa (cambia al publicar otra).
+        """
+        if self.bundle_path:
+            return index_bundle.generation(self.bundle_path)
+        try:
+            return os.stat(os.path.join(self.db_path, "files_hash.json")).st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def reload_if_changed(self):
+        """Reabrir el indice si otro proceso (el escritor) lo modifico; True si se recargo.
+
+        Si la carga falla (el escritor esta a mitad de una reindexacion) se sigue
+        con el indice anterior y se reintenta en la proxima llamada.
+        """
+        generation = self.index_generation()
+        if generation is None or generation == self._generation:
+            return False
+        try:
+            collection = self._open_collection(reset=False)
+        except Exception as e:
+            logger.warning(f"No se pudo recargar el indice, se reintentara: {e}")
+            return False
+        with self.index_lock:
+            self.collection = collection
+            self.result_cache.clear()
+        # Si hubo otra escritura durante la carga, la proxima llamada vuelve a recargar
+        if self.index_generation() == generation:
+            self._generation = generation
+        logger.info(f"Indice recargado: {collection.count()} chunks")
+        return True
+
     def _clean_text(self, text):
         """Limpiar y normalizar texto para mejores embeddings"""
-        # Eliminar formato de preguntas/respuestas que confunde
-        text = re.sub(r'Pregunta:\s*', '', text)
-        text = re.sub(r'Respuesta:\s*', '', text)
-        text = re.sub(r'Ejemplo:\s*', 'Por ejemplo: ', text)
-        
-        # Eliminar mÃºltiples espacios
-        text = re.sub(r'\s+', ' ', text)
-        
-        # Eliminar saltos de lÃ­nea excesivos
-        text = re.sub(r'\n{3,}', '\n\n', text)
-        
-        return text.strip()
+        return chunker.clean_text(text)
 
     def _create_smart_chunks(self, text, chunk_size, overlap):
         """Crear chunks con contexto de título"""
-        chunks = []
-        
-        # Detectar secciones con títulos (TODO EN MAYÚSCULAS o con #)
-        sections = re.split(r'\n(?=[A-ZÁÉÍÓÚ\s]{3,}|#)', text)
-        
-        for section in sections:
-            section = section.strip()
-            if not section or len(section) < 50:
-                continue
-            
-            # Extraer tÃ­tulo si existe
-            lines = section.split('\n')
-            title = ""
-            content = section
-            
-            if lines[0].isupper() or lines[0].startswith('#'):
-                title = lines[0].replace('#', '').strip()
-                content = '\n'.join(lines[1:]).strip()
-            
-            # Dividir en oraciones
-            sentences = re.split(r'(?<=[.!?])\s+', content)
-            
-            current_chunk = f"{title}\n" if title else ""
-            
-            for sentence in sentences:
-                if len(current_chunk) + len(sentence) < chunk_size:
-                    current_chunk += sentence + " "
-                else:
-                    if current_chunk.strip():
-                        chunks.append(current_chunk.strip())
-                    
-                    # Mantener tÃ­tulo en cada chunk
-                    words = current_chunk.split()
-                    overlap_words = words[-overlap//5:] if len(words) > overlap//5 else []
-                    current_chunk = f"{title}\n" if title else ""
-                    current_chunk += " ".join(overlap_words) + " " + sentence + " "
-            
-            if current_chunk.strip():
-                chunks.append(current_chunk.strip())
-        
-        return chunks
+        return chunker.create_smart_chunks(text, chunk_size, overlap)
         
     def detect_subject(self, filename):
         """Detectar materia basado en el nombre del archivo"""
@@ -345,179 +683,153 @@ class RAGSystem:
         logger.warning(f"✔️ No se detecto materia para: {filename}")
         return 'general'
     
-    def search_forced(self, query, n_results=3):
-        """Búsqueda con penalización a contenido genérico"""
-        logger.info(f"🔍 Buscando: '{query}'")
+    def search_forced(self, query, n_results=3, deadline=None):
+        """Compatibilidad: busqueda con la politica configurada"""
+        return self.search(query, n_results=n_results, deadline=deadline)
+
+    def search(self, query, n_results=None, policy=None, deadline=None):
+        """Busqueda con penalizacion a contenido generico segun la politica de recuperacion.
+
+        Devuelve siempre (context, sources, best_distance).
+        """
+        policy = policy or self.policy
+        chunks, best_distance = self.search_chunks(query, n_results=n_results, policy=policy, deadline=deadline)
+
+        if not chunks:
+            return "", [], best_distance
+
+        context = "\n\n".join(chunk['text'] for chunk in chunks)[:policy.context_chars]
+        sources = []
+        for chunk in chunks:
+            if chunk['source'] not in sources:
+                sources.append(chunk['source'])
+
+        if trace_enabled():
+            logger.info("Contexto final: %s chars de %s", len(context), sources)
+        return context, sources, best_distance
+
+    def search_chunks(self, query, n_results=None, policy=None, deadline=None):
+        """Chunks seleccionados ordenados por relevancia, sin recortar.
+
+        Devuelve (chunks, best_distance); cada chunk es un dict con
+        'text', 'source' y 'distance' (distancia ajustada).
+        Con deadline (deadline.Deadline) la busqueda se salta, y se devuelve
+        ([], 999) como si no hubiera contexto, cuando no queda tiempo para ella
+        y para la generacion (DEADLINE_LLM_MIN_SECONDS).
+        """
+        policy = policy or self.policy
+        # Traza detallada solo en las peticiones muestreadas (LOG_TRACE_SAMPLE_RATE) o con DEBUG
+        trace = trace_enabled()
+        if trace:
+            logger.info("🔍 Buscando: '%s'", query)
         
         if self.collection.count() == 0:
-            return "", [], 999
+            logger.error("La coleccion esta vacia!")
+            return [], 999
 
-        # Detectar si es saludo genérico
-        generic_greetings = ['hola', 'buenos dias', 'buenas tardes', 'como estas', 'hey', 'hi']
-        is_greeting = any(greeting in query.lower() for greeting in generic_greetings)
-        
-        if is_greeting:
-            logger.info("🔍 Detectado saludo genérico - Saltando búsqueda de docs")
-            return "", [], 999
-        
         query_clean = query.strip()
-        if len(query_clean) < 4 or len(query_clean.split()) == 1:
-            logger.info("Consulta muy corta, omitiendo búsqueda RAG")
-            return "", [], 999
+        query_lower = query_clean.lower()
 
-        cache_key = query_clean.lower()
-        if cache_key in self.result_cache:
-            logger.info("✔️ Usando resultado cacheado")
-            return self.result_cache[cache_key]
+        # Detectar si es saludo genérico
+        if policy.is_greeting(query_lower):
+            if trace:
+                logger.info("🔍 Detectado saludo genérico - Saltando búsqueda de docs")
+            return [], 999
+        
+        if policy.is_too_short(query_clean):
+            if trace:
+                logger.info("Consulta muy corta, omitiendo búsqueda RAG")
+            return [], 999
 
-        query_embedding = self.embedder.encode(query_clean).tolist()
-        
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=max(3, n_results),
-            include=['documents', 'metadatas', 'distances']
-        )
-        
-        if not results['documents'][0]:
-            return "", [], 999
-        
-        context_parts = []
-        sources = set()
-        distances = []
-        
-        logger.info(f"Top 5 resultados:")
+        top_k = max(policy.top_k, n_results or 0)
+        cache_key = (query_lower, top_k, policy.cache_key())
+        cached = self.result_cache.get(cache_key)
+        record_cache_lookup("result", cached is not None)
+        if cached is not None:
+            if trace:
+                logger.info("✔️ Usando resultado cacheado")
+            return cached
+
+        if deadline is not None and not deadline.allows(
+                "retrieval", DEADLINE_RETRIEVAL_MIN_SECONDS, reserve=DEADLINE_LLM_MIN_SECONDS):
+            if trace:
+                logger.info("Sin tiempo para buscar, se responde sin documentos")
+            return [], 999
+
+        with CHAT_STAGE_SECONDS.time(stage="embedding"):
+            query_embedding = list(self._get_embedding_cached(query_clean))
+
+        # El candado solo se espera lo que queda del plazo (p. ej. durante una actualizacion)
+        lock_timeout = -1 if deadline is None else deadline.timeout(reserve=DEADLINE_LLM_MIN_SECONDS)
+        if not self.index_lock.acquire(timeout=lock_timeout):
+            deadline.skipped.append("vector_query")
+            return [], 999
+        try:
+            with CHAT_STAGE_SECONDS.time(stage="vector_query"):
+                results = self.collection.query(
+                    query_embeddings=[query_embedding],
+                    n_results=top_k,
+                    include=['documents', 'metadatas', 'distances']
+                )
+        finally:
+            self.index_lock.release()
+        
+        if not results['documents'] or not results['documents'][0]:
+            logger.warning("No se encontraron resultados")
+            return [], 999
         
-        # Analizar y filtrar resultados
+        rerank_start = time.perf_counter()
+        # Analizar y penalizar contenido muy generico
+        scored = []
         for i, (doc, metadata, distance) in enumerate(zip(
-            results['documents'][0][:4],
-            results['metadatas'][0][:4],
-            results['distances'][0][:4]
+            results['documents'][0],
+            results['metadatas'][0],
+            results['distances'][0]
         )):
-            # PENALIZAR CONTENIDO MUY GENERICO
-            generic_words = ['importante', 'necesario', 'vital', 'permite', 'todos', 'seres']
-            generic_count = sum(1 for word in generic_words if word in doc.lower())
-            
-            # Si tiene muchas palabras genericas, penalizar
-            penalty = generic_count * 0.05
-            adjusted_distance = distance + penalty
-            
-            logger.info(f"   {i+1}. Dist: {distance:.3f} (ajustada: {adjusted_distance:.3f}) | {metadata['source']:<20} | {doc[:60]}...")
-            
-            distances.append(adjusted_distance)
+            adjusted_distance = distance + policy.penalty(doc.lower())
+            if trace:
+                logger.info(
+                    "   %d. Dist: %.3f (ajustada: %.3f) | %-20s | %s...",
+                    i + 1, distance, adjusted_distance, metadata['source'], doc[:60],
+                )
+            scored.append({'text': doc, 'source': metadata['source'], 'distance': adjusted_distance})
         
         # Usar distancias ajustadas para seleccion
-        best_items = sorted(
-            zip(results['documents'][0], results['metadatas'][0], distances),
-            key=lambda x: x[2]
-        )
-        
-        for doc, metadata, distance in best_items[:4]:
-            # UMBRAL MAS ESTRICTO
-            threshold = 0.95
-            
-            if distance < threshold:
-                context_parts.append(doc)
-                sources.add(metadata['source'])
-                logger.info(f"SELECCIONADO (dist ajustada: {distance:.3f}) - {metadata['source']}")
-            
-            if len(context_parts) >= 2:
-                break
-        
-        best_distance = min(distances) if distances else 999
-        
-        # UMBRAL ESTRICTO - No usar docs si distancia > 0.9
-        if best_distance > 0.9:
-            logger.warning(f"Mejor distancia muy alta ({best_distance:.3f}), usando modelo")
-            return "", [], best_distance
-        
-        if not context_parts:
-            logger.info("Sin contexto suficientemente relevante")
-            return "", [], 999
-        
-        context = "\n\n".join(context_parts)[:600]
-        sources_list = list(sources)
-        
-        logger.info(f"Contexto final: {len(context)} chars de {sources_list}")
-        
-        final_result = (context, sources_list, best_distance)
-        self.result_cache[cache_key] = final_result
-        return final_result
+        scored.sort(key=lambda x: x['distance'])
+        best_distance = scored[0]['distance']
 
-    def search(self, query, n_results=3):
-        """Buscar chunks relevantes con filtrado inteligente"""
-        logger.info(f"Buscando: '{query}'")
-        
-        if self.collection.count() == 0:
-            logger.error("La coleccion esta¡ vaci­a!")
-            return "", [], 999
-        
-        # Generar embedding de la consulta
-        query_embedding = self.embedder.encode(query).tolist()
-        
-        # Buscar en ChromaDB con mÃ¡s resultados
-        results = self.collection.query(
-            query_embeddings=[query_embedding],
-            n_results=5,  # Buscar 5 para filtrar
-            include=['documents', 'metadatas', 'distances']
-        )
-        
-        if not results['documents'][0]:
-            logger.warning("No se encontraron resultados")
-            return "", [], 999
-        
-        context_parts = []
-        sources = set()
-        distances = []
-        
-        logger.info("Resultados de busqueda RAG:")
-        
-        for doc, metadata, distance in zip(
-            results['documents'][0], 
-            results['metadatas'][0],
-            results['distances'][0]
-        ):
-            distances.append(distance)
+        if best_distance > policy.max_best_distance:
+            CHAT_STAGE_SECONDS.observe(time.perf_counter() - rerank_start, stage="rerank")
+            if trace:
+                logger.info("Mejor distancia muy alta (%.3f), usando modelo", best_distance)
+            return [], best_distance
 
-            if distance < best_distance:
-                best_distance = distance
-            
-            # UMBRAL MAS PERMISIVO: 1.5 en lugar de 1.0
-            threshold = 1.5  # AUMENTADO para ser mÃ¡s permisivo
+        selected = []
+        for chunk in scored:
+            if chunk['distance'] < policy.select_threshold:
+                selected.append(chunk)
+                if trace:
+                    logger.info("SELECCIONADO (dist ajustada: %.3f) - %s", chunk['distance'], chunk['source'])
             
-            if distance < threshold:
-                context_parts.append(doc)
-                sources.add(metadata['source'])
-                logger.info(f"ACEPTADO (dist: {distance:.3f}) - {metadata['source']}")
-            else:
-                logger.info(f"Rechazado (dist: {distance:.3f}) - {metadata['source']}")
-            
-            if len(context_parts) >= 3:
+            if len(selected) >= policy.max_context_chunks:
                 break
-        
-        logger.info(f" Mejor distancia encontrada: {best_distance:.3f}")
-        
-        # Si la mejor distancia es razonable pero no paso el filtro, usar el mejor
-        if not context_parts and best_distance < 2.0:
-            logger.warning(f"Usando mejor resultado disponible (dist: {best_distance:.3f})")
-            context_parts.append(results['documents'][0][0])
-            sources.add(results['metadatas'][0][0]['source'])
-        
-        if not context_parts:
-            logger.warning("Sin resultados suficientemente relevantes")
-            return "", []
-        
-        context = "\n\n".join(context_parts)[:2500]
-        sources_list = list(sources)
-        
-        logger.info(f"Contexto final: {len(context)} chars de {len(context_parts)} chunks")
-        logger.info(f"Fuentes utilizadas: {sources_list}")
-        context, sources, distance = self.search(query, n_results)
-        return context, sources, distance
-    
-      
-    
 
-    
+        # Si nada paso el umbral pero el mejor es aceptable, usarlo
+        if not selected and policy.fallback_distance is not None and best_distance < policy.fallback_distance:
+            if trace:
+                logger.info("Usando mejor resultado disponible (dist: %.3f)", best_distance)
+            selected.append(scored[0])
+        
+        CHAT_STAGE_SECONDS.observe(time.perf_counter() - rerank_start, stage="rerank")
+        if not selected:
+            if trace:
+                logger.info("Sin contexto suficientemente relevante")
+            return [], 999
+        
+        final_result = (selected, best_distance)
+        self.result_cache[cache_key] = final_result
+        return final_result
+
     def get_stats(self):
         """Obtener estadi­sticas del sistema RAG"""
         try:
@@ -539,3 +851,62 @@ class RAGSystem:
         except Exception as e:
             logger.error(f"Error obteniendo estadísticas: {e}")
             return {'status': 'error', 'error': str(e)}
+
+    def _collection_disk_bytes(self):
+        """Bytes en disco de los segmentos (carpetas HNSW) de la coleccion de Chroma activa.
+
+        No incluye chroma.sqlite3, compartido con las demas colecciones (textos y
+        metadatos); las colecciones de reindexaciones anteriores tampoco cuentan.
+        """
+        import sqlite3
+
+        try:
+            db = sqlite3.connect(f"file:{os.path.join(self.db_path, 'chroma.sqlite3')}?mode=ro", uri=True)
+            try:
+                segment_ids = [row[0] for row in db.execute(
+                    "SELECT id FROM segments WHERE collection = ?", (str(self.collection.id),))]
+            finally:
+                db.close()
+        except sqlite3.Error as e:
+            logger.warning(f"No se pudieron leer los segmentos de {self.collection_name}: {e}")
+            return None
+        return sum(os.path.getsize(os.path.join(root, name))
+                   for segment_id in segment_ids
+                   for root, _, files in os.walk(os.path.join(self.db_path, segment_id)) for name in files)
+
+    def memory_usage(self):
+        """Bytes estimados por componente del RAG: indice, caches de busqueda y embedder"""
+        with self.index_lock:
+            if isinstance(self.collection, CompactVectorStore):
+                vectors = self.collection._vectors
+                index = {
+                    "bytes": self.collection.nbytes(),
+                    "chunks": self.collection.count(),
+                    # Vectores mapeados desde disco: paginas compartidas entre workers y desalojables
+                    "mmap": vectors is not None and vectors.base is not None,
+                }
+            else:
+                # Chroma no expone su memoria: se informa lo que ocupa en disco la coleccion
+                # activa, aparte de "bytes" para que no se sume como parte del RSS
+                index = {"bytes": None, "disk_bytes": self._collection_disk_bytes(),
+                         "chunks": self.collection.count()}
+
+        result_cache = dict(self.result_cache)
+        embedding_info = self._get_embedding_cached.cache_info()
+        dimension = self.embedder.dimension or 0
+        # Cada entrada es una tupla de floats de Python (24 bytes cada uno + 8 del puntero)
+        embedding_bytes = embedding_info.currsize * (sys.getsizeof(()) + dimension * 32)
+        return {
+            "index": index,
+            "result_cache": {"bytes": deep_sizeof(result_cache), "items": len(result_cache)},
+            "embedding_cache": {
+                "bytes": embedding_bytes,
+                "items": embedding_info.currsize,
+                "max_items": embedding_info.maxsize,
+            },
+            "embedder": {
+                "bytes": getattr(self.embedder, "memory_bytes", lambda: None)(),
+                "backend": type(self.embedder).__name__,
+                "model": self.embedder.model_id,
+            },
+        }
@@ -0,0 +1,125 @@
+# app/retrieval_policy.py
+import json
+import logging
+import os
+import re
+
+logger = logging.getLogger(__name__)
+
+# Valores por defecto: reproducen el comportamiento historico de search_forced
+DEFAULT_POLICY = {
+    "top_k": 3,                  # chunks pedidos a ChromaDB
+    "max_context_chunks": 2,     # chunks que pasan al prompt
+    "select_threshold": 0.95,    # distancia ajustada maxima para usar un chunk
+    "max_best_distance": 0.9,    # si el mejor chunk supera esto, se usa solo el modelo
+    "fallback_distance": None,   # si nada pasa el umbral, usar el mejor bajo esta distancia
+    "context_chars": 600,        # presupuesto de contexto en caracteres
+    "generic_penalty": 0.05,     # penalizacion por palabra generica encontrada
+    "generic_words": ["importante", "necesario", "vital", "permite", "todos", "seres"],
+    "skip_greetings": True,
+    "greetings": ["hola", "buenos dias", "buenas tardes", "como estas", "hey", "hi"],
+    "min_query_chars": 4,
+    "min_query_words": 2,
+}
+
+# Variables de entorno que sobreescriben valores sueltos
+ENV_OVERRIDES = {
+    "RAG_TOP_K": ("top_k", int),
+    "RAG_MAX_CONTEXT_CHUNKS": ("max_context_chunks", int),
+    "RAG_SELECT_THRESHOLD": ("select_threshold", float),
+    "RAG_MAX_BEST_DISTANCE": ("max_best_distance", float),
+    "RAG_FALLBACK_DISTANCE": ("fallback_distance", float),
+    "RAG_CONTEXT_CHARS": ("context_chars", int),
+    "RAG_GENERIC_PENALTY": ("generic_penalty", float),
+}
+
+
+class RetrievalPolicy:
+    """Parametros de recuperacion RAG (top-k, umbrales, presupuesto, penalizaciones)"""
+
+    def __init__(self, **overrides):
+        unknown = set(overrides) - set(DEFAULT_POLICY)
+        if unknown:
+            raise ValueError(f"Parametros de politica desconocidos: {sorted(unknown)}")
+
+        values = dict(DEFAULT_POLICY)
+        values.update(overrides)
+
+        self.top_k = max(1, int(values["top_k"]))
+        self.max_context_chunks = max(1, int(values["max_context_chunks"]))
+        self.select_threshold = float(values["select_threshold"])
+        self.max_best_distance = float(values["max_best_distance"])
+        fallback = values["fallback_distance"]
+        self.fallback_distance = float(fallback) if fallback is not None else None
+        self.context_chars = max(0, int(values["context_chars"]))
+        self.generic_penalty = float(values["generic_penalty"])
+        self.generic_words = [w.lower() for w in values["generic_words"]]
+        self.skip_greetings = bool(values["skip_greetings"])
+        self.greetings = [g.lower() for g in values["greetings"]]
+        # Coincidir saludos como palabras completas ("hi" no debe atrapar "historia")
+        self._greeting_re = re.compile(
+            r"\b(?:" + "|".join(re.escape(g) for g in self.greetings) + r")\b"
+        ) if self.greetings else None
+        self.min_query_chars = int(values["min_query_chars"])
+        self.min_query_words = int(values["min_query_words"])
+
+    @classmethod
+    def from_file(cls, path):
+        """Cargar politica desde un archivo JSON"""
+        with open(path, "r", encoding="utf-8") as f:
+            return cls(**json.load(f))
+
+    @classmethod
+    def from_env(cls):
+        """Cargar politica desde RAG_POLICY_FILE y variables RAG_* sueltas"""
+        values = {}
+
+        policy_file = os.getenv("RAG_POLICY_FILE")
+        if policy_file:
+            if os.path.exists(policy_file):
+                with open(policy_file, "r", encoding="utf-8") as f:
+                    values.update(json.load(f))
+                logger.info(f"Politica RAG cargada desde {policy_file}")
+            else:
+                logger.warning(f"RAG_POLICY_FILE no existe: {policy_file}, usando valores por defecto")
+
+        for env_name, (key, cast) in ENV_OVERRIDES.items():
+            raw = os.getenv(env_name)
+            if raw is None or raw == "":
+                continue
+            try:
+                values[key] = cast(raw)
+            except ValueError:
+                logger.warning(f"Valor invalido en {env_name}: {raw!r}")
+
+        return cls(**values)
+
+    def replace(self, **overrides):
+        """Copia de la politica con algunos valores cambiados"""
+        values = self.to_dict()
+        values.update(overrides)
+        return RetrievalPolicy(**values)
+
+    def to_dict(self):
+        return {key: getattr(self, key) for key in DEFAULT_POLICY}
+
+    def cache_key(self):
+        """Clave estable para separar resultados cacheados por politica"""
+        return json.dumps(self.to_dict(), sort_keys=True)
+
+    def is_greeting(self, query_lower):
+        if not self.skip_greetings or self._greeting_re is None:
+            return False
+        return self._greeting_re.search(query_lower) is not None
+
+    def is_too_short(self, query_clean):
+        return (len(query_clean) < self.min_query_chars
+                or len(query_clean.split()) < self.min_query_words)
+
+    def penalty(self, doc_lower):
+        """Penalizacion por contenido generico"""
+        generic_count = sum(1 for word in self.generic_words if word in doc_lower)
+        return generic_count * self.generic_penalty
+
+    def __repr__(self):
+        return f"RetrievalPolicy({self.to_dict()!r})"
@@ -5,11 +5,12 @@ use ArdaGnsrn\Ollama\Ollama;
 class OllamaIAService
 {
     protected $client;
+    protected $lastMetrics = null;
 
-    public function __construct()
+    public function __construct(?string $ollamaUrl = null)
     {
         try {
-            $ollamaUrl = $_ENV['OLLAMA_URL'] ?? 'http://localhost:11434';
+            $ollamaUrl = $ollamaUrl ?? ($_ENV['OLLAMA_URL'] ?? 'http://localhost:11434');
             $this->client = Ollama::client($ollamaUrl);
             error_log('Ollama client creado exitosamente');
         } catch (\Exception $e) {
@@ -22,26 +23,23 @@ class OllamaIAService
         string $prompt,
         string $model = 'phi3:mini',
         float $temperature = 0.3,
-        int $maxTokens = 160
+        int $maxTokens = 160,
+        ?int $numCtx = null,
+        ?string $keepAlive = null
     ): string {
         try {
             $startTime = microtime(true);
             $promptLength = strlen($prompt);
-            $effectiveTokens = max(60, min($maxTokens, 160));
-
-            if ($promptLength < 120) {
-                $effectiveTokens = min($effectiveTokens, 80);
-            }
-
-            $adjustedTemperature = min($temperature, 0.45);
+            // num_predict y temperatura los decide Flask (generation_policy.py) según
+            // estrategia y carga; aquí solo se aplican.
+            $effectiveTokens = max(1, $maxTokens);
+            $adjustedTemperature = $temperature;
 
             error_log(
                 "OllamaService: Modelo $model, tokens=$effectiveTokens, " .
-                "temp=$adjustedTemperature, len=$promptLength"
+                "temp=$adjustedTemperature, len=$promptLength, num_ctx=" . ($numCtx ?? 'default')
             );
 
-            $truncatedPrompt = substr($prompt, 0, 1600);
-
             $options = [
                 'temperature' => $adjustedTemperature,
                 'num_predict' => $effectiveTokens,
@@ -51,12 +49,34 @@ class OllamaIAService
                 'stop' => ["\n\n", 'Pregunta:', 'Usuario:', 'PREGUNTA:'],
             ];
 
-            $result = $this->client->completions()->create([
+            // Flask ya ajusta el prompt a la ventana de contexto; no se recorta aquí
+            // para no cortar la pregunta al final del prompt.
+            if ($numCtx !== null && $numCtx > 0) {
+                $options['num_ctx'] = $numCtx;
+            }
+
+            $params = [
                 'model' => $model,
-                'prompt' => $truncatedPrompt,
+                'prompt' => $prompt,
                 'stream' => false,
                 'options' => $options,
-            ]);
+            ];
+            // Mantener el modelo cargado: Ollama reutiliza la cache KV del prefijo comun del prompt
+            if ($keepAlive !== null && $keepAlive !== '') {
+                $params['keep_alive'] = $keepAlive;
+            }
+
+            $this->lastMetrics = null;
+            $result = $this->client->completions()->create($params);
+
+            $this->lastMetrics = [
+                'prompt_eval_count' => $result->promptEvalCount,
+                'prompt_eval_duration' => $result->promptEvalDuration,
+                'eval_count' => $result->evalCount,
+                'eval_duration' => $result->evalDuration,
+                'load_duration' => $result->loadDuration,
+                'total_duration' => $result->totalDuration,
+            ];
 
             $response = $result->response ?? 'Sin respuesta';
             $response = trim($response);
@@ -85,7 +105,11 @@ class OllamaIAService
             $charCount = strlen($response);
             $sentenceCount = count($sentences);
 
+            $promptEvalCount = $result->promptEvalCount ?? '?';
+            $promptEvalMs = $result->promptEvalDuration !== null ? round($result->promptEvalDuration / 1e6) : '?';
+
             error_log("⚡ Tiempo: {$elapsed}ms | Chars: {$charCount} | Oraciones: {$sentenceCount}");
+            error_log("🧮 Prompt-eval: {$promptEvalCount} tokens en {$promptEvalMs}ms");
 
             return $response;
         } catch (\Exception $e) {
@@ -94,6 +118,14 @@ class OllamaIAService
         }
     }
 
+    /**
+     * Métricas de Ollama de la última llamada (prompt_eval_count, duraciones en ns)
+     */
+    public function getLastMetrics(): ?array
+    {
+        return $this->lastMetrics;
+    }
+
     public function getResponseWithParams($prompt, $model, $temp, $tokens): string
     {
         return $this->getResponseWithModel($prompt, $model, $temp, $tokens);
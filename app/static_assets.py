@@ -0,0 +1,146 @@
+# app/static_assets.py
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import threading
+
+from flask import Response, render_template, request, send_from_directory, url_for
+from markupsafe import Markup
+
+logger = logging.getLogger(__name__)
+
+# Cache de archivos sin hash en el nombre (las URLs de static/dist/ son immutable, un año)
+STATIC_MAX_AGE = int(os.getenv("STATIC_MAX_AGE", "3600"))
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+DIST_DIR = "dist"
+MANIFEST = "manifest.json"
+# Orden de preferencia en image-set(): el navegador toma el primero que soporta
+IMAGE_FORMATS = (("avif", "image/avif"), ("webp", "image/webp"), ("png", "image/png"))
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+
+
+def _pick_encoding(available):
+    """Primera codificacion de available que acepta el cliente (Accept-Encoding)"""
+    for encoding in available:
+        if request.accept_encodings.quality(encoding) > 0:
+            return encoding
+    return None
+
+
+class StaticAssets:
+    """Archivos estaticos generados por build_assets.py y pagina principal precomprimida.
+
+    - url()/background(): URLs con hash segun static/dist/manifest.json; sin
+      manifest (build_assets.py no se ejecuto) se usan los originales.
+    - serve(): reemplaza el handler de /static de Flask; sirve .br/.gz segun
+      Accept-Encoding y marca immutable lo que esta en dist/.
+    - page(): index.html se renderiza y comprime una sola vez por proceso; las
+      visitas siguientes reciben los bytes ya comprimidos o un 304 por ETag.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.static_folder = app.static_folder
+        self.manifest = self._load_manifest()
+        # Archivo con hash -> codificaciones precomprimidas disponibles (br, gzip)
+        self.encodings = {entry["file"]: entry.get("encodings", [])
+                          for entry in self.manifest.values() if "file" in entry}
+        # Con recarga de plantillas (desarrollo) la pagina se renderiza en cada visita
+        self.cache_pages = not (app.debug or app.config.get("TEMPLATES_AUTO_RELOAD"))
+        self._pages = {}
+        self._lock = threading.Lock()
+
+        app.view_functions["static"] = self.serve
+        app.jinja_env.globals.update(asset_url=self.url, asset_background=self.background)
+
+    def _load_manifest(self):
+        path = os.path.join(self.static_folder, DIST_DIR, MANIFEST)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+        except FileNotFoundError:
+            logger.info("Sin static/dist/manifest.json: archivos estaticos originales (ver build_assets.py)")
+            return {}
+        logger.info(f"Archivos estaticos optimizados: {len(manifest)} en static/{DIST_DIR}")
+        return manifest
+
+    # ============ URLS ============
+    def url(self, name, fmt=None):
+        entry = self.manifest.get(name, {})
+        path = entry.get(fmt) if fmt else entry.get("file") or entry.get("png")
+        return url_for("static", filename=path or name)
+
+    def background(self, name):
+        """Declaraciones CSS background-image: PNG para cualquier navegador y, para
+        los que soportan image-set() con type(), AVIF/WebP"""
+        css = f"background-image: url('{self.url(name)}');"
+        entry = self.manifest.get(name)
+        if entry:
+            options = ", ".join(f"url('{self.url(name, fmt)}') type('{mime}')"
+                                for fmt, mime in IMAGE_FORMATS if fmt in entry)
+            css += f"\n            background-image: image-set({options});"
+        return Markup(css)
+
+    # ============ /static ============
+    def serve(self, filename):
+        immutable = filename.startswith(DIST_DIR + "/")
+        max_age = IMMUTABLE_MAX_AGE if immutable else STATIC_MAX_AGE
+        available = self.encodings.get(filename, [])
+        encoding = _pick_encoding(available)
+
+        if encoding:
+            response = send_from_directory(
+                self.static_folder, filename + ENCODING_SUFFIXES[encoding],
+                mimetype=mimetypes.guess_type(filename)[0], max_age=max_age,
+            )
+            response.headers["Content-Encoding"] = encoding
+        else:
+            response = send_from_directory(self.static_folder, filename, max_age=max_age)
+        if available:
+            response.vary.add("Accept-Encoding")
+        if immutable:
+            response.cache_control.public = True
+            response.cache_control.immutable = True
+        return response
+
+    # ============ PAGINA PRINCIPAL ============
+    def page(self, template_name):
+        cached = self._pages.get(template_name)
+        if cached is None:
+            cached = self._compress(render_template(template_name).encode("utf-8"))
+            if not self.cache_pages:
+                return self._respond(cached)
+            with self._lock:
+                self._pages[template_name] = cached
+        return self._respond(cached)
+
+    @staticmethod
+    def _compress(body):
+        variants = {"identity": body, "gzip": gzip.compress(body, 9, mtime=0)}
+        try:
+            import brotli
+            variants["br"] = brotli.compress(body, quality=11)
+        except ImportError:
+            pass
+        return {"etag": hashlib.sha256(body).hexdigest()[:16], "variants": variants}
+
+    def _respond(self, cached):
+        variants = cached["variants"]
+        encoding = _pick_encoding([e for e in ("br", "gzip") if e in variants]) or "identity"
+        # ETag distinto por codificacion: son representaciones distintas del mismo HTML
+        etag = cached["etag"] if encoding == "identity" else f"{cached['etag']}-{encoding}"
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(variants[encoding], mimetype="text/html")
+            if encoding != "identity":
+                response.headers["Content-Encoding"] = encoding
+        response.set_etag(etag)
+        response.vary.add("Accept-Encoding")
+        # Siempre revalidar: el HTML referencia las URLs con hash de la version actual
+        response.cache_control.no_cache = True
+        return response
@@ -0,0 +1,183 @@
+# app/structured_logging.py
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+# text: formato clasico de logging.basicConfig | json: una linea JSON por registro
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Escribir desde un hilo aparte: el hilo de la peticion solo encola el registro
+LOG_ASYNC = os.getenv("LOG_ASYNC", "true").lower() == "true"
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Fraccion de peticiones que registran la traza detallada de la recuperacion (con DEBUG: todas)
+LOG_TRACE_SAMPLE_RATE = float(os.getenv("LOG_TRACE_SAMPLE_RATE", "0.05"))
+
+_trace_sampled = contextvars.ContextVar("log_trace_sampled", default=None)
+_queue_handler = None
+_listener = None
+_configured = False
+
+
+class JsonFormatter(logging.Formatter):
+    """Registro -> JSON; los campos de extra={"fields": {...}} van al primer nivel"""
+
+    def format(self, record):
+        fields = getattr(record, "fields", None)
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            # Registros de RequestLog: el resumen de texto repetiria los campos
+            "msg": fields["event"] if fields and "event" in fields else record.getMessage(),
+        }
+        if fields:
+            entry.update(fields)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que no formatea en el hilo de la peticion y descarta si la cola esta llena"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # El QueueHandler estandar formatea aqui el mensaje; se deja msg/args intactos
+        # para que el formateo ocurra en el hilo del listener. Solo el traceback se
+        # convierte a texto, porque no se puede pasar entre hilos de forma segura.
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def setup_logging():
+    """Configurar el logger raiz (reemplaza a logging.basicConfig); idempotente"""
+    global _queue_handler, _listener, _configured
+
+    if _configured:
+        return
+    _configured = True
+    root = logging.getLogger()
+
+    output = logging.StreamHandler(sys.stderr)
+    if LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+    root.setLevel(LOG_LEVEL)
+
+    if LOG_ASYNC:
+        _queue_handler = NonBlockingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+        _listener = logging.handlers.QueueListener(_queue_handler.queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+        root.addHandler(_queue_handler)
+    else:
+        root.addHandler(output)
+
+
+def shutdown():
+    """Vaciar la cola y detener el hilo de escritura (antes de os._exit en procesos hijos)"""
+    if _listener is not None:
+        _listener.stop()
+
+
+def _after_fork_in_child():
+    # El hilo del listener no existe en el hijo y la cola del padre pudo quedar con su
+    # candado tomado: se arma una cola y un listener nuevos para este proceso.
+    global _queue_handler, _listener, _configured
+    if _queue_handler is None:
+        return
+    logging.getLogger().removeHandler(_queue_handler)
+    _queue_handler = None
+    _listener = None
+    _configured = False
+    setup_logging()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def dropped_records():
+    return _queue_handler.dropped if _queue_handler is not None else 0
+
+
+# ============ TRAZAS MUESTREADAS ============
+def trace_enabled():
+    """True si la peticion actual debe registrar la traza detallada de la recuperacion"""
+    sampled = _trace_sampled.get()
+    if sampled is None:
+        sampled = _sample()
+    return sampled
+
+
+def _sample():
+    return logging.getLogger().isEnabledFor(logging.DEBUG) or random.random() < LOG_TRACE_SAMPLE_RATE
+
+
+class _Summary:
+    """'clave=valor ...' formateado solo cuando el registro se escribe"""
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __str__(self):
+        return " ".join(f"{key}={value}" for key, value in self.fields.items() if value is not None)
+
+
+class RequestLog:
+    """Un unico registro estructurado por peticion.
+
+    Las etapas agregan campos con set(); emit() escribe el registro una sola vez.
+    Mientras la peticion esta abierta fija la decision de muestreo de trazas, para
+    que toda la traza de una peticion se registre completa o no se registre.
+    """
+
+    def __init__(self, logger, event, **fields):
+        self.logger = logger
+        self.event = event
+        self.fields = dict(fields)
+        self.start = time.perf_counter()
+        self.trace = _sample()
+        self._token = _trace_sampled.set(self.trace)
+        if self.trace:
+            self.fields["trace"] = True
+
+    def set(self, **fields):
+        self.fields.update(fields)
+
+    def emit(self, level=logging.INFO, **fields):
+        if self._token is None:
+            return
+        _trace_sampled.reset(self._token)
+        self._token = None
+        self.fields.update(fields)
+        self.fields["ms"] = round((time.perf_counter() - self.start) * 1000, 1)
+        if self.logger.isEnabledFor(level):
+            self.logger.log(
+                level, "%s %s", self.event, _Summary(self.fields),
+                extra={"fields": {"event": self.event, **self.fields}},
+            )
@@ -0,0 +1,386 @@
+# app/vector_store.py
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Formato en disco. El 1 guardaba los ids en meta.json; se sigue pudiendo leer
+STORE_FORMAT_VERSION = 2
+READABLE_STORE_FORMATS = (1, 2)
+# Filas por bloque al calcular distancias (limita la memoria temporal por consulta)
+QUERY_BLOCK_ROWS = 8192
+# Generaciones guardadas que se conservan (la activa y la anterior, que un worker puede estar abriendo)
+STORE_KEEP_GENERATIONS = 2
+
+STORE_FILES = ("vectors.npy", "offsets.npy", "texts.bin", "ids.bin", "columns.npz", "meta.json")
+CURRENT = "CURRENT"
+
+
+class CompactVectorStore:
+    """Indice de vectores compacto compatible con la parte de la API de Chroma que usa RAGSystem.
+
+    - Vectores en float16 en un solo array (N, dim); se cargan con memory-mapping.
+    - Textos e ids en blobs UTF-8 con offsets, sin un objeto Python por chunk.
+    - Metadatos en columnas numpy: fuente y materia internadas en tablas pequeñas,
+      chunk_id en un array; chunk_size se deriva del texto y no se guarda.
+    - El mapa id -> fila solo se construye si se busca o borra por id (escritor);
+      un worker que solo consulta no lo necesita.
+    - Huella: unos 890 bytes/chunk con 384 dimensiones frente a ~1.75 KB de float32
+      con ids y metadatos JSON, unas 2x (benchmarks/bench_vector_store.py, sin
+      comparar con Chroma instalado). Los vectores float16 son 768 de esos bytes,
+      asi que sin cuantizar mas no baja mucho de ahi.
+    - Distancias: L2 al cuadrado, como la coleccion de Chroma por defecto, para
+      que los umbrales de RetrievalPolicy sigan valiendo.
+    - Cada persist() escribe una generacion completa en path/<generacion>/ y la
+      publica cambiando path/CURRENT (como los bundles): quien carga nunca mezcla
+      archivos de dos guardados. Sin CURRENT, los archivos estan en path mismo
+      (bundles e indices anteriores).
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.data_dir = None          # carpeta de la generacion cargada
+        self._reset_memory()
+
+    def _reset_memory(self):
+        self.dim = None
+        self._vectors = None          # float16 (N, dim), posiblemente memmap
+        self._sq_norms = None         # float32 (N,)
+        self._pending_vectors = []
+        self._texts = []              # textos nuevos aun no consolidados
+        self._blob = b""
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._new_ids = []            # ids nuevos aun no consolidados
+        self._id_blob = b""
+        self._id_offsets = np.zeros(1, dtype=np.int64)
+        self._id_index = None         # id -> fila, se construye al primer uso
+        self._source_table = []
+        self._source_lookup = {}
+        self._subject_table = []
+        self._subject_lookup = {}
+        self._source_idx = np.zeros(0, dtype=np.uint8)
+        self._subject_idx = np.zeros(0, dtype=np.uint8)
+        self._chunk_ids = np.zeros(0, dtype=np.uint32)
+        self._pending_columns = []    # (fuente, materia, chunk_id) de filas nuevas
+
+    # ============ CICLO DE VIDA ============
+    def _resolve(self):
+        """Carpeta de la generacion activa: path/<CURRENT>, o path si no hay CURRENT"""
+        try:
+            with open(os.path.join(self.path, CURRENT), "r", encoding="utf-8") as f:
+                return os.path.join(self.path, f.read().strip())
+        except FileNotFoundError:
+            return self.path
+
+    def exists(self):
+        return os.path.exists(os.path.join(self._resolve(), "meta.json"))
+
+    def reset(self):
+        """Vaciar el indice en memoria (equivale a delete_collection + create_collection).
+
+        Lo guardado no se toca: sigue siendo la generacion activa para otros
+        procesos hasta que persist() publique la nueva.
+        """
+        self._reset_memory()
+
+    def load(self):
+        """Cargar desde disco; los vectores quedan mapeados en memoria, no copiados"""
+        data_dir = self._resolve()
+        with open(os.path.join(data_dir, "meta.json"), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("format") not in READABLE_STORE_FORMATS:
+            raise ValueError(f"Formato de indice no soportado: {meta.get('format')}")
+
+        self._reset_memory()
+        self.data_dir = data_dir
+        self.dim = meta["dim"]
+        self._source_table = meta["sources"]
+        self._source_lookup = {name: i for i, name in enumerate(self._source_table)}
+        self._subject_table = meta["subjects"]
+        self._subject_lookup = {name: i for i, name in enumerate(self._subject_table)}
+
+        self._vectors = np.load(os.path.join(data_dir, "vectors.npy"), mmap_mode="r")
+        self._sq_norms = self._compute_sq_norms(self._vectors)
+        self._offsets = np.load(os.path.join(data_dir, "offsets.npy"), mmap_mode="r")
+        with open(os.path.join(data_dir, "texts.bin"), "rb") as f:
+            self._blob = f.read()
+
+        # Un .npz no se puede mapear, pero las columnas ocupan 2-6 bytes por chunk
+        with np.load(os.path.join(data_dir, "columns.npz")) as columns:
+            self._source_idx = columns["source_idx"]
+            self._subject_idx = columns["subject_idx"]
+            self._chunk_ids = columns["chunk_id"]
+            if meta["format"] >= 2:
+                self._id_offsets = columns["id_offsets"]
+        if meta["format"] >= 2:
+            with open(os.path.join(data_dir, "ids.bin"), "rb") as f:
+                self._id_blob = f.read()
+        else:
+            self._new_ids = meta["ids"]
+            self._consolidate()
+        logger.info(f"Indice compacto cargado: {self.count()} chunks, {self.nbytes() / 1024:.0f} KB")
+        return self
+
+    def persist(self):
+        """Guardar en disco como generacion nueva y publicarla de una vez en CURRENT"""
+        self._consolidate()
+        os.makedirs(self.path, exist_ok=True)
+
+        staging = tempfile.mkdtemp(dir=self.path, prefix=".build-")
+        try:
+            vectors = self._vectors if self._vectors is not None else np.zeros((0, self.dim or 0), dtype=np.float16)
+            np.save(os.path.join(staging, "vectors.npy"), np.asarray(vectors))
+            np.save(os.path.join(staging, "offsets.npy"), self._offsets)
+            with open(os.path.join(staging, "texts.bin"), "wb") as f:
+                f.write(self._blob)
+            with open(os.path.join(staging, "ids.bin"), "wb") as f:
+                f.write(self._id_blob)
+            np.savez(
+                os.path.join(staging, "columns.npz"),
+                source_idx=self._source_idx,
+                subject_idx=self._subject_idx,
+                chunk_id=self._chunk_ids,
+                id_offsets=self._id_offsets,
+            )
+            meta = {
+                "format": STORE_FORMAT_VERSION,
+                "dim": self.dim,
+                "sources": self._source_table,
+                "subjects": self._subject_table,
+            }
+            with open(os.path.join(staging, "meta.json"), "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.chmod(staging, 0o755)
+            generation = f"gen-{time.time_ns()}"
+            os.rename(staging, os.path.join(self.path, generation))
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(generation + "\n")
+        os.replace(tmp_path, os.path.join(self.path, CURRENT))
+        self._prune_generations(generation)
+
+        # Reabrir mapeado para no duplicar los vectores en memoria
+        self.load()
+
+    def _prune_generations(self, current):
+        """Borrar generaciones viejas, construcciones abandonadas y archivos sueltos del formato anterior"""
+        generations = sorted(name for name in os.listdir(self.path) if name.startswith("gen-"))
+        keep = set(generations[-STORE_KEEP_GENERATIONS:]) | {current}
+        for name in os.listdir(self.path):
+            full = os.path.join(self.path, name)
+            if name.startswith(("gen-", ".build-")) and name not in keep:
+                shutil.rmtree(full, ignore_errors=True)
+            elif name in STORE_FILES:
+                os.remove(full)
+
+    # ============ API TIPO CHROMA ============
+    def count(self):
+        return len(self._id_offsets) - 1 + len(self._new_ids)
+
+    def add(self, embeddings, documents, metadatas, ids):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+        if vectors.ndim != 2:
+            raise ValueError("embeddings debe ser una lista de vectores")
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+        elif vectors.shape[1] != self.dim:
+            raise ValueError(f"Dimension {vectors.shape[1]} distinta a la del indice ({self.dim})")
+
+        id_index = self._id_lookup()
+        for chunk_id in ids:
+            if chunk_id in id_index:
+                raise ValueError(f"ID duplicado: {chunk_id}")
+
+        self._pending_vectors.append(vectors.astype(np.float16))
+        for doc, metadata, chunk_id in zip(documents, metadatas, ids):
+            id_index[chunk_id] = self.count()
+            self._new_ids.append(chunk_id)
+            self._texts.append(doc)
+            self._pending_columns.append((
+                self._intern(metadata.get("source", ""), self._source_table, self._source_lookup),
+                self._intern(metadata.get("subject", "general"), self._subject_table, self._subject_lookup),
+                int(metadata.get("chunk_id", 0)),
+            ))
+
+    def query(self, query_embeddings, n_results=3, include=("documents", "metadatas", "distances")):
+        self._consolidate()
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        if self._vectors is None or self.count() == 0:
+            for key in result:
+                result[key].append([])
+            return result
+
+        n_results = min(n_results, self.count())
+        for query in np.asarray(query_embeddings, dtype=np.float32):
+            distances = self._distances(query)
+            if n_results < len(distances):
+                top = np.argpartition(distances, n_results - 1)[:n_results]
+            else:
+                top = np.arange(len(distances))
+            top = top[np.argsort(distances[top])]
+
+            result["ids"].append([self._id(i) for i in top])
+            result["distances"].append([float(distances[i]) for i in top])
+            result["documents"].append([self._text(i) for i in top] if "documents" in include else None)
+            result["metadatas"].append([self._metadata(i) for i in top] if "metadatas" in include else None)
+        return result
+
+    def get(self, ids=None, where=None, include=("documents", "metadatas")):
+        self._consolidate()
+        indices = self._select(ids, where)
+        return {
+            "ids": [self._id(i) for i in indices],
+            "documents": [self._text(i) for i in indices] if "documents" in include else None,
+            "metadatas": [self._metadata(i) for i in indices] if "metadatas" in include else None,
+        }
+
+    def delete(self, ids=None, where=None):
+        """Eliminar chunks; reconstruye los arrays (las actualizaciones son poco frecuentes)"""
+        self._consolidate()
+        drop = self._select(ids, where)
+        if not drop:
+            return
+        mask = np.ones(self.count(), dtype=bool)
+        mask[drop] = False
+        keep = np.flatnonzero(mask)
+
+        texts = [self._text(i) for i in keep]
+        vectors = np.asarray(self._vectors)[keep] if len(keep) else None
+        ids_kept = [self._id(i) for i in keep]
+        source_idx, subject_idx, chunk_ids = self._source_idx[keep], self._subject_idx[keep], self._chunk_ids[keep]
+        sources, subjects, dim = self._source_table, self._subject_table, self.dim
+
+        self._reset_memory()
+        self.dim = dim
+        self._source_table, self._subject_table = sources, subjects
+        self._source_lookup = {name: i for i, name in enumerate(sources)}
+        self._subject_lookup = {name: i for i, name in enumerate(subjects)}
+        if vectors is not None:
+            self._pending_vectors.append(np.array(vectors, dtype=np.float16))
+        self._new_ids = ids_kept
+        self._texts = texts
+        self._source_idx, self._subject_idx, self._chunk_ids = source_idx, subject_idx, chunk_ids
+
+    # ============ INTERNOS ============
+    @staticmethod
+    def _intern(value, table, lookup):
+        index = lookup.get(value)
+        if index is None:
+            index = len(table)
+            table.append(value)
+            lookup[value] = index
+        return index
+
+    @staticmethod
+    def _compute_sq_norms(vectors):
+        norms = np.empty(len(vectors), dtype=np.float32)
+        for start in range(0, len(vectors), QUERY_BLOCK_ROWS):
+            block = np.asarray(vectors[start:start + QUERY_BLOCK_ROWS], dtype=np.float32)
+            norms[start:start + len(block)] = np.einsum("ij,ij->i", block, block)
+        return norms
+
+    def _id_lookup(self):
+        if self._id_index is None:
+            self._consolidate()
+            self._id_index = {self._id(i): i for i in range(self.count())}
+        return self._id_index
+
+    def _consolidate(self):
+        """Unir vectores, textos y columnas pendientes a los arrays principales"""
+        if not self._pending_vectors and not self._texts and not self._pending_columns and not self._new_ids:
+            return
+        if self._pending_columns:
+            new = np.array(self._pending_columns, dtype=np.int64).reshape(-1, 3)
+            self._source_idx = np.concatenate([self._source_idx, new[:, 0]]).astype(
+                _index_dtype(len(self._source_table)))
+            self._subject_idx = np.concatenate([self._subject_idx, new[:, 1]]).astype(
+                _index_dtype(len(self._subject_table)))
+            self._chunk_ids = np.concatenate([self._chunk_ids, new[:, 2]]).astype(np.uint32)
+            self._pending_columns = []
+        if self._pending_vectors:
+            parts = ([np.asarray(self._vectors)] if self._vectors is not None else []) + self._pending_vectors
+            self._vectors = np.concatenate(parts, axis=0)
+            self._sq_norms = self._compute_sq_norms(self._vectors)
+            self._pending_vectors = []
+        if self._texts:
+            self._blob, self._offsets = _append_utf8(self._blob, self._offsets, self._texts)
+            self._texts = []
+        if self._new_ids:
+            self._id_blob, self._id_offsets = _append_utf8(self._id_blob, self._id_offsets, self._new_ids)
+            self._new_ids = []
+
+    def _distances(self, query):
+        """L2 al cuadrado: |q|^2 + |v|^2 - 2 q.v, por bloques para no inflar la memoria"""
+        q_norm = float(query @ query)
+        out = np.empty(self.count(), dtype=np.float32)
+        for start in range(0, self.count(), QUERY_BLOCK_ROWS):
+            block = np.asarray(self._vectors[start:start + QUERY_BLOCK_ROWS], dtype=np.float32)
+            out[start:start + len(block)] = q_norm + self._sq_norms[start:start + len(block)] - 2.0 * (block @ query)
+        return np.maximum(out, 0.0)
+
+    def _text(self, index):
+        return self._blob[self._offsets[index]:self._offsets[index + 1]].decode("utf-8")
+
+    def _id(self, index):
+        return self._id_blob[self._id_offsets[index]:self._id_offsets[index + 1]].decode("utf-8")
+
+    def _metadata(self, index):
+        return {
+            "source": self._source_table[self._source_idx[index]],
+            "subject": self._subject_table[self._subject_idx[index]],
+            "chunk_id": int(self._chunk_ids[index]),
+        }
+
+    def _select(self, ids, where):
+        if ids is not None:
+            id_index = self._id_lookup()
+            return [id_index[chunk_id] for chunk_id in ids if chunk_id in id_index]
+        if where:
+            source = where.get("source")
+            subject = where.get("subject")
+            source_i = self._source_lookup.get(source) if source is not None else None
+            subject_i = self._subject_lookup.get(subject) if subject is not None else None
+            if (source is not None and source_i is None) or (subject is not None and subject_i is None):
+                return []
+            mask = np.ones(self.count(), dtype=bool)
+            if source_i is not None:
+                mask &= self._source_idx == source_i
+            if subject_i is not None:
+                mask &= self._subject_idx == subject_i
+            return np.flatnonzero(mask).tolist()
+        return list(range(self.count()))
+
+    def nbytes(self):
+        """Bytes aproximados del indice en memoria/disco, incluidos los objetos Python por chunk"""
+        self._consolidate()
+        arrays = sum(a.nbytes for a in (self._vectors, self._sq_norms, self._offsets, self._id_offsets,
+                                         self._source_idx, self._subject_idx, self._chunk_ids)
+                     if a is not None)
+        # El mapa id -> fila (solo en el escritor) si tiene un str por chunk
+        id_index = 0
+        if self._id_index is not None:
+            id_index = sys.getsizeof(self._id_index) + sum(sys.getsizeof(key) for key in self._id_index)
+        tables = sum(sys.getsizeof(name) for name in self._source_table + self._subject_table)
+        return arrays + len(self._blob) + len(self._id_blob) + id_index + tables
+
+
+def _append_utf8(blob, offsets, values):
+    """Agregar strings a un blob UTF-8 con su array de offsets"""
+    encoded = [value.encode("utf-8") for value in values]
+    lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+    return blob + b"".join(encoded), np.concatenate([offsets, offsets[-1] + np.cumsum(lengths)])
+
+
+def _index_dtype(table_size):
+    return np.uint8 if table_size <= 0xFF else np.uint16 if table_size <= 0xFFFF else np.uint32
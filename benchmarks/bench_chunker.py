@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark del chunker: implementacion anterior vs app/chunker.py
+
+Uso:
+    python benchmarks/bench_chunker.py [--mb 8] [--repeat 3]
+"""
+
+import argparse
+import glob
+import io
+import os
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+import chunker  # noqa: E402
+
+
+# ============ IMPLEMENTACION ANTERIOR (referencia) ============
+def legacy_clean_text(text):
+    text = re.sub(r'Pregunta:\s*', '', text)
+    text = re.sub(r'Respuesta:\s*', '', text)
+    text = re.sub(r'Ejemplo:\s*', 'Por ejemplo: ', text)
+    text = re.sub(r'\s+', ' ', text)
+    text = re.sub(r'\n{3,}', '\n\n', text)
+    return text.strip()
+
+
+def legacy_create_smart_chunks(text, chunk_size, overlap):
+    chunks = []
+    sections = re.split(r'\n(?=[A-ZÁÉÍÓÚ\s]{3,}|#)', text)
+    for section in sections:
+        section = section.strip()
+        if not section or len(section) < 50:
+            continue
+        lines = section.split('\n')
+        title = ""
+        content = section
+        if lines[0].isupper() or lines[0].startswith('#'):
+            title = lines[0].replace('#', '').strip()
+            content = '\n'.join(lines[1:]).strip()
+        sentences = re.split(r'(?<=[.!?])\s+', content)
+        current_chunk = f"{title}\n" if title else ""
+        for sentence in sentences:
+            if len(current_chunk) + len(sentence) < chunk_size:
+                current_chunk += sentence + " "
+            else:
+                if current_chunk.strip():
+                    chunks.append(current_chunk.strip())
+                words = current_chunk.split()
+                overlap_words = words[-overlap//5:] if len(words) > overlap//5 else []
+                current_chunk = f"{title}\n" if title else ""
+                current_chunk += " ".join(overlap_words) + " " + sentence + " "
+        if current_chunk.strip():
+            chunks.append(current_chunk.strip())
+    return chunks
+
+
+def legacy_chunk_document(raw_text):
+    return legacy_create_smart_chunks(legacy_clean_text(raw_text), 600, 150)
+
+
+# ============ CORPUS ============
+def build_corpus(target_mb):
+    """Repetir los documentos de docs/ hasta alcanzar el tamaño pedido"""
+    texts = []
+    for path in sorted(glob.glob(os.path.join(ROOT, "docs", "*.txt"))):
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            texts.append(f.read())
+    if not texts:
+        raise SystemExit("No hay documentos en docs/ para construir el corpus")
+
+    base = "\n\n".join(texts)
+    target = int(target_mb * 1024 * 1024)
+    reps = max(1, target // len(base.encode("utf-8")) + 1)
+    return "\n\n".join([base] * reps)
+
+
+def timed(fn, text, repeat):
+    best = None
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--mb", type=float, default=8.0, help="Tamaño del corpus en MB")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeticiones (se reporta la mejor)")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.mb)
+    size_mb = len(corpus.encode("utf-8")) / (1024 * 1024)
+    print(f"Corpus: {size_mb:.1f} MB")
+
+    legacy_time, legacy_chunks = timed(legacy_chunk_document, corpus, args.repeat)
+    new_time, new_chunks = timed(chunker.chunk_document, corpus, args.repeat)
+    stream_time, stream_chunks = timed(
+        lambda text: list(chunker.iter_document_chunks(io.StringIO(text))), corpus, args.repeat
+    )
+
+    titled = sum(1 for c in new_chunks if "\n" in c)
+    legacy_titled = sum(1 for c in legacy_chunks if "\n" in c)
+
+    print(f"Anterior: {legacy_time:.3f}s | {size_mb / legacy_time:.1f} MB/s | "
+          f"{len(legacy_chunks)} chunks | {legacy_titled} con titulo")
+    print(f"Nuevo:    {new_time:.3f}s | {size_mb / new_time:.1f} MB/s | "
+          f"{len(new_chunks)} chunks | {titled} con titulo")
+    print(f"Stream:   {stream_time:.3f}s | {size_mb / stream_time:.1f} MB/s | "
+          f"{len(stream_chunks)} chunks | identico: {stream_chunks == new_chunks}")
+    print(f"Aceleracion: {legacy_time / new_time:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Rastreador de AVAS-2 (avas2_crawler.py) contra un servidor local de paginas guardadas
+
+Uso:
+    python benchmarks/bench_crawler.py [--pages-dir carpeta] [--latency 0.2] [--connections 4]
+
+Sirve las paginas con ETag/Last-Modified (responde 304 a peticiones condicionales)
+y ejecuta tres rastreos:
+  1. en frio: descarga todo, escribe los TXT y los indexa en el RAG (incremental)
+  2. sin cambios: todo responde 304, no se reindexa nada
+  3. tras modificar una pagina y borrar otra: solo esas se actualizan/eliminan
+--pages-dir usa paginas guardadas con la estructura del sitio
+(<carpeta>/avas-2/ava-matematicas/index.html, ...); sin el, se generan paginas sinteticas.
+"""
+
+import argparse
+import email.utils
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(ROOT, "app"))
+sys.path.insert(0, BENCH_DIR)
+
+os.environ.setdefault("VECTOR_STORE", "compact")
+
+import fakes  # noqa: E402
+from avas2_crawler import AVAS2Crawler, PageCache  # noqa: E402
+
+SUBJECT_PATHS = {
+    "ciencias_naturales": "ava-ciencias-naturales",
+    "ciencias_sociales": "ava-ciencias-sociales",
+    "matematicas": "ava-matematicas",
+    "espanol": "ava-espanol",
+    "ingles": "ava-ingles",
+}
+
+
+def write_synthetic_site(root, topics_per_subject=6):
+    import random
+
+    rng = random.Random(3)
+    for subject, folder in SUBJECT_PATHS.items():
+        topics = fakes.SUBJECT_FILES[subject][:topics_per_subject]
+        links = "".join(f'<li><a href="{fakes.SUBJECT_FILES[subject].index(t)}-{t.replace(" ", "-")}/">{t}</a></li>'
+                        for t in topics)
+        index = os.path.join(root, "avas-2", folder, "index.html")
+        os.makedirs(os.path.dirname(index), exist_ok=True)
+        with open(index, "w", encoding="utf-8") as f:
+            f.write(f"<html><head><title>AVA {subject}</title></head><body><nav>Menu</nav>"
+                    f"<main><h1>{subject}</h1><ul>{links}</ul></main></body></html>")
+        for topic in topics:
+            page = os.path.join(root, "avas-2", folder, f"{fakes.SUBJECT_FILES[subject].index(topic)}-{topic.replace(' ', '-')}",
+                                "index.html")
+            os.makedirs(os.path.dirname(page), exist_ok=True)
+            paragraphs = "".join(f"<p>{fakes.synthetic_paragraph(topic, rng)}</p>" for _ in range(4))
+            with open(page, "w", encoding="utf-8") as f:
+                f.write(f"<html><head><title>{topic}</title><script>var x=1;</script></head><body>"
+                        f"<header>AVAS-2</header><article><h2>{topic}</h2>{paragraphs}</article>"
+                        f"<footer>Gobernacion de Nariño</footer></body></html>")
+
+
+class SavedSite:
+    """Servidor HTTP de paginas guardadas con validacion condicional"""
+
+    def __init__(self, root, latency=0.0):
+        site = self
+        self.root = root
+        self.requests = 0
+        self.not_modified = 0
+        self.lock = threading.Lock()
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                time.sleep(latency)
+                with site.lock:
+                    site.requests += 1
+                path = os.path.join(site.root, self.path.lstrip("/").split("?")[0])
+                if os.path.isdir(path):
+                    path = os.path.join(path, "index.html")
+                if not os.path.isfile(path):
+                    self.send_response(404)
+                    self.end_headers()
+                    return
+                with open(path, "rb") as f:
+                    body = f.read()
+                etag = '"' + hashlib.md5(body).hexdigest() + '"'
+                modified = email.utils.formatdate(os.path.getmtime(path), usegmt=True)
+                if self.headers.get("If-None-Match") == etag:
+                    with site.lock:
+                        site.not_modified += 1
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", modified)
+                self.end_headers()
+                self.wfile.write(body)
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/avas-2/"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pages-dir", default=None)
+    parser.add_argument("--latency", type=float, default=0.2, help="Segundos por peticion del servidor local")
+    parser.add_argument("--connections", type=int, default=4)
+    args = parser.parse_args()
+
+    work = tempfile.mkdtemp(prefix="bench-crawler-")
+    cwd = os.getcwd()
+    os.chdir(work)
+    try:
+        site_dir = os.path.join(work, "site")
+        if args.pages_dir:
+            shutil.copytree(args.pages_dir, site_dir)
+        else:
+            write_synthetic_site(site_dir)
+        site = SavedSite(site_dir, args.latency)
+
+        # Un documento base para que el indice exista antes del rastreo
+        docs_dir = os.path.join(work, "docs")
+        fakes.write_corpus(docs_dir, docs_per_subject=1, sections=5)
+        from rag_system import RAGSystem
+        rag = RAGSystem(docs_dir=docs_dir, embedder=fakes.HashingEmbedder(), force_reindex=True)
+        base_chunks = rag.collection.count()
+
+        crawler = AVAS2Crawler(
+            subjects={subject: f"{site.url}{folder}/" for subject, folder in SUBJECT_PATHS.items()},
+            docs_dir=docs_dir,
+            get_rag=lambda: rag,
+            cache=PageCache(os.path.join(work, "crawl_cache")),
+            max_connections=args.connections,
+        )
+
+        def report(name, result):
+            print(f"{name:<22} {result['seconds']:>6.2f}s | paginas {result['pages']:>3} | descargadas "
+                  f"{result['fetched']:>3} | 304 {result['not_modified']:>3} | actualizadas {len(result['changed']):>3} "
+                  f"| eliminadas {len(result['removed'])} | errores {len(result['errors'])} "
+                  f"| chunks en indice {rag.collection.count()}")
+
+        print(f"Indice base: {base_chunks} chunks; servidor con {args.latency}s por peticion, "
+              f"{args.connections} conexiones\n")
+        report("1. en frio", crawler.crawl())
+        report("2. sin cambios", crawler.crawl())
+
+        pages = sorted(
+            os.path.join(dirpath, "index.html")
+            for dirpath, _, files in os.walk(os.path.join(site_dir, "avas-2"))
+            if "index.html" in files and dirpath.count(os.sep) > os.path.join(site_dir, "avas-2").count(os.sep) + 1
+        )
+        if len(pages) >= 2:
+            with open(pages[0], "r", encoding="utf-8") as f:
+                html = f.read()
+            extra = "<p>" + "Contenido nuevo agregado por el docente para repasar en casa. " * 8 + "</p>"
+            with open(pages[0], "w", encoding="utf-8") as f:
+                f.write(html.replace("</article>", extra + "</article>", 1) if "</article>" in html
+                        else html.replace("</body>", extra + "</body>", 1))
+            shutil.rmtree(os.path.dirname(pages[1]))
+        report("3. 1 cambio, 1 borrada", crawler.crawl())
+
+        context, sources, _ = rag.search("Contenido nuevo agregado por el docente para repasar en casa")
+        print(f"\nBusqueda del texto nuevo -> {sources}")
+        print(f"Peticiones al servidor: {site.requests} ({site.not_modified} respondidas con 304)")
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(work, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
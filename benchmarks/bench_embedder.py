@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Paridad y rendimiento de los embedders: sentence-transformers vs ONNX (int8)
+
+Uso:
+    python benchmarks/bench_embedder.py [--queries 200] [--onnx-path ruta]
+
+Cada backend se mide en un subproceso propio para que el RSS no se mezcle.
+Reporta: tiempo de import+carga, RSS maximo, latencia por consulta (p50/p99),
+similitud coseno contra el modelo original y coincidencia del top-3 sobre los
+chunks de docs/.
+"""
+
+import argparse
+import glob
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+QUERIES = [
+    "¿Qué es la suma?",
+    "¿Cómo se calcula el perímetro de un cuadrado?",
+    "¿Cuáles son los estados del agua?",
+    "¿Qué es la familia?",
+    "¿Qué es un sustantivo?",
+    "How do you say the colors in English?",
+    "¿Qué son los derechos de los niños?",
+    "¿Cómo se convierte centímetros a metros?",
+]
+
+
+def load_chunks():
+    import chunker
+    chunks = []
+    for path in sorted(glob.glob(os.path.join(ROOT, "docs", "*.txt"))):
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            chunks.extend(chunker.chunk_document(f.read()))
+    return chunks
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(backend, n_queries, out_path):
+    """Se ejecuta en el subproceso: carga un backend y guarda vectores y tiempos"""
+    start = time.perf_counter()
+    import rag_system
+    embedder = rag_system.create_embedder(backend)
+    load_seconds = time.perf_counter() - start
+
+    chunks = load_chunks()
+    chunk_vectors = embedder.encode(chunks, batch_size=32)
+    query_vectors = embedder.encode(QUERIES, batch_size=32)
+
+    latencies = []
+    for i in range(n_queries):
+        query = QUERIES[i % len(QUERIES)] + f" {i}"
+        t = time.perf_counter()
+        embedder.encode(query)
+        latencies.append((time.perf_counter() - t) * 1000)
+
+    with open(out_path, "w", encoding="utf-8") as f:
+        json.dump({
+            "backend": type(embedder).__name__,
+            "load_seconds": load_seconds,
+            "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+            "p50_ms": percentile(latencies, 50),
+            "p99_ms": percentile(latencies, 99),
+            "chunk_vectors": chunk_vectors.tolist(),
+            "query_vectors": query_vectors.tolist(),
+        }, f)
+
+
+def run_backend(backend, n_queries, tmp_dir):
+    out_path = os.path.join(tmp_dir, f"{backend}.json")
+    subprocess.run(
+        [sys.executable, __file__, "--child", backend, "--queries", str(n_queries), "--out", out_path],
+        check=True,
+    )
+    with open(out_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare(reference, candidate):
+    import numpy as np
+    ref_chunks = np.array(reference["chunk_vectors"])
+    cand_chunks = np.array(candidate["chunk_vectors"])
+    ref_queries = np.array(reference["query_vectors"])
+    cand_queries = np.array(candidate["query_vectors"])
+
+    cosine = (ref_chunks * cand_chunks).sum(axis=1) / (
+        np.linalg.norm(ref_chunks, axis=1) * np.linalg.norm(cand_chunks, axis=1)
+    )
+
+    agree = 0
+    for ref_q, cand_q in zip(ref_queries, cand_queries):
+        ref_top = set(np.argsort(-(ref_chunks @ ref_q))[:3])
+        cand_top = set(np.argsort(-(cand_chunks @ cand_q))[:3])
+        agree += len(ref_top & cand_top)
+
+    return {
+        "cosine_min": float(cosine.min()),
+        "cosine_mean": float(cosine.mean()),
+        "top3_overlap": agree / (3 * len(ref_queries)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--onnx-path", default=None, help="Carpeta del modelo ONNX (EMBEDDER_ONNX_PATH)")
+    parser.add_argument("--child", default=None, help=argparse.SUPPRESS)
+    parser.add_argument("--out", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        measure(args.child, args.queries, args.out)
+        return
+
+    if args.onnx_path:
+        os.environ["EMBEDDER_ONNX_PATH"] = os.path.abspath(args.onnx_path)
+
+    import tempfile
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        reference = run_backend("sentence-transformers", args.queries, tmp_dir)
+        candidate = run_backend("onnx", args.queries, tmp_dir)
+
+    for result in (reference, candidate):
+        print(f"{result['backend']:<28} carga {result['load_seconds']:.2f}s | "
+              f"RSS {result['max_rss_mb']:.0f} MB | p50 {result['p50_ms']:.1f} ms | p99 {result['p99_ms']:.1f} ms")
+
+    if candidate["backend"] == reference["backend"]:
+        print("⚠️  El backend ONNX no cargo (se uso sentence-transformers); revisa EMBEDDER_ONNX_PATH")
+        return
+
+    parity = compare(reference, candidate)
+    print(f"Paridad: coseno min {parity['cosine_min']:.4f} | medio {parity['cosine_mean']:.4f} | "
+          f"top-3 coincidente {parity['top3_overlap']:.0%}")
+    if parity["cosine_min"] < 0.98 or parity["top3_overlap"] < 0.9:
+        print("❌ Paridad insuficiente: no usar este modelo con el indice existente")
+        sys.exit(1)
+    print("✅ Vectores compatibles con el indice existente")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Costo del logging en el hilo de la peticion: antes vs structured_logging
+
+Uso:
+    python benchmarks/bench_logging.py [--requests 2000]
+
+- antes: ~12 logger.info con f-strings por peticion, StreamHandler sincrono
+- despues: un registro RequestLog por peticion (cola + listener), traza muestreada
+Se escribe a un archivo temporal (como los .err.log de supervisord) y se mide solo
+el tiempo que pasa el hilo que atiende la peticion.
+"""
+
+import argparse
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+import structured_logging  # noqa: E402
+
+RESULTS = [("ciencias_naturales/agua.txt", 0.412, "El agua cambia de estado con el calor y el frio. " * 3)] * 4
+
+
+def old_request(logger, prompt):
+    logger.info(f"🔍 Buscando en documentos: {prompt[:50]}...")
+    logger.info(f"🔍 Buscando: '{prompt}'")
+    for i, (source, distance, doc) in enumerate(RESULTS):
+        logger.info(f"   {i+1}. Dist: {distance:.3f} (ajustada: {distance + 0.05:.3f}) | {source:<20} | {doc[:60]}...")
+    logger.info(f"SELECCIONADO (dist ajustada: {RESULTS[0][1]:.3f}) - {RESULTS[0][0]}")
+    logger.info(f"Encontrado: {len(RESULTS)} chunks (dist: {RESULTS[0][1]:.3f})")
+    logger.info(f"Enviando a Ollama (estrategia: docs_friendly)...")
+    logger.info("=" * 60)
+    logger.info(f"   Estrategia: docs_friendly | Fuentes: {[r[0] for r in RESULTS]}")
+    logger.info("=" * 60)
+
+
+def new_request(logger, prompt):
+    request_log = structured_logging.RequestLog(logger, "chat", prompt_chars=len(prompt))
+    if structured_logging.trace_enabled():
+        logger.info("🔍 Buscando: '%s'", prompt)
+        for i, (source, distance, doc) in enumerate(RESULTS):
+            logger.info("   %d. Dist: %.3f | %-20s | %s...", i + 1, distance, source, doc[:60])
+    request_log.set(chunks_found=len(RESULTS), best_distance=RESULTS[0][1], sources=[r[0] for r in RESULTS])
+    request_log.emit(strategy="docs_friendly", outcome="ok")
+
+
+def run(name, fn, logger, args):
+    prompts = [f"¿Como cambia el agua de estado? caso {i}" for i in range(args.requests)]
+    latencies = []
+    for prompt in prompts:
+        start = time.perf_counter()
+        fn(logger, prompt)
+        latencies.append((time.perf_counter() - start) * 1e6)
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(f"{name:<34} p50 {p50:8.1f} us | p99 {p99:8.1f} us | total {sum(latencies) / 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        old_logger = logging.getLogger("bench.old")
+        old_logger.propagate = False
+        old_logger.setLevel(logging.INFO)
+        old_handler = logging.FileHandler(os.path.join(tmp, "old.log"), encoding="utf-8")
+        old_handler.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+        old_logger.addHandler(old_handler)
+        run("antes (sincrono, f-strings)", old_request, old_logger, args)
+        old_handler.close()
+
+        for fmt in ("text", "json"):
+            new_logger = logging.getLogger(f"bench.new.{fmt}")
+            new_logger.propagate = False
+            new_logger.setLevel(logging.INFO)
+            output = logging.FileHandler(os.path.join(tmp, f"new_{fmt}.log"), encoding="utf-8")
+            output.setFormatter(structured_logging.JsonFormatter() if fmt == "json"
+                                else logging.Formatter(logging.BASIC_FORMAT))
+            handler = structured_logging.NonBlockingQueueHandler(queue.Queue(10000))
+            listener = logging.handlers.QueueListener(handler.queue, output)
+            listener.start()
+            new_logger.addHandler(handler)
+            run(f"despues ({fmt}, cola, muestreo {structured_logging.LOG_TRACE_SAMPLE_RATE})", new_request, new_logger, args)
+            listener.stop()
+            output.close()
+            if handler.dropped:
+                print(f"   descartados: {handler.dropped}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Prompt-eval con prefijo estable vs plantilla con el contexto en medio
+
+Uso (con Ollama corriendo):
+    python benchmarks/bench_prompt_prefix.py [--url http://localhost:11434] [--model phi3:mini] [--rounds 5]
+
+Envia las mismas preguntas con dos variantes de la plantilla docs_friendly:
+- "estable": prefijo constante primero (prompt_templates.DOCS_FRIENDLY)
+- "intercalada": el orden anterior, con las instrucciones despues del material
+y compara prompt_eval_count / prompt_eval_duration que devuelve Ollama.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+from prompt_templates import DOCS_FRIENDLY  # noqa: E402
+
+QUESTIONS = [
+    ("¿Qué es la suma?", "La suma es juntar cantidades para obtener un total. Ejemplo: 2 + 3 = 5."),
+    ("¿Cuáles son los estados del agua?", "El agua puede estar en estado solido, liquido y gaseoso."),
+    ("¿Qué es la familia?", "La familia es el grupo de personas con quienes vivimos y compartimos."),
+    ("¿Qué es un sustantivo?", "El sustantivo es la palabra que nombra personas, animales o cosas."),
+]
+
+
+def interleaved(context, prompt):
+    """Orden anterior: el material queda antes de las instrucciones"""
+    head, instructions = DOCS_FRIENDLY.prefix.split("INSTRUCCIONES:")
+    return (f"{head}MATERIAL EDUCATIVO:\n{context}\n\nINSTRUCCIONES:{instructions.rstrip()}\n\n"
+            f"PREGUNTA: {prompt}\n\nRESPUESTA AMIGABLE:")
+
+
+def generate(url, model, prompt, keep_alive):
+    response = requests.post(f"{url}/api/generate", json={
+        "model": model,
+        "prompt": prompt,
+        "stream": False,
+        "keep_alive": keep_alive,
+        "options": {"num_predict": 1, "temperature": 0},
+    }, timeout=300)
+    response.raise_for_status()
+    data = response.json()
+    return data.get("prompt_eval_count") or 0, (data.get("prompt_eval_duration") or 0) / 1e6
+
+
+def run(url, model, rounds, build, keep_alive):
+    counts, times = [], []
+    generate(url, model, build(QUESTIONS[0][1], "calentamiento"), keep_alive)
+    for _ in range(rounds):
+        for question, context in QUESTIONS:
+            count, ms = generate(url, model, build(context, question), keep_alive)
+            counts.append(count)
+            times.append(ms)
+    return statistics.mean(counts), statistics.median(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default=os.getenv("OLLAMA_URL", "http://localhost:11434"))
+    parser.add_argument("--model", default=os.getenv("OLLAMA_MODEL", "phi3:mini"))
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--keep-alive", default="30m")
+    args = parser.parse_args()
+
+    variants = {
+        "estable": lambda context, prompt: DOCS_FRIENDLY.render(context=context, prompt=prompt),
+        "intercalada": interleaved,
+    }
+    for name, build in variants.items():
+        count, ms = run(args.url, args.model, args.rounds, build, args.keep_alive)
+        print(f"{name:<12} prompt_eval_count medio {count:.0f} | prompt_eval p50 {ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
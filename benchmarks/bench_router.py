@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Router de backends (llm_router.BackendPool) contra Ollamas falsos locales
+
+Uso:
+    python benchmarks/bench_router.py [--backends 2] [--requests 60] [--concurrency 8]
+
+Arranca N servidores fake_ollama y lanza peticiones concurrentes a traves del
+pool (llamando directo a /api/generate, sin PHP). A mitad de la corrida apaga el
+primer backend para comprobar failover y apertura del circuito, y lo reactiva
+al final para ver la peticion de prueba (half-open) que lo vuelve a cerrar.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("ROUTER_OPEN_SECONDS", "2")
+os.environ.setdefault("ROUTER_HEALTH_INTERVAL", "0.5")
+
+import llm_router  # noqa: E402
+from fake_ollama import FakeOllama  # noqa: E402
+
+
+def generate(backend, prompt):
+    response = requests.post(f"{backend.url}/api/generate", json={
+        "model": backend.model,
+        "prompt": prompt,
+        "stream": False,
+        "options": {"num_predict": 30},
+    }, timeout=30)
+    if response.status_code >= 500:
+        raise llm_router.BackendError(f"HTTP {response.status_code}")
+    response.raise_for_status()
+    return backend.name
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backends", type=int, default=2)
+    parser.add_argument("--requests", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--tps", type=float, default=60.0)
+    args = parser.parse_args()
+
+    fakes = [FakeOllama(tps=args.tps, load_seconds=0.2).start() for _ in range(args.backends)]
+    pool = llm_router.BackendPool([llm_router.Backend(fake.url, fake.model) for fake in fakes])
+    pool.start()
+
+    served = {}
+    failures = []
+    lock = threading.Lock()
+
+    def one(i):
+        if i == args.requests // 3:
+            fakes[0].down = True
+            print(f"[{i}] backend {pool.backends[0].name} apagado")
+        try:
+            name = pool.call(lambda backend: generate(backend, f"Pregunta {i}"))
+            with lock:
+                served[name] = served.get(name, 0) + 1
+        except Exception as e:
+            with lock:
+                failures.append(str(e))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(one, range(args.requests)))
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{args.requests} peticiones en {elapsed:.1f}s ({args.requests / elapsed:.1f} req/s), "
+          f"{len(failures)} fallidas")
+    for name, count in sorted(served.items()):
+        print(f"  {name}: {count}")
+    for entry in pool.snapshot():
+        print(f"  {entry['name']}: circuito {entry['circuit']}, sano {entry['healthy']}, errores {entry['errors']}")
+
+    # Reactivar el backend caido: tras ROUTER_OPEN_SECONDS pasa a half-open y se cierra con exito
+    fakes[0].down = False
+    time.sleep(float(os.environ["ROUTER_OPEN_SECONDS"]) + 0.6)
+    for i in range(args.backends * 2):
+        pool.call(lambda backend: generate(backend, f"Recuperacion {i}"))
+    print(f"\nTras reactivar: {[(e['name'], e['circuit']) for e in pool.snapshot()]}")
+
+    pool.stop()
+    for fake in fakes:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Huella y recall del indice compacto (float16 + columnas) frente a float32 exacto
+
+Uso:
+    python benchmarks/bench_vector_store.py [--chunks 20000] [--queries 300] [--dim 384]
+
+Los vectores son sinteticos (normalizados y agrupados por "materia") para que el
+ranking no sea trivial. El recall se mide contra la busqueda exacta en float32
+con la misma distancia que usa Chroma (L2 al cuadrado).
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+from vector_store import CompactVectorStore  # noqa: E402
+
+SUBJECTS = ["matematicas", "ciencias_naturales", "ciencias_sociales", "espanol", "ingles"]
+
+
+def synthetic_vectors(n, dim, rng, clusters=50):
+    centers = rng.normal(size=(clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    vectors = centers[labels] + 0.6 * rng.normal(size=(n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = synthetic_vectors(args.chunks, args.dim, rng)
+    queries = synthetic_vectors(args.queries, args.dim, rng)
+    documents = [f"TITULO {i % 40}\nTexto de ejemplo numero {i} para medir el indice." for i in range(args.chunks)]
+    metadatas = [{
+        "source": f"{SUBJECTS[i % 5]}/archivo_{i % 30}.txt",
+        "chunk_id": i // 30,
+        "subject": SUBJECTS[i % 5],
+    } for i in range(args.chunks)]
+    ids = [f"{m['source']}_{i}" for i, m in enumerate(metadatas)]
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        store = CompactVectorStore(tmp_dir)
+        for start in range(0, args.chunks, 1000):
+            end = start + 1000
+            store.add(vectors[start:end].tolist(), documents[start:end], metadatas[start:end], ids[start:end])
+        store.persist()
+        disk_bytes = sum(os.path.getsize(os.path.join(store.data_dir, name)) for name in os.listdir(store.data_dir))
+        # Recien cargado, como un worker que solo consulta (sin el mapa id -> fila)
+        memory_bytes = store.nbytes()
+        row_of = {chunk_id: i for i, chunk_id in enumerate(ids)}
+
+        # Referencia: float32 exacto
+        sq_norms = (vectors * vectors).sum(axis=1)
+        recalls = {3: 0, 10: 0}
+        latencies = []
+        for query in queries:
+            exact = sq_norms + float(query @ query) - 2.0 * (vectors @ query)
+            exact_top = np.argsort(exact)[:10]
+
+            t = time.perf_counter()
+            result = store.query([query.tolist()], n_results=10)
+            latencies.append((time.perf_counter() - t) * 1000)
+
+            found = [row_of[chunk_id] for chunk_id in result["ids"][0]]
+            for k in recalls:
+                recalls[k] += len(set(found[:k]) & set(exact_top[:k].tolist())) / k
+
+        # Base float32 con id y metadatos por chunk como JSON (lo que guardaba cada add en
+        # Chroma), sin sus indices ni SQLite: el tamaño real de Chroma es mayor
+        baseline_meta = sum(len(json.dumps({**m, "chunk_size": len(d), "total_chunks": 30}))
+                            for m, d in zip(metadatas, documents))
+        baseline_bytes = (args.chunks * args.dim * 4 + baseline_meta + sum(len(i.encode("utf-8")) for i in ids)
+                          + sum(len(d.encode("utf-8")) for d in documents))
+
+        print(f"Chunks: {args.chunks} | dim {args.dim} | consultas {args.queries}")
+        print(f"float32 + metadatos JSON: {baseline_bytes / args.chunks:.0f} bytes/chunk")
+        print(f"Compacto (memoria):       {memory_bytes / args.chunks:.0f} bytes/chunk "
+              f"({baseline_bytes / memory_bytes:.2f}x menos)")
+        print(f"Compacto (disco):         {disk_bytes / args.chunks:.0f} bytes/chunk")
+        print(f"Vectores: {args.dim * 4} -> {args.dim * 2} bytes/chunk")
+        print(f"Recall@3: {recalls[3] / args.queries:.4f} | Recall@10: {recalls[10] / args.queries:.4f}")
+        print(f"Latencia consulta: p50 {np.percentile(latencies, 50):.2f} ms | p99 {np.percentile(latencies, 99):.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
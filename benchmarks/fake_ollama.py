@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Servidor falso de Ollama para pruebas de carga y del router de backends
+
+Uso:
+    python benchmarks/fake_ollama.py [--port 11500] [--model phi3:mini] [--tps 20] [--load-seconds 2]
+
+Implementa /api/tags, /api/ps, /api/generate y /api/pull con tiempos sinteticos,
+y /api.php con el contrato de la API PHP (para medir /chat sin PHP):
+- la primera peticion (o tras vencer keep_alive) paga --load-seconds de carga
+- el prompt se "evalua" a --prompt-tps tokens/s y se generan num_predict tokens a --tps
+- --parallel limita las generaciones simultaneas (como OLLAMA_NUM_PARALLEL)
+Tambien se puede usar desde Python: FakeOllama(...).start() / .stop().
+"""
+
+import argparse
+import json
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ANSWER = "La suma es juntar cantidades para saber cuantas hay en total. Por ejemplo, 2 manzanas mas 3 manzanas son 5 manzanas."
+
+
+def _duration_seconds(value, default=300.0):
+    """keep_alive de Ollama: '30m', '10s', '1h', numero (segundos) o -1 (siempre)"""
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return float("inf") if value < 0 else float(value)
+    units = {"s": 1, "m": 60, "h": 3600}
+    value = str(value).strip()
+    if value and value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+
+class FakeOllama:
+    def __init__(self, port=0, model="phi3:mini", tps=20.0, prompt_tps=200.0, load_seconds=2.0,
+                 parallel=1, fail_rate=0.0, host="127.0.0.1"):
+        self.model = model
+        self.tps = tps
+        self.prompt_tps = prompt_tps
+        self.load_seconds = load_seconds
+        self.fail_rate = fail_rate
+        self.slots = threading.Semaphore(parallel)
+        self.lock = threading.Lock()
+        self.loaded_until = 0.0
+        self.cached_prefix = ""
+        self.requests = 0
+        self.down = False
+
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, status, payload):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _body(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                return json.loads(self.rfile.read(length) or b"{}")
+
+            def do_GET(self):
+                if fake.down:
+                    return self._send(503, {"error": "down"})
+                if self.path == "/api/tags":
+                    return self._send(200, {"models": [{"name": fake.model}]})
+                if self.path == "/api/ps":
+                    return self._send(200, {"models": fake.running()})
+                self._send(404, {"error": "not found"})
+
+            def do_POST(self):
+                if fake.down:
+                    return self._send(503, {"error": "down"})
+                if self.path == "/api/generate":
+                    return self._send(*fake.generate(self._body()))
+                if self.path == "/api/pull":
+                    return self._send(200, {"status": "success"})
+                if self.path == "/api.php":
+                    return self._send(*fake.php_api(self._body()))
+                self._send(404, {"error": "not found"})
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}"
+        self._thread = None
+
+    def running(self):
+        with self.lock:
+            if time.time() >= self.loaded_until:
+                return []
+            expires = datetime.now(timezone.utc) + timedelta(seconds=min(self.loaded_until - time.time(), 10 ** 6))
+        return [{"name": self.model, "model": self.model, "expires_at": expires.isoformat()}]
+
+    def generate(self, body):
+        import random
+
+        if body.get("model") not in (self.model, f"{self.model}:latest"):
+            return 404, {"error": f"model '{body.get('model')}' not found"}
+        with self.slots:
+            with self.lock:
+                self.requests += 1
+                now = time.time()
+                load = 0.0 if now < self.loaded_until else self.load_seconds
+                prompt = body.get("prompt", "")
+                # Reutilizacion del prefijo comun con el prompt anterior (cache KV)
+                common = 0
+                for a, b in zip(self.cached_prefix, prompt):
+                    if a != b:
+                        break
+                    common += 1
+                self.cached_prefix = prompt
+
+            prompt_tokens = max(1, len(prompt) // 3)
+            evaluated = max(1, (len(prompt) - common) // 3)
+            num_predict = int(body.get("options", {}).get("num_predict", 120))
+            generated = min(num_predict, len(ANSWER) // 3) if prompt else 0
+            prompt_seconds = evaluated / self.prompt_tps
+            eval_seconds = generated / self.tps
+            time.sleep(load + prompt_seconds + eval_seconds)
+
+            with self.lock:
+                self.loaded_until = time.time() + _duration_seconds(body.get("keep_alive"))
+
+        if self.fail_rate and random.random() < self.fail_rate:
+            return 500, {"error": "fallo sintetico"}
+
+        return 200, {
+            "model": self.model,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "response": ANSWER[: generated * 3] if prompt else "",
+            "done": True,
+            "done_reason": "stop",
+            "total_duration": int((load + prompt_seconds + eval_seconds) * 1e9),
+            "load_duration": int(load * 1e9),
+            "prompt_eval_count": evaluated if prompt else 0,
+            "prompt_eval_duration": int(prompt_seconds * 1e9),
+            "eval_count": generated,
+            "eval_duration": int(eval_seconds * 1e9),
+            "prompt_tokens": prompt_tokens,
+        }
+
+    def php_api(self, body):
+        """Mismo contrato que api.php: arma el prompt con el contexto y llama a generate"""
+        prompt = body.get("prompt", "")
+        if not prompt:
+            return 400, {"success": False, "error": "Prompt vacío"}
+        context = body.get("context", "")
+        full_prompt = f"{context}\n\nPregunta: {prompt}\nRespuesta:" if context else prompt
+        status, data = self.generate({
+            "model": self.model,
+            "prompt": full_prompt,
+            "keep_alive": body.get("keep_alive"),
+            "options": {"num_predict": body.get("max_tokens", 250)},
+        })
+        if status != 200:
+            return 500, {"success": False, "error": f"Error: {data.get('error')}"}
+        metrics = {key: data.get(key) for key in (
+            "prompt_eval_count", "prompt_eval_duration", "eval_count",
+            "eval_duration", "load_duration", "total_duration",
+        )}
+        return 200, {"success": True, "data": {
+            "response": data["response"],
+            "model": self.model,
+            "context_used": bool(context),
+            "metrics": metrics,
+        }}
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--model", default="phi3:mini")
+    parser.add_argument("--tps", type=float, default=20.0)
+    parser.add_argument("--prompt-tps", type=float, default=200.0)
+    parser.add_argument("--load-seconds", type=float, default=2.0)
+    parser.add_argument("--parallel", type=int, default=1)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    fake = FakeOllama(args.port, args.model, args.tps, args.prompt_tps, args.load_seconds,
+                      args.parallel, args.fail_rate, host="0.0.0.0")
+    print(f"Ollama falso en {fake.url} (modelo {args.model}, {args.tps} tok/s)")
+    try:
+        fake.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
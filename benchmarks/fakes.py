@@ -0,0 +1,177 @@
+"""
+Piezas de apoyo para la suite de benchmarks: corpus sintetico en español,
+embedder determinista y servidor TTS falso (edge-tts necesita internet).
+"""
+
+import asyncio
+import hashlib
+import os
+import random
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# ============ CORPUS SINTETICO ============
+SUBJECT_FILES = {
+    "matematicas": ["suma", "resta", "multiplicacion", "division", "geometria", "medidas", "fracciones"],
+    "ciencias_naturales": ["agua", "sol", "seres vivos", "plantas", "ecosistemas", "energia", "cuerpo humano"],
+    "ciencias_sociales": ["familia", "comunidad", "derechos", "deberes", "cultura", "convivencia", "regiones"],
+    "espanol": ["cuento", "fabula", "poema", "noticia", "carta", "sustantivo", "verbo"],
+    "ingles": ["colors", "numbers", "family", "greetings", "animals", "school supplies", "fruits"],
+}
+
+SENTENCE_TEMPLATES = [
+    "El tema de {topic} nos ayuda a entender lo que pasa a nuestro alrededor.",
+    "Cuando estudiamos {topic} aprendemos a observar, comparar y explicar con nuestras palabras.",
+    "Un ejemplo de {topic} en la vida diaria es lo que vemos en la casa, la escuela y el barrio.",
+    "Los estudiantes de {grade} grado practican {topic} con ejercicios y juegos sencillos.",
+    "Para recordar {topic} conviene hacer un dibujo y escribir una frase corta.",
+    "La maestra explica {topic} paso a paso y pregunta si todos entendieron.",
+    "Es importante repasar {topic} varias veces durante la semana.",
+    "¿Sabias que {topic} aparece en muchas actividades del campo y de la ciudad?",
+]
+
+GRADES = ["primer", "segundo", "tercer", "cuarto", "quinto"]
+
+
+def synthetic_paragraph(topic, rng, sentences=6):
+    return " ".join(
+        rng.choice(SENTENCE_TEMPLATES).format(topic=topic, grade=rng.choice(GRADES))
+        for _ in range(sentences)
+    )
+
+
+def write_corpus(root, docs_per_subject=8, sections=40, seed=7):
+    """Carpetas por materia con documentos TXT en el formato de docs/ (titulos + parrafos)"""
+    rng = random.Random(seed)
+    total_bytes = 0
+    for subject, topics in SUBJECT_FILES.items():
+        folder = os.path.join(root, subject)
+        os.makedirs(folder, exist_ok=True)
+        for i in range(docs_per_subject):
+            lines = []
+            for j in range(sections):
+                topic = topics[(i + j) % len(topics)]
+                lines.append(f"TEMA {j + 1}: {topic.upper()}")
+                lines.append(synthetic_paragraph(topic, rng))
+                lines.append("")
+            path = os.path.join(folder, f"{subject}_{i + 1:02d}.txt")
+            with open(path, "w", encoding="utf-8") as f:
+                f.write("\n".join(lines))
+            total_bytes += os.path.getsize(path)
+    return total_bytes
+
+
+def synthetic_questions(count, seed=11):
+    rng = random.Random(seed)
+    starts = ["¿Qué es", "¿Cómo se explica", "¿Para qué sirve", "¿Me explicas", "¿Qué aprendemos sobre"]
+    topics = [topic for topics in SUBJECT_FILES.values() for topic in topics]
+    return [f"{rng.choice(starts)} {rng.choice(topics)} en {rng.choice(GRADES)} grado, caso {i}?" for i in range(count)]
+
+
+def corpus_questions(count, seed=23):
+    """Preguntas que repiten frases del corpus, todas distintas mientras alcancen.
+
+    Con HashingEmbedder las de synthetic_questions quedan lejos de todo chunk
+    (distancia ~1.3-1.6, sobre max_best_distance) y /chat solo usaria el modelo;
+    estas caen bajo el umbral y pasan por la estrategia docs_friendly.
+    """
+    rng = random.Random(seed)
+    topics = [topic for topics in SUBJECT_FILES.values() for topic in topics]
+    sentences = sorted({template.format(topic=topic, grade=grade)
+                        for template in SENTENCE_TEMPLATES for topic in topics for grade in GRADES})
+    rng.shuffle(sentences)
+    return [f"Explicame esto: {sentences[i % len(sentences)].strip('¿?.')}?" for i in range(count)]
+
+
+# ============ EMBEDDER DETERMINISTA ============
+class HashingEmbedder:
+    """Bolsa de palabras con hashing a 384 dimensiones, normalizada.
+
+    No mide la calidad del modelo real: sirve para medir el resto del pipeline
+    (chunking, indice, busqueda, /chat) sin descargar sentence-transformers.
+    """
+
+    model_id = "hashing-384"
+    dimension = 384
+
+    def __init__(self, cost_ms=0.0):
+        # Costo artificial por texto para simular un modelo (0 = solo el hashing)
+        self.cost_ms = cost_ms
+
+    def _vector(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        for word in text.lower().split():
+            digest = hashlib.md5(word.encode("utf-8")).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimension
+            vector[index] += 1.0 if digest[4] & 1 else -1.0
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def encode(self, texts, batch_size=32):
+        single = isinstance(texts, str)
+        items = [texts] if single else list(texts)
+        if self.cost_ms:
+            time.sleep(self.cost_ms * len(items) / 1000)
+        vectors = np.stack([self._vector(text) for text in items]) if items else np.zeros((0, self.dimension))
+        return vectors[0] if single else vectors
+
+    def after_fork(self, threads):
+        pass
+
+
+# ============ TTS FALSO ============
+class FakeTTSServer:
+    """Devuelve --kb de bytes tras --latency segundos, como una sintesis remota"""
+
+    def __init__(self, latency=0.4, kb=24, host="127.0.0.1"):
+        payload = os.urandom(kb * 1024)
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                time.sleep(latency)
+                self.send_response(200)
+                self.send_header("Content-Type", "audio/mpeg")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+        self.server = ThreadingHTTPServer((host, 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://{host}:{self.server.server_address[1]}/tts"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def fake_communicate_factory(url):
+    """Clase con la interfaz de edge_tts.Communicate usada por app.py, apuntando al TTS falso"""
+
+    class FakeCommunicate:
+        def __init__(self, text, voice):
+            self.text = text
+            self.voice = voice
+
+        def _fetch(self):
+            request = urllib.request.Request(url, data=self.text.encode("utf-8"), method="POST")
+            with urllib.request.urlopen(request, timeout=30) as response:
+                return response.read()
+
+        async def save(self, filename):
+            audio = await asyncio.get_running_loop().run_in_executor(None, self._fetch)
+            with open(filename, "wb") as f:
+                f.write(audio)
+
+    return FakeCommunicate
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+"""
+Suite de benchmarks reproducible: indexacion, busqueda, /chat y /tts
+
+Uso:
+    python benchmarks/run_suite.py [--only indexing,search,chat,tts] [--quick]
+                                   [--out benchmarks/results/x.json] [--compare anterior.json]
+
+- indexing: RAGSystem sobre un corpus sintetico en español (chunks/s, MB/s)
+- search:   latencia de search_forced (p50/p99) con consultas distintas, sin cache
+- chat:     /chat con N clientes concurrentes contra un Ollama falso (fake_ollama.py)
+- tts:      /tts con N clientes concurrentes contra un TTS falso (fakes.py)
+
+Por defecto el embedder es HashingEmbedder (sin descargar modelos); --embedder real
+usa create_embedder() y EMBEDDER_BACKEND. El indice es el compacto salvo que se pida
+VECTOR_STORE=chroma (necesita chromadb instalado). El resultado se guarda en JSON con el
+commit y los parametros, para comparar entre commits con --compare.
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, os.path.join(ROOT, "app"))
+sys.path.insert(0, BENCH_DIR)
+
+os.environ.setdefault("VECTOR_STORE", "compact")
+
+import fakes  # noqa: E402
+from fake_ollama import FakeOllama  # noqa: E402
+
+ALL_BENCHMARKS = ("indexing", "search", "chat", "tts")
+
+
+def percentiles(values_ms):
+    ordered = sorted(values_ms)
+    pick = lambda pct: ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.mean(ordered), 3),
+        "p50_ms": round(pick(50), 3),
+        "p90_ms": round(pick(90), 3),
+        "p99_ms": round(pick(99), 3),
+        "max_ms": round(ordered[-1], 3),
+    }
+
+
+def git_info():
+    def run(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, text=True, timeout=10).stdout.strip()
+        except (OSError, subprocess.SubprocessError):
+            return ""
+    return {"commit": run("rev-parse", "--short", "HEAD"), "dirty": bool(run("status", "--porcelain", "--untracked-files=no"))}
+
+
+# ============ INDEXACION Y BUSQUEDA ============
+def build_rag(args, work_dir):
+    from rag_system import RAGSystem, create_embedder
+
+    docs_dir = os.path.join(work_dir, "docs")
+    corpus_bytes = fakes.write_corpus(docs_dir, docs_per_subject=args.docs_per_subject, sections=args.sections)
+    embedder = create_embedder() if args.embedder == "real" else fakes.HashingEmbedder(cost_ms=args.embed_cost_ms)
+
+    start = time.perf_counter()
+    rag = RAGSystem(docs_dir=docs_dir, embedder=embedder, force_reindex=True)
+    elapsed = time.perf_counter() - start
+    chunks = rag.collection.count()
+    return rag, {
+        "documents": args.docs_per_subject * len(fakes.SUBJECT_FILES),
+        "corpus_mb": round(corpus_bytes / 1e6, 3),
+        "chunks": chunks,
+        "seconds": round(elapsed, 3),
+        "chunks_per_second": round(chunks / elapsed, 1),
+        "mb_per_second": round(corpus_bytes / 1e6 / elapsed, 3),
+        "embedder": type(embedder).__name__,
+        "vector_store": os.getenv("VECTOR_STORE"),
+    }
+
+
+def bench_search(rag, args):
+    questions = fakes.synthetic_questions(args.search_queries)
+    for question in questions[:5]:
+        rag.search_forced(question)
+
+    latencies = []
+    for question in questions:
+        rag.result_cache.clear()
+        start = time.perf_counter()
+        rag.search_forced(question)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return percentiles(latencies)
+
+
+# ============ SERVIDOR FLASK ============
+def start_app(args, llm, rag=None):
+    """Importar app.py apuntando al Ollama falso y servirlo en un puerto libre"""
+    os.environ.update({
+        "PHP_API_URL": f"{llm.url}/api.php",
+        "OLLAMA_URL": llm.url,
+        "MODEL_WARMUP": "false",
+        "RAG_STARTUP_MODE": "off",
+        "GEN_PARALLEL_SLOTS": str(args.llm_parallel),
+    })
+    import app as chatbot
+    from werkzeug.serving import make_server
+
+    if rag is not None:
+        chatbot.rag = rag
+        chatbot.set_rag_status("ready", "listo (benchmark)")
+
+    server = make_server("127.0.0.1", 0, chatbot.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return chatbot, server, f"http://127.0.0.1:{server.server_port}"
+
+
+def load_test(url, payloads, concurrency):
+    import requests
+
+    latencies, errors, statuses = [], 0, {}
+    lock = threading.Lock()
+    session_local = threading.local()
+
+    def one(payload):
+        nonlocal errors
+        session = getattr(session_local, "session", None)
+        if session is None:
+            session = session_local.session = requests.Session()
+        start = time.perf_counter()
+        try:
+            response = session.post(url, json=payload, timeout=120)
+            ok = response.status_code == 200
+            key = response.json().get("strategy", response.status_code) if ok else response.status_code
+        except requests.RequestException:
+            ok, key = False, "exception"
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            statuses[str(key)] = statuses.get(str(key), 0) + 1
+            if not ok:
+                errors += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(one, payloads))
+    wall = time.perf_counter() - start
+    return {
+        "requests": len(payloads),
+        "concurrency": concurrency,
+        "seconds": round(wall, 3),
+        "requests_per_second": round(len(payloads) / wall, 2),
+        "errors": errors,
+        "by_result": statuses,
+        "latency": percentiles(latencies),
+    }
+
+
+def bench_chat(base_url, args):
+    questions = fakes.corpus_questions(args.chat_requests)
+    result = load_test(f"{base_url}/chat", [{"prompt": q} for q in questions], args.concurrency)
+    result["llm"] = {"tps": args.llm_tps, "parallel": args.llm_parallel}
+    # Sin respuestas con documentos se estaria midiendo solo la ruta model_friendly
+    if "docs_friendly" not in result["by_result"]:
+        raise SystemExit(f"/chat no uso documentos en ninguna respuesta: {result['by_result']}")
+    return result
+
+
+def bench_tts(chatbot, base_url, args):
+    tts = fakes.FakeTTSServer(latency=args.tts_latency, kb=args.tts_kb).start()
+    chatbot.edge_tts.Communicate = fakes.fake_communicate_factory(tts.url)
+    try:
+        text = "El agua cambia de estado con el calor: se evapora, se condensa y vuelve a caer como lluvia."
+        result = load_test(f"{base_url}/tts", [{"text": f"{text} {i}"} for i in range(args.tts_requests)], args.concurrency)
+    finally:
+        tts.stop()
+    result["tts"] = {"latency_seconds": args.tts_latency, "kb": args.tts_kb}
+    return result
+
+
+# ============ SALIDA ============
+def compare(current, previous_path):
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = json.load(f)
+    rows = [
+        ("indexing", "chunks_per_second"),
+        ("search", "p50_ms"), ("search", "p99_ms"),
+        ("chat", "requests_per_second"), ("chat", "latency.p99_ms"),
+        ("tts", "requests_per_second"), ("tts", "latency.p99_ms"),
+    ]
+
+    def get(data, bench, path):
+        value = data.get("results", {}).get(bench)
+        for part in path.split("."):
+            value = value.get(part) if isinstance(value, dict) else None
+        return value
+
+    print(f"\nComparacion con {previous['meta'].get('git', {}).get('commit', '?')} ({previous_path}):")
+    for bench, path in rows:
+        old, new = get(previous, bench, path), get(current, bench, path)
+        if old is None or new is None:
+            continue
+        delta = (new - old) / old * 100 if old else 0.0
+        print(f"  {bench:<9} {path:<22} {old:>10} -> {new:<10} ({delta:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", default=",".join(ALL_BENCHMARKS))
+    parser.add_argument("--quick", action="store_true", help="Tamaños reducidos para una corrida rapida")
+    parser.add_argument("--out", default=None)
+    parser.add_argument("--compare", default=None)
+    parser.add_argument("--embedder", choices=("hashing", "real"), default="hashing")
+    parser.add_argument("--embed-cost-ms", type=float, default=0.0)
+    parser.add_argument("--docs-per-subject", type=int, default=8)
+    parser.add_argument("--sections", type=int, default=40)
+    parser.add_argument("--search-queries", type=int, default=300)
+    parser.add_argument("--chat-requests", type=int, default=120)
+    parser.add_argument("--tts-requests", type=int, default=60)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--llm-tps", type=float, default=40.0)
+    parser.add_argument("--llm-parallel", type=int, default=2)
+    parser.add_argument("--llm-load-seconds", type=float, default=0.0)
+    parser.add_argument("--tts-latency", type=float, default=0.3)
+    parser.add_argument("--tts-kb", type=int, default=24)
+    args = parser.parse_args()
+
+    if args.quick:
+        args.docs_per_subject, args.sections = 3, 20
+        args.search_queries, args.chat_requests, args.tts_requests = 60, 30, 20
+
+    selected = [name.strip() for name in args.only.split(",") if name.strip()]
+    unknown = set(selected) - set(ALL_BENCHMARKS)
+    if unknown:
+        parser.error(f"Benchmarks desconocidos: {', '.join(sorted(unknown))}")
+
+    results = {}
+    work_dir = tempfile.mkdtemp(prefix="bench-suite-")
+    cwd = os.getcwd()
+    # RAGSystem guarda el indice en ./chroma_db: trabajar en una carpeta temporal
+    os.chdir(work_dir)
+    llm = None
+    try:
+        rag = None
+        if {"indexing", "search", "chat"} & set(selected):
+            print("Indexando corpus sintetico...")
+            rag, indexing = build_rag(args, work_dir)
+            if "indexing" in selected:
+                results["indexing"] = indexing
+                print(f"  {indexing['chunks']} chunks en {indexing['seconds']}s ({indexing['chunks_per_second']} chunks/s)")
+
+        if "search" in selected:
+            print("Midiendo search_forced...")
+            results["search"] = bench_search(rag, args)
+            print(f"  p50 {results['search']['p50_ms']} ms | p99 {results['search']['p99_ms']} ms")
+
+        if {"chat", "tts"} & set(selected):
+            llm = FakeOllama(tps=args.llm_tps, parallel=args.llm_parallel, load_seconds=args.llm_load_seconds).start()
+            chatbot, server, base_url = start_app(args, llm, rag if "chat" in selected else None)
+
+            if "chat" in selected:
+                print(f"Carga en /chat ({args.chat_requests} peticiones, {args.concurrency} clientes)...")
+                results["chat"] = bench_chat(base_url, args)
+                print(f"  {results['chat']['requests_per_second']} req/s | p99 {results['chat']['latency']['p99_ms']} ms "
+                      f"| errores {results['chat']['errors']}")
+
+            if "tts" in selected:
+                print(f"Carga en /tts ({args.tts_requests} peticiones, {args.concurrency} clientes)...")
+                results["tts"] = bench_tts(chatbot, base_url, args)
+                print(f"  {results['tts']['requests_per_second']} req/s | p99 {results['tts']['latency']['p99_ms']} ms "
+                      f"| errores {results['tts']['errors']}")
+            server.shutdown()
+    finally:
+        os.chdir(cwd)
+        if llm is not None:
+            llm.stop()
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git": git_info(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+
+    out = args.out or os.path.join(
+        BENCH_DIR, "results", f"{datetime.now():%Y%m%d-%H%M%S}-{report['meta']['git']['commit'] or 'local'}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"\nResultados: {out}")
+
+    if args.compare:
+        compare(report, args.compare)
+
+
+if __name__ == "__main__":
+    main()
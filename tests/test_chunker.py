@@ -0,0 +1,50 @@
+"""
+Pruebas del chunker en streaming (app/chunker.py)
+
+Uso:
+    python -m pytest -q tests/
+"""
+
+import io
+import os
+import sys
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+import chunker  # noqa: E402
+
+CHUNK_SIZE = 600
+
+
+class IterDocumentChunksTest(unittest.TestCase):
+    def chunks(self, text):
+        return list(chunker.iter_document_chunks(io.StringIO(text), chunk_size=CHUNK_SIZE))
+
+    def test_texto_con_puntuacion(self):
+        text = "PROCESO DE MATRICULA\n" + " ".join(
+            f"El paso {i} de la matricula se hace en la secretaria academica." for i in range(200))
+        chunks = self.chunks(text)
+        self.assertGreater(len(chunks), 1)
+        self.assertTrue(all(len(chunk) <= CHUNK_SIZE for chunk in chunks))
+        self.assertIn("paso 199", chunks[-1])
+
+    def test_lineas_sin_puntuacion_no_se_acumulan(self):
+        # OCR de tablas o listados: miles de lineas sin . ! ? que antes acababan en un solo chunk
+        text = "\n".join(f"fila {i} codigo {i * 7} valor pendiente sin puntuacion" for i in range(20000))
+        chunks = self.chunks(text)
+        self.assertGreater(len(chunks), 100)
+        self.assertTrue(all(len(chunk) <= CHUNK_SIZE for chunk in chunks))
+        self.assertIn("fila 0 ", chunks[0])
+        self.assertIn("fila 19999 ", chunks[-1])
+
+    def test_linea_enorme_sin_espacios_de_puntuacion(self):
+        text = " ".join(["palabra"] * 200000)
+        chunks = self.chunks(text)
+        self.assertGreater(len(chunks), 100)
+        self.assertTrue(all(len(chunk) <= CHUNK_SIZE for chunk in chunks))
+
+
+if __name__ == "__main__":
+    unittest.main()
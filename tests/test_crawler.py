@@ -0,0 +1,120 @@
+"""
+Pruebas del rastreador de AVAS-2 (app/avas2_crawler.py) contra el servidor local
+de benchmarks/bench_crawler.py: ETag/304, cambios, paginas eliminadas
+
+Uso:
+    python -m pytest -q tests/
+"""
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+import bench_crawler  # noqa: E402
+from avas2_crawler import AVAS2Crawler, PageCache  # noqa: E402
+
+
+class FakeRAG:
+    """Registra lo que el rastreador le pasa; fail=True simula documentos que no se pudieron indexar"""
+
+    def __init__(self, docs_dir):
+        self.docs_dir = docs_dir
+        self.updated = []
+        self.removed = []
+        self.fail = False
+
+    def update_documents(self, paths):
+        self.updated.append(sorted(paths))
+        if self.fail:
+            return 0, set()
+        return len(paths), {os.path.relpath(path, self.docs_dir).replace(os.sep, "/") for path in paths}
+
+    def remove_documents(self, filenames):
+        self.removed.append(sorted(filenames))
+
+
+class AVAS2CrawlerTest(unittest.TestCase):
+    def setUp(self):
+        self.work = tempfile.mkdtemp(prefix="test-crawler-")
+        self.addCleanup(shutil.rmtree, self.work, True)
+        self.site_dir = os.path.join(self.work, "site")
+        bench_crawler.write_synthetic_site(self.site_dir, topics_per_subject=2)
+        self.site = bench_crawler.SavedSite(self.site_dir)
+        self.addCleanup(self.site.server.shutdown)
+
+        self.docs_dir = os.path.join(self.work, "docs")
+        os.makedirs(self.docs_dir)
+        self.rag = FakeRAG(self.docs_dir)
+        self.crawler = AVAS2Crawler(
+            subjects={subject: f"{self.site.url}{folder}/" for subject, folder in bench_crawler.SUBJECT_PATHS.items()},
+            docs_dir=self.docs_dir,
+            get_rag=lambda: self.rag,
+            cache=PageCache(os.path.join(self.work, "crawl_cache")),
+            max_connections=2,
+        )
+
+    def topic_pages(self):
+        return sorted(
+            os.path.join(dirpath, "index.html")
+            for dirpath, _, files in os.walk(os.path.join(self.site_dir, "avas-2"))
+            if "index.html" in files and os.path.basename(os.path.dirname(dirpath)).startswith("ava-")
+        )
+
+    def test_en_frio_y_sin_cambios(self):
+        first = self.crawler.crawl()
+        self.assertEqual(first["errors"], [])
+        self.assertEqual(first["fetched"], first["pages"])
+        # Las portadas solo tienen enlaces: se escriben las 10 paginas de temas
+        self.assertEqual(len(first["changed"]), len(self.topic_pages()))
+        self.assertTrue(all(os.path.exists(path) for path in first["changed"]))
+        self.assertEqual(self.rag.updated, [sorted(first["changed"])])
+
+        second = self.crawler.crawl()
+        self.assertEqual(second["fetched"], 0)
+        self.assertEqual(second["not_modified"], second["pages"])
+        self.assertEqual(second["changed"], [])
+        self.assertEqual(len(self.rag.updated), 1)
+
+    def test_pagina_modificada_y_eliminada(self):
+        first = self.crawler.crawl()
+        edited, deleted = self.topic_pages()[:2]
+        with open(edited, "r", encoding="utf-8") as f:
+            html = f.read()
+        with open(edited, "w", encoding="utf-8") as f:
+            f.write(html.replace("</article>", "<p>Contenido nuevo para repasar en casa.</p></article>", 1))
+        shutil.rmtree(os.path.dirname(deleted))
+
+        third = self.crawler.crawl()
+        self.assertEqual(third["fetched"], 1)
+        self.assertEqual(len(third["changed"]), 1)
+        with open(third["changed"][0], "r", encoding="utf-8") as f:
+            self.assertIn("Contenido nuevo para repasar en casa.", f.read())
+        self.assertEqual(len(third["removed"]), 1)
+        self.assertFalse(os.path.exists(third["removed"][0]))
+        self.assertIn(third["removed"][0], first["changed"])
+        self.assertEqual(self.rag.removed,
+                         [[os.path.relpath(third["removed"][0], self.docs_dir).replace(os.sep, "/")]])
+
+    def test_paginas_no_indexadas_se_vuelven_a_pasar(self):
+        self.rag.fail = True
+        first = self.crawler.crawl()
+        self.assertEqual(sorted(first["failed"]), sorted(first["changed"]))
+
+        # Sin ETag ni hash guardados: se descargan de nuevo y se vuelven a pasar al RAG
+        self.rag.fail = False
+        second = self.crawler.crawl()
+        self.assertEqual(sorted(second["changed"]), sorted(first["changed"]))
+        self.assertNotIn("failed", second)
+
+        third = self.crawler.crawl()
+        self.assertEqual(third["changed"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
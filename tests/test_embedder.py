@@ -0,0 +1,92 @@
+"""
+Paridad del embedder ONNX con el modelo original de sentence-transformers (app/rag_system.py)
+
+Se salta si faltan onnxruntime/tokenizers/sentence-transformers o el modelo
+exportado (EMBEDDER_ONNX_PATH, ver export_onnx_embedder.py).
+
+Uso:
+    python -m pytest -q tests/
+"""
+
+import glob
+import importlib.util
+import os
+import sys
+import unittest
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+import rag_system  # noqa: E402
+
+# Mismos umbrales que benchmarks/bench_embedder.py para usar el modelo con un indice existente
+MIN_COSINE = 0.98
+MIN_TOP3_OVERLAP = 0.9
+
+QUERIES = [
+    "¿Qué es la suma?",
+    "¿Cómo se calcula el perímetro de un cuadrado?",
+    "¿Cuáles son los estados del agua?",
+    "¿Qué es un sustantivo?",
+    "How do you say the colors in English?",
+    "¿Qué son los derechos de los niños?",
+]
+
+MISSING = [name for name in ("onnxruntime", "tokenizers", "sentence_transformers")
+           if importlib.util.find_spec(name) is None]
+ONNX_MODEL = any(os.path.exists(os.path.join(rag_system.EMBEDDER_ONNX_PATH, name))
+                 for name in ("model_int8.onnx", "model.onnx"))
+
+
+def doc_chunks(limit=60):
+    import chunker
+    chunks = []
+    for path in sorted(glob.glob(os.path.join(ROOT, "docs", "*.txt"))):
+        with open(path, "r", encoding="utf-8", errors="ignore") as f:
+            chunks.extend(chunker.chunk_document(f.read()))
+    return chunks[:limit]
+
+
+@unittest.skipIf(MISSING, f"sin {', '.join(MISSING)}")
+@unittest.skipUnless(ONNX_MODEL, f"sin modelo ONNX en {rag_system.EMBEDDER_ONNX_PATH}")
+class ONNXParityTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        try:
+            cls.reference = rag_system.SentenceTransformerEmbedder()
+        except Exception as e:
+            raise unittest.SkipTest(f"modelo {rag_system.EMBEDDING_MODEL} no disponible: {e}")
+        cls.onnx = rag_system.ONNXEmbedder()
+        cls.chunks = doc_chunks() or QUERIES
+
+    def test_mismo_espacio_vectorial(self):
+        self.assertEqual(self.onnx.model_id, self.reference.model_id)
+        self.assertEqual(self.onnx.dimension, self.reference.dimension)
+
+    def test_coseno_por_texto(self):
+        texts = self.chunks + QUERIES
+        ref = np.asarray(self.reference.encode(texts))
+        cand = np.asarray(self.onnx.encode(texts))
+        cosine = (ref * cand).sum(axis=1) / (np.linalg.norm(ref, axis=1) * np.linalg.norm(cand, axis=1))
+        self.assertGreaterEqual(float(cosine.min()), MIN_COSINE)
+
+    def test_top3_coincide(self):
+        ref_chunks = np.asarray(self.reference.encode(self.chunks))
+        cand_chunks = np.asarray(self.onnx.encode(self.chunks))
+        agree = 0
+        for query in QUERIES:
+            ref_top = set(np.argsort(-(ref_chunks @ self.reference.encode(query)))[:3])
+            cand_top = set(np.argsort(-(cand_chunks @ self.onnx.encode(query)))[:3])
+            agree += len(ref_top & cand_top)
+        self.assertGreaterEqual(agree / (3 * len(QUERIES)), MIN_TOP3_OVERLAP)
+
+    def test_texto_suelto_y_lote_vacio(self):
+        single = self.onnx.encode(QUERIES[0])
+        self.assertEqual(single.shape, (self.onnx.dimension,))
+        self.assertEqual(self.onnx.encode([]).shape, (0, self.onnx.dimension))
+
+
+if __name__ == "__main__":
+    unittest.main()
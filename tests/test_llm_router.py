@@ -0,0 +1,133 @@
+"""
+Pruebas del router de backends (app/llm_router.py) con backends falsos, sin HTTP
+
+Uso:
+    python -m pytest -q tests/
+"""
+
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "app"))
+
+import llm_router  # noqa: E402
+from deadline import DeadlineExceeded  # noqa: E402
+
+OPEN_SECONDS = 0.2
+
+
+def fake_backend(fails=None):
+    """fn(backend) para pool.call: lanza fails[backend.name] si esta, si no devuelve el nombre"""
+    def fn(backend):
+        if fails and backend.name in fails:
+            raise fails[backend.name]
+        return backend.name
+    return fn
+
+
+class BackendPoolTest(unittest.TestCase):
+    def setUp(self):
+        patches = [
+            mock.patch.object(llm_router, "ROUTER_FAILURE_THRESHOLD", 2),
+            mock.patch.object(llm_router, "ROUTER_OPEN_SECONDS", OPEN_SECONDS),
+            mock.patch.object(llm_router, "ROUTER_MAX_ATTEMPTS", 2),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+        self.a = llm_router.Backend("http://a", "m")
+        self.b = llm_router.Backend("http://b", "m")
+        self.pool = llm_router.BackendPool([self.a, self.b])
+
+    def test_failover_a_otro_backend(self):
+        fn = fake_backend({self.a.name: requests.ConnectionError("rechazada")})
+        served = {self.pool.call(fn) for _ in range(4)}
+        self.assertEqual(served, {self.b.name})
+        self.assertGreaterEqual(self.a.errors, 1)
+        self.assertEqual(self.b.errors, 0)
+        self.assertEqual(self.a.outstanding + self.b.outstanding, 0)
+
+    def test_circuito_se_abre_y_se_cierra_con_la_prueba(self):
+        fn = fake_backend({self.a.name: requests.ConnectionError("rechazada")})
+        for _ in range(4):
+            self.pool.call(fn)
+        self.assertEqual(self.a.circuit, llm_router.OPEN)
+
+        # Abierto: todo va a b sin tocar a a
+        errors = self.a.errors
+        for _ in range(4):
+            self.assertEqual(self.pool.call(fake_backend()), self.b.name)
+        self.assertEqual(self.a.errors, errors)
+
+        # Cumplido el plazo, una peticion de prueba que sale bien lo cierra
+        time.sleep(OPEN_SECONDS + 0.05)
+        self.b.outstanding += 1  # que el pool prefiera a a
+        try:
+            self.assertEqual(self.pool.call(fake_backend()), self.a.name)
+        finally:
+            self.b.outstanding -= 1
+        self.assertEqual(self.a.circuit, llm_router.CLOSED)
+        self.assertEqual(self.a.failures, 0)
+
+    def test_prueba_fallida_reabre_el_circuito(self):
+        fn = fake_backend({self.a.name: requests.ConnectionError("rechazada")})
+        for _ in range(4):
+            self.pool.call(fn)
+        time.sleep(OPEN_SECONDS + 0.05)
+        self.b.outstanding += 1
+        try:
+            self.pool.call(fn)
+        finally:
+            self.b.outstanding -= 1
+        self.assertEqual(self.a.circuit, llm_router.OPEN)
+
+    def test_timeout_no_se_reintenta(self):
+        calls = []
+
+        def fn(backend):
+            calls.append(backend.name)
+            raise requests.Timeout("lento")
+
+        with self.assertRaises(requests.Timeout):
+            self.pool.call(fn)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.a.errors + self.b.errors, 1)
+
+    def test_plazo_agotado_no_cuenta_como_fallo(self):
+        def fn(backend):
+            raise DeadlineExceeded("llm", 0.0)
+
+        for _ in range(4):
+            with self.assertRaises(DeadlineExceeded):
+                self.pool.call(fn)
+        self.assertEqual(self.a.errors + self.b.errors, 0)
+        self.assertEqual({self.a.circuit, self.b.circuit}, {llm_router.CLOSED})
+
+    def test_sin_backends_sanos_prueba_el_que_fallo_hace_mas_tiempo(self):
+        for backend, other in ((self.a, self.b), (self.b, self.a)):
+            with self.assertRaises(requests.ConnectionError):
+                with self.pool.lease(exclude=(other.name,)):
+                    raise requests.ConnectionError("rechazada")
+            backend.circuit, backend.opened_at = llm_router.OPEN, time.monotonic()
+            time.sleep(0.01)
+        self.b.healthy = False
+
+        # a fallo antes que b: recibe la peticion en vez de NoBackendAvailable, y se recupera
+        self.assertEqual(self.pool.call(fake_backend()), self.a.name)
+        self.assertEqual(self.a.circuit, llm_router.CLOSED)
+        self.assertEqual(self.b.circuit, llm_router.OPEN)
+
+    def test_todos_caidos(self):
+        fn = fake_backend({name: requests.ConnectionError("rechazada") for name in (self.a.name, self.b.name)})
+        with self.assertRaises(requests.ConnectionError):
+            self.pool.call(fn)
+
+
+if __name__ == "__main__":
+    unittest.main()